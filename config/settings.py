@@ -55,6 +55,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'usuarios.middleware.PacienteMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django_browser_reload.middleware.BrowserReloadMiddleware',
@@ -87,10 +88,64 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Las transacciones toman el lock de escritura al empezar y
+            # esperan hasta 5 segundos si otra escritura lo tiene
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# LocMemCache guarda los datos por proceso: con varios workers cada uno tiene
+# su propio cache, y lo que invalida un worker (por ejemplo el usuario cacheado
+# en usuarios/sesion.py después de desactivarlo o de cambiarle la contraseña,
+# o el token de su calendario ICS) sigue valiendo en los demás hasta que vence
+# (usuarios.sesion.TIEMPO_CACHE). Con más de un worker conviene un cache
+# compartido (Redis, Memcached) en ambos alias.
+#
+# Al pasar MAX_ENTRIES el cache descarta un tercio de las claves. Las sesiones,
+# los usuarios cacheados y los límites de login van en su propio alias para
+# que las grillas y los feeds del alias por defecto no los desalojen (un
+# límite de login descartado vuelve a empezar lleno).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'nutricion-yl',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'sesiones': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'nutricion-yl-sesiones',
+        # Cerca de tres entradas por usuario activo (sesión, versión y usuario)
+        'OPTIONS': {'MAX_ENTRIES': 30000},
+    },
+}
+
+
+# Backend que difunde los eventos de horarios a las páginas de reserva (SSE).
+# BackendLocal reparte dentro del proceso: sirve para un solo worker ASGI.
+TURNOS_EVENTOS_BACKEND = 'turnos.eventos.BackendLocal'
+
+# Cada cuántos segundos cerrar los turnos pasados (completado/ausente) desde
+# el propio proceso web (lo arrancan config/wsgi.py y config/asgi.py, no los
+# comandos de manage.py). None lo desactiva: usar `manage.py cerrar_turnos`
+# desde cron. Ver turnos/cierre.py
+TURNOS_CIERRE_INTERVALO = None
+
+
+# Límite de intentos de inicio de sesión: (capacidad, intentos recuperados por
+# minuto) por nombre de usuario y por IP. Ver usuarios/limites.py
+USUARIOS_LIMITES_LOGIN = {
+    'usuario': (5, 5),
+    'ip': (30, 30),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -141,6 +196,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Usuario personalizado
 AUTH_USER_MODEL = 'usuarios.Usuario'
 
+# El usuario de cada pedido (con su perfil de paciente) se lee del cache;
+# ver usuarios/sesion.py
+AUTHENTICATION_BACKENDS = ['usuarios.backends.ModelBackendCacheado']
+
+# Sesiones en el cache, escritas también en la base para no perderlas
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sesiones'
+
 # URLs de autenticación
 LOGIN_URL = 'usuarios:login'
 LOGIN_REDIRECT_URL = 'core:home'
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Cierre automático de turnos pasados (si TURNOS_CIERRE_INTERVALO lo activa),
+# solo en los procesos que atienden pedidos
+from turnos.cierre import iniciar_programador_configurado  # noqa: E402
+
+iniciar_programador_configurado()
@@ -0,0 +1,67 @@
+"""
+Utilidades compartidas por los comandos de benchmark (manage.py bench_*).
+
+Los benchmarks corren sobre una base de datos de prueba descartable, igual que
+los tests, para no tocar los datos reales.
+"""
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def base_de_prueba(nombre=None):
+    """
+    Crea una base de datos de prueba con las migraciones aplicadas y la
+    destruye al salir. Se usa un archivo temporal (y no la base en memoria
+    de los tests) para que cada llamada arranque vacía y para que varios
+    procesos puedan compartirla.
+    """
+    directorio = tempfile.mkdtemp(prefix='bench-')
+    connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(
+        directorio, nombre or 'bench.sqlite3'
+    )
+    nombre_original = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+        connection.settings_dict['TEST']['NAME'] = None
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def cronometrar(funcion, repeticiones=20):
+    """Ejecuta la función varias veces y devuelve (mejor, promedio) en milisegundos."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return min(tiempos), sum(tiempos) / len(tiempos)
+
+
+def crear_pacientes(cantidad, prefijo='bench'):
+    """Crea `cantidad` usuarios paciente con su perfil y devuelve los Paciente."""
+    from usuarios.models import Usuario
+    from pacientes.models import Paciente
+
+    usuarios = Usuario.objects.bulk_create([
+        Usuario(
+            username=f'{prefijo}{i}',
+            first_name=f'Nombre{i}',
+            last_name=f'Apellido{i}',
+            email=f'{prefijo}{i}@example.com',
+            password='!',
+            tipo='paciente',
+        )
+        for i in range(cantidad)
+    ], batch_size=500)
+    return Paciente.objects.bulk_create(
+        [Paciente(usuario=usuario) for usuario in usuarios], batch_size=500
+    )
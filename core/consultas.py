@@ -0,0 +1,50 @@
+"""
+Lectura por bloques de consultas largas.
+
+Con SQLite en modo rollback journal (el de config/settings.py), un SELECT
+abierto mantiene un lock compartido sobre el archivo y ninguna escritura
+puede confirmarse hasta que termine. Un cursor de .iterator() que se va
+leyendo mientras se envía una respuesta a un cliente lento bloquea así todas
+las escrituras durante la descarga.
+
+en_bloques() pide cada bloque con su propia consulta corta, leída entera
+antes de devolver la primera fila, y sigue desde la última fila vista
+(keyset) en lugar de usar OFFSET. La memoria queda acotada a un bloque y
+entre bloque y bloque la base queda libre para escribir.
+"""
+from django.db.models import Q
+
+
+def despues_de(campos, valores):
+    """
+    Filtro de las filas posteriores a `valores` en el orden de `campos`.
+    Se arma como rango sobre el primer campo (campo >= v AND (campo > v OR
+    ...)) para que SQLite recorra el índice en orden; un OR de nivel
+    superior lo haría ordenar todo el resto.
+    """
+    campo, valor = campos[0], valores[0]
+    if len(campos) == 1:
+        return Q(**{f'{campo}__gt': valor})
+    return Q(**{f'{campo}__gte': valor}) & (
+        Q(**{f'{campo}__gt': valor}) | despues_de(campos[1:], valores[1:])
+    )
+
+
+def en_bloques(consulta, campos, orden, tamanio):
+    """
+    Filas de consulta.values_list(*campos) ordenadas por `orden`, leídas de a
+    `tamanio` por consulta. Los campos de `orden` tienen que estar en
+    `campos`, no ser nulos y, juntos, identificar cada fila.
+    """
+    posiciones = [campos.index(campo) for campo in orden]
+    consulta = consulta.order_by(*orden)
+    ultima = None
+    while True:
+        bloque = consulta
+        if ultima is not None:
+            bloque = bloque.filter(despues_de(orden, [ultima[i] for i in posiciones]))
+        filas = list(bloque.values_list(*campos)[:tamanio])
+        yield from filas
+        if len(filas) < tamanio:
+            return
+        ultima = filas[-1]
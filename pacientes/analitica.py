@@ -0,0 +1,144 @@
+"""
+Tendencias de peso y medidas corporales de un paciente.
+
+El historial se trae en una sola consulta con values_list (sin instanciar
+modelos) y se pasa a arrays de NumPy; todos los indicadores se calculan con
+operaciones vectorizadas sobre la serie completa.
+
+El resultado se guarda en el cache por paciente y las señales de
+RegistroHistorial y Paciente lo borran cuando cambia un dato (ver
+pacientes/signals.py), así que la página de detalle no recalcula nada
+mientras no haya registros nuevos.
+"""
+import numpy as np
+
+from django.core.cache import cache
+
+from .models import RegistroHistorial
+
+# Ventana de la media móvil y de la tasa reciente, en días
+DIAS_MEDIA_MOVIL = 28
+DIAS_TASA_RECIENTE = 28
+
+# Aunque no cambie nada, el resultado cacheado se descarta al día siguiente
+DURACION_CACHE_TENDENCIAS = 60 * 60 * 24
+
+
+def _clave_cache(paciente_id):
+    return f'pacientes:tendencias:{paciente_id}'
+
+
+def cargar_series(paciente_id):
+    """
+    Historial del paciente en orden cronológico como arrays:
+    fechas (datetime64[D]), peso, cintura y cadera (float, NaN si falta).
+    """
+    filas = RegistroHistorial.objects.filter(paciente_id=paciente_id).order_by(
+        'fecha', 'id'
+    ).values_list('fecha', 'peso', 'circunferencia_cintura', 'circunferencia_cadera')
+    if not filas:
+        vacio = np.empty(0)
+        return np.empty(0, dtype='datetime64[D]'), vacio, vacio, vacio
+
+    fechas, peso, cintura, cadera = zip(*filas)
+    return (
+        np.array(fechas, dtype='datetime64[D]'),
+        np.array(peso, dtype=float),
+        np.array(cintura, dtype=float),
+        np.array(cadera, dtype=float),
+    )
+
+
+def media_movil(dias, valores, ventana):
+    """
+    Promedio de cada valor con los anteriores de los últimos `ventana` días.
+    Con sumas acumuladas y searchsorted: O(n) aunque haya varias mediciones
+    por día o semanas sin mediciones.
+    """
+    acumulado = np.concatenate(([0.0], np.cumsum(valores)))
+    inicio = np.searchsorted(dias, dias - (ventana - 1), side='left')
+    fin = np.arange(1, len(valores) + 1)
+    return (acumulado[fin] - acumulado[inicio]) / (fin - inicio)
+
+
+def ajuste_lineal(dias, valores):
+    """
+    Recta de mínimos cuadrados valores ~ dias.
+    Devuelve (pendiente por día, ordenada, r²) o None si no hay al menos
+    dos días distintos.
+    """
+    if len(dias) < 2 or dias[0] == dias[-1]:
+        return None
+    pendiente, ordenada = np.polyfit(dias, valores, 1)
+    residuos = valores - (pendiente * dias + ordenada)
+    total = np.sum((valores - valores.mean()) ** 2)
+    r2 = 1.0 - np.sum(residuos ** 2) / total if total else 1.0
+    return float(pendiente), float(ordenada), float(r2)
+
+
+def _redondear(array, decimales=2):
+    """Lista con NaN convertido a None, lista para JSON o plantillas."""
+    return [None if np.isnan(valor) else valor for valor in np.round(array, decimales).tolist()]
+
+
+def _ultimo(array, decimales=2):
+    validos = array[~np.isnan(array)]
+    return round(float(validos[-1]), decimales) if len(validos) else None
+
+
+def calcular_tendencias(fechas, peso, cintura, cadera, altura=None):
+    """Indicadores y series derivadas a partir de los arrays de cargar_series."""
+    if len(fechas) == 0:
+        return None
+
+    dias = (fechas - fechas[0]).astype(np.int64).astype(float)
+
+    imc = peso / (float(altura) ** 2) if altura else np.full(len(peso), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        icc = cintura / cadera
+        # Kg por semana entre cada medición y la anterior (NaN el mismo día)
+        intervalos = np.diff(dias)
+        tasa_semanal = np.concatenate(([np.nan], np.where(intervalos > 0, np.diff(peso) / intervalos * 7, np.nan)))
+    movil = media_movil(dias, peso, DIAS_MEDIA_MOVIL)
+
+    tendencia = ajuste_lineal(dias, peso)
+    recientes = dias >= dias[-1] - (DIAS_TASA_RECIENTE - 1)
+    reciente = ajuste_lineal(dias[recientes], peso[recientes])
+
+    return {
+        'mediciones': len(peso),
+        'desde': str(fechas[0]),
+        'hasta': str(fechas[-1]),
+        'peso_actual': round(float(peso[-1]), 2),
+        'variacion_total': round(float(peso[-1] - peso[0]), 2),
+        'imc_actual': _ultimo(imc, 1),
+        'icc_actual': _ultimo(icc),
+        'media_movil_actual': round(float(movil[-1]), 2),
+        'tendencia_semanal': round(tendencia[0] * 7, 2) if tendencia else None,
+        'tendencia_r2': round(tendencia[2], 3) if tendencia else None,
+        'tasa_reciente_semanal': round(reciente[0] * 7, 2) if reciente else None,
+        'series': {
+            'fechas': [str(fecha) for fecha in fechas],
+            'peso': _redondear(peso),
+            'imc': _redondear(imc, 1),
+            'icc': _redondear(icc, 3),
+            'media_movil': _redondear(movil),
+            'tasa_semanal': _redondear(tasa_semanal),
+            'tendencia': _redondear(tendencia[0] * dias + tendencia[1]) if tendencia else [],
+        },
+    }
+
+
+def tendencias_paciente(paciente):
+    """Tendencias del paciente, desde el cache si no cambiaron sus registros."""
+    clave = _clave_cache(paciente.id)
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular_tendencias(*cargar_series(paciente.id), altura=paciente.altura)
+        # Un paciente sin registros se cachea como {} para no volver a consultar
+        cache.set(clave, resultado or {}, DURACION_CACHE_TENDENCIAS)
+    return resultado or None
+
+
+def invalidar_tendencias(paciente_id):
+    cache.delete(_clave_cache(paciente_id))
@@ -0,0 +1,167 @@
+"""
+Búsqueda de texto completo sobre pacientes y notas clínicas (SQLite FTS5).
+
+La tabla virtual `pacientes_busqueda` (creada en la migración 0004) guarda un
+documento por paciente (nombre, alergias, medicamentos, observaciones) y uno
+por cada RegistroHistorial o Turno con notas. El rowid de cada documento se
+deriva del tipo y del id del objeto, así que actualizarlo o borrarlo es una
+búsqueda por clave y no un recorrido de la tabla.
+
+Las señales de pacientes/signals.py mantienen el índice dentro de la misma
+transacción que el cambio. Las cargas masivas (bulk_create, update) no
+disparan señales: después de una, correr `reconstruir_busqueda`.
+"""
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+TABLA = 'pacientes_busqueda'
+
+# Tipo de documento -> desplazamiento dentro del rowid
+TIPOS = {'paciente': 0, 'registro': 1, 'turno': 2}
+ETIQUETAS = {
+    'paciente': 'Ficha del paciente',
+    'registro': 'Nota de historial',
+    'turno': 'Nota de turno',
+}
+
+# Peso de cada columna en el ranking bm25 (las tres primeras no se indexan)
+PESOS = (0, 0, 0, 10.0, 5.0, 5.0, 2.0, 1.0)
+
+MAX_RESULTADOS = 50
+MAX_TERMINOS = 10
+PALABRAS_FRAGMENTO = 12
+
+# Marcadores que no pueden aparecer en el texto; se reemplazan por <mark>
+# después de escapar el fragmento
+_INICIO_MARCA, _FIN_MARCA = '\x02', '\x03'
+
+_SQL_BORRAR = f'DELETE FROM {TABLA} WHERE rowid = %s'
+_SQL_INSERTAR = (
+    f'INSERT INTO {TABLA} (rowid, tipo, paciente_id, fecha, nombre, alergias, '
+    'medicamentos, observaciones, notas) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)'
+)
+
+
+def _rowid(tipo, objeto_id):
+    return objeto_id * len(TIPOS) + TIPOS[tipo]
+
+
+def _guardar(tipo, objeto_id, paciente_id, fecha='', nombre='', alergias='',
+             medicamentos='', observaciones='', notas=''):
+    rowid = _rowid(tipo, objeto_id)
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL_BORRAR, [rowid])
+        if any((nombre, alergias, medicamentos, observaciones, notas)):
+            cursor.execute(_SQL_INSERTAR, [
+                rowid, tipo, paciente_id, str(fecha or ''), nombre,
+                alergias, medicamentos, observaciones, notas,
+            ])
+
+
+def indexar_paciente(paciente):
+    _guardar(
+        'paciente', paciente.id, paciente.id,
+        nombre=paciente.usuario.get_full_name(),
+        alergias=paciente.alergias,
+        medicamentos=paciente.medicamentos,
+        observaciones=paciente.observaciones,
+    )
+
+
+def indexar_registro(registro):
+    _guardar('registro', registro.id, registro.paciente_id, registro.fecha, notas=registro.notas)
+
+
+def indexar_turno(turno):
+    _guardar('turno', turno.id, turno.paciente_id, turno.fecha, notas=turno.notas_profesional)
+
+
+def quitar(tipo, objeto_id):
+    with connection.cursor() as cursor:
+        cursor.execute(_SQL_BORRAR, [_rowid(tipo, objeto_id)])
+
+
+def reconstruir():
+    """Vuelve a armar el índice completo desde las tablas, en SQL."""
+    n = len(TIPOS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLA}')
+        cursor.execute(f"""
+            INSERT INTO {TABLA} (rowid, tipo, paciente_id, fecha, nombre, alergias, medicamentos, observaciones, notas)
+            SELECT p.id * {n} + {TIPOS['paciente']}, 'paciente', p.id, '',
+                   trim(u.first_name || ' ' || u.last_name), p.alergias, p.medicamentos, p.observaciones, ''
+            FROM pacientes_paciente p JOIN usuarios_usuario u ON u.id = p.usuario_id
+        """)
+        cursor.execute(f"""
+            INSERT INTO {TABLA} (rowid, tipo, paciente_id, fecha, nombre, alergias, medicamentos, observaciones, notas)
+            SELECT id * {n} + {TIPOS['registro']}, 'registro', paciente_id, fecha, '', '', '', '', notas
+            FROM pacientes_registrohistorial WHERE notas <> ''
+        """)
+        cursor.execute(f"""
+            INSERT INTO {TABLA} (rowid, tipo, paciente_id, fecha, nombre, alergias, medicamentos, observaciones, notas)
+            SELECT id * {n} + {TIPOS['turno']}, 'turno', paciente_id, fecha, '', '', '', '', notas_profesional
+            FROM turnos_turno WHERE notas_profesional <> ''
+        """)
+        cursor.execute(f"INSERT INTO {TABLA} ({TABLA}) VALUES ('optimize')")
+
+
+def consulta_fts(texto):
+    """
+    Convierte lo que escribió el usuario en una consulta FTS5 segura: cada
+    palabra como prefijo entre comillas, todas obligatorias. Así la sintaxis
+    de FTS5 (AND, NEAR, comillas, *) no llega a la consulta.
+    """
+    terminos = re.findall(r'\w+', texto or '')[:MAX_TERMINOS]
+    return ' '.join(f'"{termino}"*' for termino in terminos)
+
+
+def _resaltar(fragmento):
+    return mark_safe(
+        escape(fragmento).replace(_INICIO_MARCA, '<mark>').replace(_FIN_MARCA, '</mark>')
+    )
+
+
+def buscar(texto, limite=MAX_RESULTADOS):
+    """
+    Documentos que coinciden con el texto, del más al menos relevante.
+    Cada resultado es un dict con tipo, etiqueta, paciente, fecha y el
+    fragmento con las coincidencias resaltadas (HTML ya escapado).
+    """
+    from .models import Paciente
+
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return []
+
+    pesos = ', '.join(str(peso) for peso in PESOS)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT tipo, paciente_id, fecha,
+                   snippet({TABLA}, -1, %s, %s, '…', %s)
+            FROM {TABLA}
+            WHERE {TABLA} MATCH %s
+            ORDER BY bm25({TABLA}, {pesos})
+            LIMIT %s
+        """, [_INICIO_MARCA, _FIN_MARCA, PALABRAS_FRAGMENTO, consulta, limite])
+        filas = cursor.fetchall()
+
+    pacientes = Paciente.objects.select_related('usuario').only(
+        'id', 'usuario__first_name', 'usuario__last_name'
+    ).in_bulk({fila[1] for fila in filas})
+
+    resultados = []
+    for tipo, paciente_id, fecha, fragmento in filas:
+        paciente = pacientes.get(paciente_id)
+        if paciente is None:
+            continue
+        resultados.append({
+            'tipo': tipo,
+            'etiqueta': ETIQUETAS[tipo],
+            'paciente': paciente,
+            'fecha': fecha or None,
+            'fragmento': _resaltar(fragmento),
+        })
+    return resultados
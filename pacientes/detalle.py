@@ -0,0 +1,144 @@
+"""
+Datos de la página de detalle de un paciente.
+
+La página se renderiza solo con un resumen (unas pocas consultas agregadas,
+sin importar cuántos años de historial tenga el paciente). El historial y los
+turnos se piden después, de a una página, a las APIs JSON; cada página sigue
+desde la anterior con un cursor sobre el mismo orden que el índice
+(registro_paciente_fecha_idx y turno_paciente_fecha_idx), sin OFFSET.
+"""
+from datetime import date, time
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from turnos.lecturas import TurnoPaciente, armador_url_detalle, proximo_turno_activo
+from turnos.models import Turno
+from .analitica import tendencias_paciente
+from .listado import codificar_clave, decodificar_clave
+from .models import RegistroHistorial
+
+TAMANIO_PAGINA_HISTORIAL = 20
+TAMANIO_PAGINA_TURNOS = 20
+MAX_TAMANIO_PAGINA = 100
+
+
+def resumen_paciente(paciente):
+    """Datos de cabecera: último peso, variación, tendencias y estado de los turnos."""
+    historial = RegistroHistorial.objects.filter(paciente=paciente)
+    ultimo = historial.order_by('-fecha', 'id').first()
+    primero = historial.order_by('fecha', '-id').first()
+
+    turnos = Turno.objects.filter(paciente=paciente)
+    por_estado = dict(turnos.values_list('estado').annotate(cantidad=Count('id')).order_by())
+    proximo = proximo_turno_activo(paciente, timezone.localdate())
+
+    return {
+        'registros': historial.count(),
+        'ultimo_registro': ultimo,
+        'primer_registro': primero,
+        'variacion_peso': ultimo.peso - primero.peso if ultimo else None,
+        'tendencias': tendencias_paciente(paciente),
+        'turnos_por_estado': por_estado,
+        'turnos_totales': sum(por_estado.values()),
+        'proximo_turno': proximo,
+    }
+
+
+def _decimal(valor):
+    return None if valor is None else str(valor)
+
+
+def pagina_historial(paciente, cursor=None, tamanio=TAMANIO_PAGINA_HISTORIAL):
+    """
+    Registros del paciente del más reciente al más viejo.
+    Devuelve (items, cursor_siguiente).
+    """
+    registros = RegistroHistorial.objects.filter(paciente=paciente).only(
+        'id', 'fecha', 'peso', 'circunferencia_cintura', 'circunferencia_cadera', 'notas'
+    ).order_by('-fecha', 'id')
+
+    posicion = decodificar_clave(cursor, (str, int)) if cursor else None
+    if posicion:
+        try:
+            fecha, registro_id = date.fromisoformat(posicion[0]), posicion[1]
+        except ValueError:
+            fecha = None
+        if fecha:
+            registros = registros.filter(
+                Q(fecha__lte=fecha),
+                Q(fecha__lt=fecha) | Q(fecha=fecha, id__gt=registro_id),
+            )
+
+    filas = list(registros[:tamanio + 1])
+    siguiente = None
+    if len(filas) > tamanio:
+        filas = filas[:tamanio]
+        siguiente = codificar_clave([filas[-1].fecha.isoformat(), filas[-1].id])
+
+    items = [
+        {
+            'id': registro.id,
+            'fecha': registro.fecha.isoformat(),
+            'peso': _decimal(registro.peso),
+            'cintura': _decimal(registro.circunferencia_cintura),
+            'cadera': _decimal(registro.circunferencia_cadera),
+            'notas': registro.notas,
+        }
+        for registro in filas
+    ]
+    return items, siguiente
+
+
+def pagina_turnos(paciente, cursor=None, tamanio=TAMANIO_PAGINA_TURNOS):
+    """
+    Turnos del paciente del más reciente al más viejo.
+    Devuelve (items, cursor_siguiente).
+    """
+    turnos = Turno.objects.filter(paciente=paciente).order_by('-fecha', '-hora', '-id')
+
+    posicion = decodificar_clave(cursor, (str, str, int)) if cursor else None
+    if posicion:
+        try:
+            fecha, hora, turno_id = date.fromisoformat(posicion[0]), time.fromisoformat(posicion[1]), posicion[2]
+        except ValueError:
+            fecha = None
+        if fecha:
+            turnos = turnos.filter(
+                Q(fecha__lte=fecha),
+                Q(fecha__lt=fecha)
+                | Q(fecha=fecha, hora__lt=hora)
+                | Q(fecha=fecha, hora=hora, id__lt=turno_id),
+            )
+
+    filas = TurnoPaciente.leer(turnos[:tamanio + 1])
+    siguiente = None
+    if len(filas) > tamanio:
+        filas = filas[:tamanio]
+        ultimo = filas[-1]
+        siguiente = codificar_clave([ultimo.fecha.isoformat(), ultimo.hora.isoformat(), ultimo.id])
+
+    url_detalle = armador_url_detalle()
+
+    items = [
+        {
+            'id': turno.id,
+            'url': url_detalle(turno.id),
+            'fecha': turno.fecha.isoformat(),
+            'hora': f"{turno.hora:%H:%M}",
+            'estado': turno.estado,
+            'estado_display': turno.get_estado_display(),
+            'motivo': turno.motivo,
+        }
+        for turno in filas
+    ]
+    return items, siguiente
+
+
+def tamanio_pedido(request, por_defecto):
+    """Tamaño de página pedido por GET (?cantidad=), acotado."""
+    try:
+        cantidad = int(request.GET.get('cantidad', por_defecto))
+    except ValueError:
+        return por_defecto
+    return max(1, min(cantidad, MAX_TAMANIO_PAGINA))
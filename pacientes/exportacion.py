@@ -0,0 +1,158 @@
+"""
+Exportación de turnos e historial de pacientes en CSV o JSON Lines.
+
+Las filas se leen con values_list() de a un bloque por consulta (ver
+core/consultas.py): no se instancian modelos ni queda un cursor abierto
+mientras se envía el archivo, así que exportar años de datos usa la misma
+memoria que exportar un día y no bloquea las escrituras de la base. Las
+líneas se arman de a un bloque y se devuelven como generador, para
+StreamingHttpResponse o para escribirlas en un archivo.
+"""
+import csv
+import json
+from datetime import date, time
+from decimal import Decimal
+
+from core.consultas import en_bloques
+from turnos.models import Turno
+from .models import RegistroHistorial
+
+TAMANIO_BLOQUE = 2000
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Por cada tipo: columnas del archivo -> campo de la consulta
+COLUMNAS = {
+    'turnos': (
+        ('id', 'id'),
+        ('fecha', 'fecha'),
+        ('hora', 'hora'),
+        ('estado', 'estado'),
+        ('paciente_id', 'paciente_id'),
+        ('username', 'paciente__usuario__username'),
+        ('apellido', 'paciente__usuario__last_name'),
+        ('nombre', 'paciente__usuario__first_name'),
+        ('motivo', 'motivo'),
+        ('notas_profesional', 'notas_profesional'),
+    ),
+    'historial': (
+        ('id', 'id'),
+        ('fecha', 'fecha'),
+        ('paciente_id', 'paciente_id'),
+        ('username', 'paciente__usuario__username'),
+        ('apellido', 'paciente__usuario__last_name'),
+        ('nombre', 'paciente__usuario__first_name'),
+        ('peso', 'peso'),
+        ('cintura', 'circunferencia_cintura'),
+        ('cadera', 'circunferencia_cadera'),
+        ('notas', 'notas'),
+    ),
+}
+
+
+class FiltroInvalido(ValueError):
+    pass
+
+
+def leer_filtros(datos):
+    """
+    Filtros de la exportación a partir de un dict de textos (GET u opciones
+    del comando): desde, hasta, estado y paciente. Levanta FiltroInvalido.
+    """
+    filtros = {}
+    for clave in ('desde', 'hasta'):
+        if datos.get(clave):
+            try:
+                filtros[clave] = date.fromisoformat(datos[clave])
+            except ValueError:
+                raise FiltroInvalido(f'{clave} debe tener el formato AAAA-MM-DD')
+    if datos.get('estado'):
+        if datos['estado'] not in dict(Turno.ESTADO_CHOICES):
+            raise FiltroInvalido(f"estado desconocido: {datos['estado']}")
+        filtros['estado'] = datos['estado']
+    if datos.get('paciente'):
+        try:
+            filtros['paciente'] = int(datos['paciente'])
+        except ValueError:
+            raise FiltroInvalido('paciente debe ser un id numérico')
+    return filtros
+
+
+# Orden de cada tipo; también es el cursor de lectura por bloques
+ORDEN = {
+    'turnos': ('fecha', 'hora', 'id'),
+    'historial': ('fecha', 'id'),
+}
+
+
+def _filtrar(tipo, desde=None, hasta=None, estado=None, paciente=None):
+    if tipo == 'turnos':
+        filas = Turno.objects.all()
+        if estado:
+            filas = filas.filter(estado=estado)
+    elif tipo == 'historial':
+        filas = RegistroHistorial.objects.all()
+    else:
+        raise FiltroInvalido(f'tipo de exportación desconocido: {tipo}')
+
+    if desde:
+        filas = filas.filter(fecha__gte=desde)
+    if hasta:
+        filas = filas.filter(fecha__lte=hasta)
+    if paciente:
+        filas = filas.filter(paciente_id=paciente)
+    return filas
+
+
+def _texto(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, time):
+        return f'{valor:%H:%M}'
+    if isinstance(valor, (date, Decimal)):
+        return str(valor)
+    return valor
+
+
+class _Eco:
+    """Archivo falso para csv.writer: devuelve la línea en lugar de guardarla."""
+
+    def write(self, valor):
+        return valor
+
+
+def _lineas_csv(columnas, filas):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(columnas)
+    for fila in filas:
+        yield escritor.writerow(['' if valor is None else _texto(valor) for valor in fila])
+
+
+def _lineas_jsonl(columnas, filas):
+    for fila in filas:
+        yield json.dumps(dict(zip(columnas, map(_texto, fila))), ensure_ascii=False) + '\n'
+
+
+def exportar(tipo, formato='csv', tamanio_bloque=TAMANIO_BLOQUE, **filtros):
+    """
+    Generador con el contenido del archivo en bloques de texto de
+    `tamanio_bloque` filas cada uno.
+    """
+    if formato not in FORMATOS:
+        raise FiltroInvalido(f'formato desconocido: {formato}')
+    columnas = [columna for columna, _ in COLUMNAS[tipo]]
+    campos = [campo for _, campo in COLUMNAS[tipo]]
+    filas = en_bloques(_filtrar(tipo, **filtros), campos, ORDEN[tipo], tamanio_bloque)
+    lineas = (_lineas_csv if formato == 'csv' else _lineas_jsonl)(columnas, filas)
+
+    # Un bloque por vez: ni una escritura por fila ni el archivo entero en memoria
+    bloque = []
+    for linea in lineas:
+        bloque.append(linea)
+        if len(bloque) == tamanio_bloque:
+            yield ''.join(bloque)
+            bloque = []
+    if bloque:
+        yield ''.join(bloque)
@@ -0,0 +1,265 @@
+"""
+Importación masiva de pacientes y su historial desde CSV.
+
+Cada fila del CSV es una medición de un paciente identificado por `username`;
+las columnas de datos personales se toman de la primera fila de cada paciente
+nuevo (un paciente que ya existe no se modifica). Una fila sin `fecha` ni
+`peso` solo da de alta al paciente. Se guarda una medición por paciente y
+fecha: las que ya están en la base (o repetidas en el archivo) se omiten, así
+que volver a importar un archivo, o retomarlo después de un lote que falló,
+no duplica el historial.
+
+El archivo se lee de a una fila y se procesa en lotes: cada lote se valida,
+busca en una sola consulta los usuarios que ya existen y escribe Usuario,
+Paciente y RegistroHistorial con bulk_create dentro de su propia transacción.
+No se guarda nada entre lotes, así que la memoria no depende del tamaño del
+archivo. Si un lote falla se deshace solo ese lote.
+
+bulk_create no dispara señales: el índice de búsqueda y las tendencias
+cacheadas se actualizan acá mismo para los objetos de cada lote.
+"""
+import csv
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import partial
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from usuarios.models import Usuario
+from . import busqueda
+from .analitica import invalidar_tendencias
+from .models import Paciente, RegistroHistorial
+
+TAMANIO_LOTE = 1000
+# Errores que se conservan para el resumen; el resto solo se cuentan
+MAX_ERRORES_GUARDADOS = 100
+
+COLUMNAS = (
+    'username', 'email', 'first_name', 'last_name', 'telefono', 'fecha_nacimiento',
+    'altura', 'alergias', 'medicamentos', 'observaciones',
+    'fecha', 'peso', 'cintura', 'cadera', 'notas',
+)
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y')
+
+
+class FilaInvalida(ValueError):
+    pass
+
+
+class ResultadoImportacion:
+    """Totales de una importación, actualizados lote a lote."""
+
+    def __init__(self):
+        self.filas = 0
+        self.usuarios = 0
+        self.pacientes = 0
+        self.registros = 0
+        self.registros_existentes = 0
+        self.cantidad_errores = 0
+        self.errores = []
+        self._inicio = time.perf_counter()
+
+    @property
+    def segundos(self):
+        return time.perf_counter() - self._inicio
+
+    @property
+    def filas_por_segundo(self):
+        return self.filas / self.segundos if self.segundos else 0.0
+
+    def agregar_error(self, linea, mensaje):
+        self.cantidad_errores += 1
+        if len(self.errores) < MAX_ERRORES_GUARDADOS:
+            self.errores.append((linea, mensaje))
+
+
+# Validación
+
+def _fecha(valor, columna, requerida=False):
+    if not valor:
+        if requerida:
+            raise FilaInvalida(f'falta {columna}')
+        return None
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            pass
+    raise FilaInvalida(f'{columna} inválida: {valor!r}')
+
+
+def _decimal(valor, columna, maximo, requerido=False):
+    """Decimal con 2 decimales; acepta coma como separador (planillas en español)."""
+    if not valor:
+        if requerido:
+            raise FilaInvalida(f'falta {columna}')
+        return None
+    try:
+        numero = Decimal(valor.replace(',', '.')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise FilaInvalida(f'{columna} inválido: {valor!r}')
+    if not 0 < numero < maximo:
+        raise FilaInvalida(f'{columna} fuera de rango: {valor!r}')
+    return numero
+
+
+def validar_fila(fila):
+    """
+    Normaliza una fila del CSV. Devuelve (datos_usuario, datos_paciente,
+    datos_registro o None) o levanta FilaInvalida.
+    """
+    fila = {columna: (fila.get(columna) or '').strip() for columna in COLUMNAS}
+    if not fila['username']:
+        raise FilaInvalida('falta username')
+
+    usuario = {
+        'username': fila['username'],
+        'email': fila['email'],
+        'first_name': fila['first_name'][:150],
+        'last_name': fila['last_name'][:150],
+        'telefono': fila['telefono'][:20],
+        'fecha_nacimiento': _fecha(fila['fecha_nacimiento'], 'fecha_nacimiento'),
+    }
+    try:
+        # Los validadores del modelo (username, email, largos), como en el
+        # alta masiva de usuarios/alta_masiva.py
+        Usuario(tipo='paciente', **usuario).clean_fields(exclude=['password'])
+    except ValidationError as error:
+        raise FilaInvalida(' '.join(error.messages))
+    paciente = {
+        'altura': _decimal(fila['altura'], 'altura', 3),
+        'alergias': fila['alergias'],
+        'medicamentos': fila['medicamentos'],
+        'observaciones': fila['observaciones'],
+    }
+
+    registro = None
+    if fila['fecha'] or fila['peso']:
+        registro = {
+            'fecha': _fecha(fila['fecha'], 'fecha', requerida=True),
+            'peso': _decimal(fila['peso'], 'peso', 1000, requerido=True),
+            'circunferencia_cintura': _decimal(fila['cintura'], 'cintura', 1000),
+            'circunferencia_cadera': _decimal(fila['cadera'], 'cadera', 1000),
+            'notas': fila['notas'],
+        }
+    return usuario, paciente, registro
+
+
+# Escritura
+
+def importar_lote(filas, resultado):
+    """
+    Escribe un lote de filas ya validadas: lista de
+    (linea, datos_usuario, datos_paciente, datos_registro).
+    """
+    usernames = {usuario['username'] for _, usuario, _, _ in filas}
+    existentes = {
+        usuario.username: usuario
+        for usuario in Usuario.objects.filter(username__in=usernames).select_related('paciente')
+    }
+
+    nuevos_usuarios = {}
+    datos_pacientes = {}
+    for linea, usuario, paciente, _ in filas:
+        username = usuario['username']
+        if username not in existentes and username not in nuevos_usuarios:
+            nuevos_usuarios[username] = Usuario(
+                tipo='paciente', password=make_password(None), **usuario
+            )
+        datos_pacientes.setdefault(username, paciente)
+
+    Usuario.objects.bulk_create(nuevos_usuarios.values())
+    usuarios = {**existentes, **nuevos_usuarios}
+
+    # Perfiles de paciente para los usuarios nuevos y los que no tenían
+    nuevos_pacientes = []
+    for username, usuario in usuarios.items():
+        if usuario.tipo != 'paciente':
+            continue
+        if username in nuevos_usuarios or not hasattr(usuario, 'paciente'):
+            usuario.paciente = Paciente(usuario=usuario, **datos_pacientes[username])
+            nuevos_pacientes.append(usuario.paciente)
+    Paciente.objects.bulk_create(nuevos_pacientes)
+
+    # Mediciones que ya están en la base, de los pacientes que ya existían
+    vistos = set(
+        RegistroHistorial.objects.filter(
+            paciente_id__in={
+                usuario.paciente.id for usuario in existentes.values()
+                if usuario.tipo == 'paciente' and hasattr(usuario, 'paciente')
+            },
+            fecha__in={registro['fecha'] for _, _, _, registro in filas if registro},
+        ).values_list('paciente_id', 'fecha')
+    )
+    registros = []
+    for linea, usuario, _, registro in filas:
+        destino = usuarios[usuario['username']]
+        if destino.tipo != 'paciente':
+            resultado.agregar_error(linea, f"{usuario['username']} no es un paciente")
+            continue
+        if not registro:
+            continue
+        if (destino.paciente.id, registro['fecha']) in vistos:
+            resultado.registros_existentes += 1
+            continue
+        vistos.add((destino.paciente.id, registro['fecha']))
+        registros.append(RegistroHistorial(paciente=destino.paciente, **registro))
+    RegistroHistorial.objects.bulk_create(registros)
+
+    for paciente in nuevos_pacientes:
+        busqueda.indexar_paciente(paciente)
+    for registro in registros:
+        if registro.notas:
+            busqueda.indexar_registro(registro)
+    for paciente_id in {registro.paciente_id for registro in registros}:
+        transaction.on_commit(partial(invalidar_tendencias, paciente_id))
+
+    resultado.usuarios += len(nuevos_usuarios)
+    resultado.pacientes += len(nuevos_pacientes)
+    resultado.registros += len(registros)
+
+
+def _lotes_validados(lector, tamanio_lote, resultado):
+    """Agrupa las filas válidas en lotes; las inválidas van a los errores."""
+    lote = []
+    for fila in lector:
+        resultado.filas += 1
+        try:
+            lote.append((lector.line_num, *validar_fila(fila)))
+        except FilaInvalida as error:
+            resultado.agregar_error(lector.line_num, str(error))
+        if resultado.filas % tamanio_lote == 0:
+            yield lote
+            lote = []
+    if lote or resultado.filas % tamanio_lote:
+        yield lote
+
+
+def importar_csv(archivo, tamanio_lote=TAMANIO_LOTE, delimitador=',', al_avanzar=None):
+    """
+    Importa un CSV ya abierto en modo texto. Llama a al_avanzar(resultado)
+    después de cada lote (confirmado o, si falló en la base, deshecho con
+    sus líneas en los errores) y devuelve el ResultadoImportacion.
+    """
+    lector = csv.DictReader(archivo, delimiter=delimitador)
+    faltantes = {'username'} - set(lector.fieldnames or ())
+    if faltantes:
+        raise FilaInvalida(f"el archivo no tiene la columna {', '.join(sorted(faltantes))}")
+
+    resultado = ResultadoImportacion()
+    for lote in _lotes_validados(lector, tamanio_lote, resultado):
+        if lote:
+            try:
+                with transaction.atomic():
+                    importar_lote(lote, resultado)
+            except DatabaseError as error:
+                # Por ejemplo un username registrado mientras se importaba:
+                # se pierde solo este lote y se sigue con el próximo
+                for linea, *_ in lote:
+                    resultado.agregar_error(linea, f'lote no importado: {error}')
+        if al_avanzar:
+            al_avanzar(resultado)
+    return resultado
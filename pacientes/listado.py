@@ -0,0 +1,146 @@
+"""
+Lista de pacientes paginada por cursor y búsqueda por prefijo de nombre.
+
+La lista se ordena por (apellido, nombre, id del usuario) y cada página
+continúa desde la última fila de la anterior (keyset): la consulta arranca
+directo en esa posición del índice `usuario_apellido_nombre_idx` y lee solo
+una página, sin OFFSET, así que cuesta lo mismo en la primera página que en
+la última aunque haya 100.000 pacientes.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.urls import reverse
+
+from usuarios.models import Usuario, clave_busqueda
+from .models import Paciente
+
+TAMANIO_PAGINA = 50
+MAX_SUGERENCIAS = 10
+
+
+def codificar_clave(valores):
+    """Cursor opaco (base64 de JSON) con los valores de la clave de orden."""
+    return base64.urlsafe_b64encode(json.dumps(list(valores)).encode()).decode('ascii')
+
+
+def decodificar_clave(cursor, tipos):
+    """
+    Valores de un cursor, validados contra la tupla de tipos esperados.
+    Devuelve None si el cursor no es válido.
+    """
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(valores, list) or len(valores) != len(tipos):
+        return None
+    if not all(isinstance(valor, tipo) for valor, tipo in zip(valores, tipos)):
+        return None
+    return tuple(valores)
+
+
+def codificar_cursor(paciente):
+    """Cursor que apunta a la posición de un paciente en la lista."""
+    usuario = paciente.usuario
+    return codificar_clave([usuario.last_name, usuario.first_name, usuario.id])
+
+
+def decodificar_cursor(cursor):
+    """(apellido, nombre, id) de un cursor, o None si no es válido."""
+    return decodificar_clave(cursor, (str, str, int))
+
+
+def normalizar_prefijo(texto):
+    """El prefijo normalizado como las claves de búsqueda de Usuario ('Álv' -> 'alv')."""
+    return clave_busqueda((texto or '').strip())
+
+
+def _filtro_prefijo(campo, prefijo):
+    """
+    Rango [prefijo, siguiente) sobre una clave de búsqueda: a diferencia de
+    LIKE 'prefijo%' lo resuelve el índice de la clave.
+    """
+    siguiente = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+    return Q(**{f'{campo}__gte': prefijo, f'{campo}__lt': siguiente})
+
+
+def usuarios_ordenados():
+    """
+    Usuarios con perfil de paciente en el orden de la lista, con solo las
+    columnas que se muestran. La consulta parte de Usuario para que el orden
+    completo (incluido el id) salga del índice y no de un ordenamiento aparte.
+    """
+    return Usuario.objects.filter(
+        paciente__isnull=False
+    ).select_related('paciente').only(
+        'id', 'first_name', 'last_name', 'email', 'telefono', 'paciente__id'
+    ).order_by('last_name', 'first_name', 'id')
+
+
+def pagina_pacientes(cursor=None, prefijo='', tamanio=TAMANIO_PAGINA):
+    """
+    Una página de la lista de pacientes.
+    Devuelve (pacientes, cursor_siguiente); cursor_siguiente es None en la
+    última página. Con prefijo se filtra por el comienzo del apellido.
+    """
+    usuarios = usuarios_ordenados()
+
+    prefijo = normalizar_prefijo(prefijo)
+    if prefijo:
+        usuarios = usuarios.filter(_filtro_prefijo('apellido_busqueda', prefijo))
+
+    posicion = decodificar_cursor(cursor) if cursor else None
+    if posicion:
+        apellido, nombre, usuario_id = posicion
+        # La condición redundante sobre el apellido le da a SQLite el punto de
+        # partida en el índice; el OR resuelve los empates
+        usuarios = usuarios.filter(
+            Q(last_name__gte=apellido),
+            Q(last_name__gt=apellido)
+            | Q(last_name=apellido, first_name__gt=nombre)
+            | Q(last_name=apellido, first_name=nombre, id__gt=usuario_id),
+        )
+
+    # Se pide una fila de más para saber si hay página siguiente
+    pacientes = [usuario.paciente for usuario in usuarios[:tamanio + 1]]
+    if len(pacientes) > tamanio:
+        pacientes = pacientes[:tamanio]
+        return pacientes, codificar_cursor(pacientes[-1])
+    return pacientes, None
+
+
+def sugerencias(texto, limite=MAX_SUGERENCIAS):
+    """
+    Pacientes cuyo apellido o nombre empieza con el texto, para el
+    autocompletado, con la URL de su ficha. Cada campo se busca por separado sobre su índice y con
+    límite, así la respuesta no depende de cuántos pacientes coinciden.
+    """
+    prefijo = normalizar_prefijo(texto)
+    if not prefijo:
+        return []
+
+    encontrados = {}
+    for campo in ('usuario__apellido_busqueda', 'usuario__nombre_busqueda'):
+        coincidencias = Paciente.objects.filter(
+            _filtro_prefijo(campo, prefijo)
+        ).order_by(campo).values(
+            'id', 'usuario__first_name', 'usuario__last_name'
+        )[:limite]
+        for fila in coincidencias:
+            encontrados[fila['id']] = fila
+
+    ordenados = sorted(
+        encontrados.values(),
+        key=lambda fila: (clave_busqueda(fila['usuario__last_name']), clave_busqueda(fila['usuario__first_name']), fila['id']),
+    )
+    return [
+        {
+            'id': fila['id'],
+            'apellido': fila['usuario__last_name'],
+            'nombre': f"{fila['usuario__first_name']} {fila['usuario__last_name']}".strip(),
+            'url': reverse('pacientes:detalle', args=[fila['id']]),
+        }
+        for fila in ordenados[:limite]
+    ]
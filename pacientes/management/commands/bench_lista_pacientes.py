@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import base_de_prueba, cronometrar, crear_pacientes
+from pacientes.listado import pagina_pacientes, sugerencias, codificar_cursor, usuarios_ordenados
+from pacientes.models import Paciente
+
+
+class Command(BaseCommand):
+    help = 'Mide la lista de pacientes completa contra páginas por cursor (primera, media y última) y la búsqueda por prefijo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=100000)
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        cantidad = options['pacientes']
+        repeticiones = options['repeticiones']
+
+        with base_de_prueba():
+            crear_pacientes(cantidad)
+
+            def cursor_en(posicion):
+                usuario = usuarios_ordenados()[posicion]
+                return codificar_cursor(usuario.paciente)
+
+            cursor_medio = cursor_en(cantidad // 2)
+            cursor_final = cursor_en(cantidad - 60)
+
+            def lista_completa():
+                return list(Paciente.objects.select_related('usuario').all())
+
+            tiempos = [
+                ('lista completa (antes)', cronometrar(lista_completa, max(1, repeticiones // 10))),
+                ('primera página', cronometrar(lambda: pagina_pacientes(), repeticiones)),
+                ('página del medio', cronometrar(lambda: pagina_pacientes(cursor_medio), repeticiones)),
+                ('última página', cronometrar(lambda: pagina_pacientes(cursor_final), repeticiones)),
+                ('prefijo "apellido5"', cronometrar(lambda: pagina_pacientes(prefijo='apellido5'), repeticiones)),
+                ('sugerencias "nombre12"', cronometrar(lambda: sugerencias('nombre12'), repeticiones)),
+            ]
+
+        self.stdout.write(f'{cantidad} pacientes')
+        for nombre, (mejor, promedio) in tiempos:
+            self.stdout.write(f'  {nombre:24} mejor {mejor:9.2f} ms  promedio {promedio:9.2f} ms')
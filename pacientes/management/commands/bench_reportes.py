@@ -0,0 +1,81 @@
+import random
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.benchmarks import base_de_prueba, cronometrar, crear_pacientes
+from pacientes import reportes
+
+
+class Command(BaseCommand):
+    help = 'Mide el reporte poblacional (cambio de IMC y baja por turnos) sobre N pacientes x M registros.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=10000)
+        parser.add_argument('--registros', type=int, default=100, help='Registros por paciente')
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        cantidad = options['pacientes']
+        por_paciente = options['registros']
+        azar = random.Random(0)
+        hoy = date.today()
+
+        with base_de_prueba():
+            pacientes = crear_pacientes(cantidad)
+            # Carga directa en SQL: bulk_create de un millón de modelos
+            # tardaría más que todo lo que se quiere medir
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(
+                    'UPDATE pacientes_paciente SET altura = %s WHERE id = %s',
+                    [(round(azar.uniform(1.5, 1.9), 2), p.id) for p in pacientes],
+                )
+                for paciente in pacientes:
+                    peso = azar.uniform(60, 110)
+                    inicio = hoy - timedelta(weeks=por_paciente)
+                    filas = []
+                    for semana in range(por_paciente):
+                        peso += azar.gauss(-0.2, 0.6)
+                        filas.append((paciente.id, inicio + timedelta(weeks=semana), round(peso, 2), ''))
+                    cursor.executemany(
+                        'INSERT INTO pacientes_registrohistorial '
+                        '(paciente_id, fecha, peso, notas, fecha_creacion) VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)',
+                        filas,
+                    )
+                # Cada turno en una franja distinta hacia atrás (fecha y hora son únicas)
+                completados = [
+                    paciente.id for paciente in pacientes for _ in range(azar.randint(0, 15))
+                ]
+                cursor.executemany(
+                    "INSERT INTO turnos_turno (paciente_id, fecha, hora, estado, motivo, notas_profesional, "
+                    "fecha_creacion, fecha_actualizacion) VALUES (%s, %s, %s, 'completado', '', '', "
+                    "CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
+                    [
+                        (paciente_id, hoy - timedelta(days=n // 48 + 1), f'{n % 48 // 2:02d}:{n % 2 * 30:02d}')
+                        for n, paciente_id in enumerate(completados)
+                    ],
+                )
+
+            def historial_completo():
+                # Referencia: traer todas las filas a Python, como haría un
+                # cálculo que recorra el historial
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT paciente_id, fecha, peso FROM pacientes_registrohistorial')
+                    return cursor.fetchall()
+
+            repeticiones = options['repeticiones']
+            referencia = cronometrar(historial_completo, 1)
+            lectura = cronometrar(lambda: reportes.cargar_columnas(hoy), repeticiones)
+            total = cronometrar(lambda: reportes.reporte_poblacional(hoy), repeticiones)
+            resultado = reportes.reporte_poblacional(hoy)
+
+        self.stdout.write(f'{cantidad} pacientes x {por_paciente} registros')
+        self.stdout.write(f'  leer todo el historial: {referencia[0]:8.2f} ms')
+        self.stdout.write(f'  lectura por paciente:   mejor {lectura[0]:8.2f} ms  promedio {lectura[1]:8.2f} ms')
+        self.stdout.write(f'  reporte completo:       mejor {total[0]:8.2f} ms  promedio {total[1]:8.2f} ms')
+        for etiqueta, distribucion in resultado['cambio_imc'].items():
+            self.stdout.write(
+                f"  cambio de IMC {etiqueta}: {distribucion['pacientes']} pacientes, "
+                f"mediana {distribucion.get('percentiles', {}).get(50)}"
+            )
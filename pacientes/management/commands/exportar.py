@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes.exportacion import COLUMNAS, FORMATOS, FiltroInvalido, exportar, leer_filtros
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta turnos o historial de pacientes en CSV o JSON Lines, filtrando por rango '
+        'de fechas, estado y paciente. Se escribe de a bloques, sin cargar todo en memoria.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(COLUMNAS))
+        parser.add_argument('--formato', choices=sorted(FORMATOS), default='csv')
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD), inclusive')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD), inclusive')
+        parser.add_argument('--estado', help='Solo turnos en este estado')
+        parser.add_argument('--paciente', help='Id del paciente')
+        parser.add_argument('--salida', help='Archivo de salida (por defecto, la salida estándar)')
+
+    def handle(self, *args, **options):
+        try:
+            filtros = leer_filtros(options)
+        except FiltroInvalido as error:
+            raise CommandError(str(error))
+
+        inicio = time.perf_counter()
+        bloques = exportar(options['tipo'], options['formato'], **filtros)
+        if options['salida']:
+            with open(options['salida'], 'w', newline='', encoding='utf-8') as archivo:
+                archivo.writelines(bloques)
+            segundos = time.perf_counter() - inicio
+            self.stderr.write(self.style.SUCCESS(f"{options['salida']} escrito en {segundos:.1f} s."))
+        else:
+            for bloque in bloques:
+                self.stdout.write(bloque, ending='')
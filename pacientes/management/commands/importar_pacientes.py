@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes.importacion import COLUMNAS, TAMANIO_LOTE, FilaInvalida, importar_csv
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa pacientes y su historial de mediciones desde un CSV, en lotes. '
+        f"Columnas reconocidas: {', '.join(COLUMNAS)} (solo username es obligatoria). "
+        'Se puede volver a ejecutar con el mismo archivo: los pacientes que ya existen '
+        'no se modifican y las mediciones de una fecha que el paciente ya tiene se omiten.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--lote', type=int, default=TAMANIO_LOTE, help='Filas por transacción')
+        parser.add_argument('--delimitador', default=',')
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        def al_avanzar(resultado):
+            self.stderr.write(
+                f'\r{resultado.filas} filas ({resultado.filas_por_segundo:,.0f} filas/s)', ending=''
+            )
+
+        try:
+            with open(options['archivo'], newline='', encoding=options['encoding']) as archivo:
+                resultado = importar_csv(
+                    archivo, options['lote'], options['delimitador'], al_avanzar
+                )
+        except OSError as error:
+            raise CommandError(f'No se pudo leer el archivo: {error}')
+        except FilaInvalida as error:
+            raise CommandError(str(error))
+        self.stderr.write('')
+
+        for linea, mensaje in resultado.errores:
+            self.stderr.write(self.style.WARNING(f'Línea {linea}: {mensaje}'))
+        if resultado.cantidad_errores > len(resultado.errores):
+            self.stderr.write(self.style.WARNING(
+                f'... y {resultado.cantidad_errores - len(resultado.errores)} errores más.'
+            ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.filas} filas en {resultado.segundos:.1f} s '
+            f'({resultado.filas_por_segundo:,.0f} filas/s): '
+            f'{resultado.usuarios} usuarios, {resultado.pacientes} pacientes y '
+            f'{resultado.registros} registros creados ({resultado.registros_existentes} ya existían), '
+            f'{resultado.cantidad_errores} filas con errores.'
+        ))
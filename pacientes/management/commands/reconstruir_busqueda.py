@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from pacientes.busqueda import TABLA, reconstruir
+
+
+class Command(BaseCommand):
+    help = (
+        'Vuelve a armar el índice de búsqueda de texto completo de pacientes y notas. '
+        'Usar después de cargas masivas que no disparan señales.'
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            reconstruir()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {TABLA}')
+            documentos = cursor.fetchone()[0]
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'{documentos} documentos indexados en {segundos:.2f} s.'))
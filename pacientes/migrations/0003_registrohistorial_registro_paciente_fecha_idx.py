@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registrohistorial',
+            index=models.Index(fields=['paciente', '-fecha'], name='registro_paciente_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+
+CREAR_TABLA = """
+CREATE VIRTUAL TABLE pacientes_busqueda USING fts5(
+    tipo UNINDEXED,
+    paciente_id UNINDEXED,
+    fecha UNINDEXED,
+    nombre,
+    alergias,
+    medicamentos,
+    observaciones,
+    notas,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+
+# Documentos de los datos existentes. Es una copia de pacientes.busqueda.reconstruir()
+# al momento de esta migración (rowid = id * 3 + tipo). No se importa el
+# módulo porque su SQL sigue al esquema actual y no al de esta migración.
+INDEXAR_EXISTENTES = [
+    """
+    INSERT INTO pacientes_busqueda (rowid, tipo, paciente_id, fecha, nombre, alergias, medicamentos, observaciones, notas)
+    SELECT p.id * 3 + 0, 'paciente', p.id, '',
+           trim(u.first_name || ' ' || u.last_name), p.alergias, p.medicamentos, p.observaciones, ''
+    FROM pacientes_paciente p JOIN usuarios_usuario u ON u.id = p.usuario_id
+    """,
+    """
+    INSERT INTO pacientes_busqueda (rowid, tipo, paciente_id, fecha, nombre, alergias, medicamentos, observaciones, notas)
+    SELECT id * 3 + 1, 'registro', paciente_id, fecha, '', '', '', '', notas
+    FROM pacientes_registrohistorial WHERE notas <> ''
+    """,
+    """
+    INSERT INTO pacientes_busqueda (rowid, tipo, paciente_id, fecha, nombre, alergias, medicamentos, observaciones, notas)
+    SELECT id * 3 + 2, 'turno', paciente_id, fecha, '', '', '', '', notas_profesional
+    FROM turnos_turno WHERE notas_profesional <> ''
+    """,
+    "INSERT INTO pacientes_busqueda (pacientes_busqueda) VALUES ('optimize')",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0003_registrohistorial_registro_paciente_fecha_idx'),
+        ('turnos', '0005_cambiohorario'),
+        ('usuarios', '0002_usuario_indices_nombre'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREAR_TABLA, 'DROP TABLE pacientes_busqueda'),
+        migrations.RunSQL(INDEXAR_EXISTENTES, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0004_busqueda_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registrohistorial',
+            index=models.Index(fields=['fecha'], name='registro_fecha_idx'),
+        ),
+    ]
@@ -81,6 +81,12 @@ class RegistroHistorial(models.Model):
         verbose_name = 'Registro de Historial'
         verbose_name_plural = 'Registros de Historial'
         ordering = ['-fecha']
+        indexes = [
+            # paciente.historial.all() ya ordenado por fecha descendente
+            models.Index(fields=['paciente', '-fecha'], name='registro_paciente_fecha_idx'),
+            # Exportación completa por fecha, leída de a bloques
+            models.Index(fields=['fecha'], name='registro_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"{self.paciente} - {self.fecha}"
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+Reportes de resultados sobre toda la población de pacientes.
+
+Los datos se leen en forma columnar: una sola consulta devuelve una fila
+numérica por paciente (altura, primer y último peso, peso al comienzo de cada
+ventana, turnos completados) y se vuelca directo a un array de NumPy, sin
+instanciar modelos. Cada valor por paciente es una subconsulta LIMIT 1 que
+resuelve el índice registro_paciente_fecha_idx, así que SQLite lee unas pocas
+filas por paciente en lugar de transferir el historial completo a Python (con
+un millón de registros, solo crear las tuplas de Python ya tomaba más de un
+segundo).
+
+Las distribuciones, percentiles y agrupaciones se calculan después sobre las
+columnas, de forma vectorizada.
+"""
+from datetime import timedelta
+
+import numpy as np
+
+from django.db import connection
+from django.utils import timezone
+
+# Ventanas del reporte de cambio de IMC: (etiqueta, días)
+VENTANAS_IMC = (('3 meses', 91), ('6 meses', 182), ('12 meses', 365))
+PERCENTILES = (10, 25, 50, 75, 90)
+# Cortes del histograma de cambio de IMC (kg/m²)
+BORDES_HISTOGRAMA = np.arange(-5.0, 5.5, 1.0)
+# Los pacientes con esta cantidad de turnos completados o más van juntos
+MAX_GRUPO_TURNOS = 10
+
+# Columnas del array que devuelve cargar_columnas()
+ALTURA, PRIMER_PESO, ULTIMO_PESO, ULTIMA_FECHA, COMPLETADOS = range(5)
+PESO_AL_INICIO = {etiqueta: 5 + i for i, (etiqueta, _) in enumerate(VENTANAS_IMC)}
+
+_SQL_PESO = """
+    (SELECT r.peso FROM pacientes_registrohistorial r
+     WHERE r.paciente_id = p.id{condicion} ORDER BY r.fecha {orden}, r.id {desempate} LIMIT 1)
+"""
+
+
+def cargar_columnas(hoy):
+    """
+    Array (pacientes x columnas) de float con los datos de cada paciente
+    que tiene registros; NaN donde no hay dato.
+    """
+    pesos_al_inicio = [
+        _SQL_PESO.format(condicion=' AND r.fecha <= %s', orden='DESC', desempate='ASC')
+        for _ in VENTANAS_IMC
+    ]
+    sql = f"""
+        SELECT
+            p.altura,
+            {_SQL_PESO.format(condicion='', orden='ASC', desempate='DESC')},
+            {_SQL_PESO.format(condicion='', orden='DESC', desempate='ASC')},
+            -- Días desde 1970-01-01 (2440587.5 es su día juliano); unixepoch()
+            -- recién existe desde SQLite 3.38
+            (SELECT CAST(julianday(r.fecha) - 2440587.5 AS INTEGER) FROM pacientes_registrohistorial r
+             WHERE r.paciente_id = p.id ORDER BY r.fecha DESC LIMIT 1),
+            (SELECT COUNT(*) FROM turnos_turno t
+             WHERE t.paciente_id = p.id AND t.estado = 'completado'),
+            {', '.join(pesos_al_inicio)}
+        FROM pacientes_paciente p
+        WHERE EXISTS (SELECT 1 FROM pacientes_registrohistorial r WHERE r.paciente_id = p.id)
+    """
+    parametros = [hoy - timedelta(days=dias) for _, dias in VENTANAS_IMC]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        filas = cursor.fetchall()
+    return np.array(filas, dtype=float).reshape(len(filas), 5 + len(VENTANAS_IMC))
+
+
+def _distribucion(valores):
+    if len(valores) == 0:
+        return {'pacientes': 0}
+    conteos, _ = np.histogram(np.clip(valores, BORDES_HISTOGRAMA[0], BORDES_HISTOGRAMA[-1]), BORDES_HISTOGRAMA)
+    percentiles = np.percentile(valores, PERCENTILES)
+    return {
+        'pacientes': int(len(valores)),
+        'promedio': round(float(valores.mean()), 2),
+        'percentiles': {p: round(float(v), 2) for p, v in zip(PERCENTILES, percentiles)},
+        'histograma': [
+            {
+                'desde': float(desde),
+                'hasta': float(hasta),
+                'pacientes': int(conteo),
+                'porcentaje': round(100 * int(conteo) / len(valores), 1),
+            }
+            for desde, hasta, conteo in zip(BORDES_HISTOGRAMA[:-1], BORDES_HISTOGRAMA[1:], conteos)
+        ],
+    }
+
+
+def cambio_imc_por_ventana(columnas, hoy):
+    """
+    Distribución del cambio de IMC en cada ventana: IMC del último registro
+    menos el del último registro anterior al comienzo de la ventana. Entran
+    los pacientes con altura, con algún registro dentro de la ventana y con
+    otro anterior a ella.
+    """
+    altura = columnas[:, ALTURA]
+    ultimo = columnas[:, ULTIMO_PESO]
+    hoy_dia = (np.datetime64(hoy, 'D') - np.datetime64('1970-01-01', 'D')).astype(np.int64)
+
+    resultado = {}
+    for etiqueta, dias in VENTANAS_IMC:
+        al_inicio = columnas[:, PESO_AL_INICIO[etiqueta]]
+        validos = (
+            (altura > 0)
+            & ~np.isnan(al_inicio)
+            & (columnas[:, ULTIMA_FECHA] > hoy_dia - dias)
+        )
+        cambio_peso = ultimo[validos] - al_inicio[validos]
+        resultado[etiqueta] = _distribucion(cambio_peso / altura[validos] ** 2)
+    return resultado
+
+
+def baja_por_turnos_completados(columnas):
+    """
+    Peso perdido en promedio (primer registro menos último) agrupado por la
+    cantidad de turnos completados del paciente.
+    """
+    baja = columnas[:, PRIMER_PESO] - columnas[:, ULTIMO_PESO]
+    grupos = np.minimum(columnas[:, COMPLETADOS], MAX_GRUPO_TURNOS).astype(np.int64)
+
+    pacientes_por_grupo = np.bincount(grupos, minlength=MAX_GRUPO_TURNOS + 1)
+    suma_por_grupo = np.bincount(grupos, weights=baja, minlength=MAX_GRUPO_TURNOS + 1)
+    return [
+        {
+            'turnos': f'{grupo}+' if grupo == MAX_GRUPO_TURNOS else str(grupo),
+            'pacientes': int(cantidad),
+            'baja_promedio': round(float(suma_por_grupo[grupo] / cantidad), 2),
+        }
+        for grupo, cantidad in enumerate(pacientes_por_grupo)
+        if cantidad
+    ]
+
+
+def reporte_poblacional(hoy=None):
+    """Todos los reportes del tablero, en estructuras listas para la plantilla."""
+    hoy = hoy or timezone.localdate()
+    columnas = cargar_columnas(hoy)
+    return {
+        'hoy': hoy,
+        'pacientes_con_registros': len(columnas),
+        'cambio_imc': cambio_imc_por_ventana(columnas, hoy),
+        'baja_por_turnos': baja_por_turnos_completados(columnas),
+    }
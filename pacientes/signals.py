@@ -0,0 +1,64 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from turnos.models import Turno
+from .models import Paciente, RegistroHistorial
+from . import busqueda
+from .analitica import invalidar_tendencias
+
+
+# El índice de búsqueda se escribe dentro de la misma transacción que el
+# cambio: si la transacción se deshace, el índice también. Las tendencias
+# cacheadas se descartan recién al confirmarse.
+
+def _invalidar_tendencias(paciente_id):
+    transaction.on_commit(partial(invalidar_tendencias, paciente_id))
+
+
+@receiver(post_save, sender=Paciente)
+def paciente_guardado(sender, instance, **kwargs):
+    busqueda.indexar_paciente(instance)
+    # El IMC depende de la altura
+    _invalidar_tendencias(instance.id)
+
+
+@receiver(post_delete, sender=Paciente)
+def paciente_eliminado(sender, instance, **kwargs):
+    busqueda.quitar('paciente', instance.id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def usuario_guardado(sender, instance, update_fields=None, **kwargs):
+    # El login guarda solo last_login: no hace falta reindexar
+    if update_fields is not None and not {'first_name', 'last_name'} & set(update_fields):
+        return
+    paciente = Paciente.objects.filter(usuario=instance).select_related('usuario').first()
+    if paciente:
+        busqueda.indexar_paciente(paciente)
+
+
+@receiver(post_save, sender=RegistroHistorial)
+def registro_guardado(sender, instance, **kwargs):
+    busqueda.indexar_registro(instance)
+    _invalidar_tendencias(instance.paciente_id)
+
+
+@receiver(post_delete, sender=RegistroHistorial)
+def registro_eliminado(sender, instance, **kwargs):
+    busqueda.quitar('registro', instance.id)
+    _invalidar_tendencias(instance.paciente_id)
+
+
+@receiver(post_save, sender=Turno)
+def turno_guardado(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'notas_profesional' not in update_fields:
+        return
+    busqueda.indexar_turno(instance)
+
+
+@receiver(post_delete, sender=Turno)
+def turno_eliminado(sender, instance, **kwargs):
+    busqueda.quitar('turno', instance.id)
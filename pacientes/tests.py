@@ -1,3 +1,470 @@
+import csv
+import io
+import json
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.db.models import Q
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from turnos.models import Turno
+from usuarios.models import Usuario
+from .analitica import tendencias_paciente
+from .busqueda import buscar
+from .exportacion import exportar
+from .importacion import importar_csv
+from .listado import pagina_pacientes, sugerencias, usuarios_ordenados
+from .models import Paciente, RegistroHistorial
+from .reportes import reporte_poblacional
+
+
+class PlanDeConsultasTests(TestCase):
+
+    def test_historial_usa_indice(self):
+        usuario = Usuario.objects.create_user('paciente', password='clave')
+        paciente = Paciente.objects.create(usuario=usuario)
+        RegistroHistorial.objects.create(paciente=paciente, fecha=date(2025, 1, 1), peso=80)
+
+        plan = paciente.historial.all().explain()
+
+        self.assertIn('USING INDEX registro_paciente_fecha_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_pagina_de_pacientes_arranca_en_el_cursor_del_indice(self):
+        plan = usuarios_ordenados().filter(
+            Q(last_name__gte='B'),
+            Q(last_name__gt='B') | Q(last_name='B', first_name__gt='A') | Q(last_name='B', first_name='A', id__gt=1),
+        )[:51].explain()
+
+        self.assertIn('USING INDEX usuario_apellido_nombre_idx (last_name>?)', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_sugerencias_usan_indice_de_la_clave(self):
+        plan = Paciente.objects.filter(
+            usuario__apellido_busqueda__gte='ga', usuario__apellido_busqueda__lt='gb'
+        ).order_by('usuario__apellido_busqueda')[:10].explain()
+
+        self.assertIn('INDEX usuario_apellido_busqueda_idx (apellido_busqueda>?', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class ListaPacientesTests(TestCase):
+
+    def setUp(self):
+        apellidos = ['Gómez', 'Gómez', 'García', 'Álvarez', 'Pérez', 'gil']
+        for i, apellido in enumerate(apellidos):
+            usuario = Usuario.objects.create_user(f'paciente{i}', first_name=f'Ana{i}', last_name=apellido)
+            Paciente.objects.create(usuario=usuario)
+
+    def test_las_paginas_recorren_todos_los_pacientes_en_orden(self):
+        vistos = []
+        cursor = None
+        while True:
+            pacientes, cursor = pagina_pacientes(cursor, tamanio=2)
+            vistos += [(p.usuario.last_name, p.usuario.first_name) for p in pacientes]
+            if cursor is None:
+                break
+
+        self.assertEqual(vistos, sorted(vistos))
+        self.assertEqual(len(vistos), 6)
+
+    def test_prefijo_sin_distinguir_mayusculas(self):
+        pacientes, _ = pagina_pacientes(prefijo='G')
+
+        self.assertEqual(
+            [p.usuario.last_name for p in pacientes],
+            ['García', 'Gómez', 'Gómez', 'gil'],
+        )
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        pacientes, _ = pagina_pacientes('no-es-un-cursor', tamanio=2)
+
+        self.assertEqual(pacientes[0].usuario.last_name, 'García')
+
+    def test_prefijo_sin_distinguir_acentos(self):
+        nunez = Paciente.objects.create(usuario=Usuario.objects.create_user('nunez', first_name='Eva', last_name='Ñuñez'))
+
+        for prefijo in ('álv', 'Álv', 'alv', 'ALV'):
+            pacientes, _ = pagina_pacientes(prefijo=prefijo)
+            self.assertEqual([p.usuario.last_name for p in pacientes], ['Álvarez'])
+        self.assertEqual([s['apellido'] for s in sugerencias('ñu')], ['Ñuñez'])
+        # Elegir la sugerencia abre la ficha del paciente
+        self.assertEqual(sugerencias('ñu')[0]['url'], reverse('pacientes:detalle', args=[nunez.id]))
+        self.assertEqual([s['apellido'] for s in sugerencias('nu')], ['Ñuñez'])
+
+    def test_la_clave_sigue_al_nombre(self):
+        usuario = Usuario.objects.get(username='paciente0')
+        usuario.last_name = 'Íñiguez'
+        usuario.save(update_fields=['last_name'])
+
+        self.assertEqual(Usuario.objects.get(pk=usuario.pk).apellido_busqueda, 'iniguez')
+        self.assertEqual([s['apellido'] for s in sugerencias('iñi')], ['Íñiguez'])
+
+    def test_sugerencias_por_nombre_o_apellido(self):
+        nombres = [s['nombre'] for s in sugerencias('pér')]
+        self.assertEqual(nombres, ['Ana4 Pérez'])
+        self.assertEqual(len(sugerencias('ana')), 6)
+        self.assertEqual(sugerencias(''), [])
+
+
+class BusquedaTests(TestCase):
+
+    def setUp(self):
+        usuario = Usuario.objects.create_user('ana', first_name='Ana', last_name='Pérez')
+        self.paciente = Paciente.objects.create(
+            usuario=usuario, alergias='Alergia al maní', medicamentos='Metformina 850 mg'
+        )
+
+    def test_busca_en_ficha_sin_acentos_ni_mayusculas(self):
+        resultados = buscar('perez')
+
+        self.assertEqual(len(resultados), 1)
+        self.assertEqual(resultados[0]['paciente'], self.paciente)
+        self.assertIn('<mark>Pérez</mark>', resultados[0]['fragmento'])
+
+    def test_notas_se_indexan_y_se_quitan_con_las_senales(self):
+        registro = RegistroHistorial.objects.create(
+            paciente=self.paciente, fecha=date(2025, 1, 1), peso=80, notas='Refiere hipotiroidismo'
+        )
+        self.assertEqual([r['tipo'] for r in buscar('hipotiro')], ['registro'])
+
+        registro.delete()
+        self.assertEqual(buscar('hipotiro'), [])
+
+    def test_cambio_de_nombre_reindexa_la_ficha(self):
+        usuario = self.paciente.usuario
+        usuario.last_name = 'Gómez'
+        usuario.save()
+
+        self.assertEqual(buscar('perez'), [])
+        self.assertEqual(len(buscar('gomez metformina')), 1)
+
+    def test_el_fragmento_se_escapa_y_la_sintaxis_fts_no_llega_a_la_consulta(self):
+        self.paciente.observaciones = '<script>alert(1)</script> maní'
+        self.paciente.save()
+
+        resultados = buscar('alert(1)*')
+        self.assertEqual(len(resultados), 1)
+        self.assertNotIn('<script>', resultados[0]['fragmento'])
+        self.assertEqual(buscar('"*'), [])
+
+    def test_ranking_prioriza_el_nombre(self):
+        otro = Paciente.objects.create(
+            usuario=Usuario.objects.create_user('beto', first_name='Beto', last_name='Ruiz'),
+            observaciones='Derivado por la Dra. Pérez',
+        )
+
+        self.assertEqual([r['paciente'] for r in buscar('pérez')], [self.paciente, otro])
+
+
+class DetallePacienteTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.profesional = Usuario.objects.create_user('pro', tipo='profesional')
+        self.paciente = Paciente.objects.create(
+            usuario=Usuario.objects.create_user('ana', first_name='Ana', last_name='Pérez')
+        )
+        # Varios registros por fecha para que el id desempate
+        RegistroHistorial.objects.bulk_create([
+            RegistroHistorial(paciente=self.paciente, fecha=date(2024, 1, 1 + i // 3), peso=70 + i)
+            for i in range(25)
+        ])
+        Turno.objects.bulk_create([
+            Turno(paciente=self.paciente, fecha=date(2024, 2, 1 + i // 2), hora=time(9 + i % 2))
+            for i in range(15)
+        ])
+        self.client.force_login(self.profesional)
+
+    def _recorrer(self, nombre_url):
+        url = reverse(nombre_url, args=[self.paciente.id])
+        vistos, cursor = [], None
+        while True:
+            datos = self.client.get(url, {'desde': cursor, 'cantidad': 4} if cursor else {'cantidad': 4}).json()
+            self.assertLessEqual(len(datos['items']), 4)
+            vistos += datos['items']
+            cursor = datos['siguiente']
+            if cursor is None:
+                return vistos
+
+    def test_historial_paginado_completo_y_en_orden(self):
+        registros = self._recorrer('pacientes:api_historial')
+
+        claves = [(r['fecha'], -r['id']) for r in registros]
+        self.assertEqual(len(registros), 25)
+        self.assertEqual(claves, sorted(claves, reverse=True))
+
+    def test_turnos_paginados_completos_y_en_orden(self):
+        turnos = self._recorrer('pacientes:api_turnos')
+
+        claves = [(t['fecha'], t['hora'], t['id']) for t in turnos]
+        self.assertEqual(len(turnos), 15)
+        self.assertEqual(claves, sorted(claves, reverse=True))
+
+    def test_detalle_renderiza_solo_el_resumen(self):
+        # Incluye la comprobación de que existe el usuario de la sesión, que
+        # todavía no está en el cache (usuarios/sesion.py)
+        with self.assertNumQueries(9):
+            respuesta = self.client.get(reverse('pacientes:detalle', args=[self.paciente.id]))
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['resumen']['registros'], 25)
+
+    def test_paginas_usan_indice(self):
+        desde = date(2024, 1, 5)
+        historial = RegistroHistorial.objects.filter(paciente=self.paciente).order_by('-fecha', 'id').filter(
+            Q(fecha__lte=desde), Q(fecha__lt=desde) | Q(fecha=desde, id__gt=1),
+        )[:21].explain()
+        turnos = Turno.objects.filter(paciente=self.paciente).order_by('-fecha', '-hora', '-id').filter(
+            Q(fecha__lte=desde), Q(fecha__lt=desde) | Q(fecha=desde, hora__lt=time(9)),
+        )[:21].explain()
+
+        self.assertIn('USING INDEX registro_paciente_fecha_idx', historial)
+        self.assertIn('USING INDEX turno_paciente_fecha_idx', turnos)
+        self.assertNotIn('TEMP B-TREE', historial + turnos)
+
+
+class TendenciasTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.paciente = Paciente.objects.create(
+            usuario=Usuario.objects.create_user('ana'), altura=Decimal('1.60')
+        )
+        # Baja 0,5 kg por semana durante 10 semanas
+        for semana in range(10):
+            RegistroHistorial.objects.create(
+                paciente=self.paciente,
+                fecha=date(2024, 1, 1) + timedelta(weeks=semana),
+                peso=Decimal('80') - Decimal('0.5') * semana,
+                circunferencia_cintura=90 if semana == 9 else None,
+                circunferencia_cadera=100 if semana == 9 else None,
+            )
+
+    def test_indicadores(self):
+        tendencias = tendencias_paciente(self.paciente)
+
+        self.assertEqual(tendencias['mediciones'], 10)
+        self.assertEqual(tendencias['peso_actual'], 75.5)
+        self.assertEqual(tendencias['imc_actual'], 29.5)
+        self.assertEqual(tendencias['icc_actual'], 0.9)
+        self.assertEqual(tendencias['tendencia_semanal'], -0.5)
+        self.assertEqual(tendencias['tendencia_r2'], 1.0)
+        self.assertEqual(tendencias['tasa_reciente_semanal'], -0.5)
+        # Las últimas 4 mediciones entran en la ventana de 28 días
+        self.assertEqual(tendencias['media_movil_actual'], 76.25)
+        self.assertEqual(tendencias['series']['tasa_semanal'][1:], [-0.5] * 9)
+
+    def test_se_cachea_y_un_registro_nuevo_lo_invalida(self):
+        tendencias_paciente(self.paciente)
+        with self.assertNumQueries(0):
+            tendencias_paciente(self.paciente)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RegistroHistorial.objects.create(paciente=self.paciente, fecha=date(2024, 3, 11), peso=70)
+
+        self.assertEqual(tendencias_paciente(self.paciente)['peso_actual'], 70.0)
+
+    def test_paciente_sin_registros(self):
+        otro = Paciente.objects.create(usuario=Usuario.objects.create_user('beto'))
+
+        self.assertIsNone(tendencias_paciente(otro))
+
+
+class ReportesTests(TestCase):
+
+    def _paciente(self, nombre, altura, pesos, completados=0):
+        paciente = Paciente.objects.create(usuario=Usuario.objects.create_user(nombre), altura=altura)
+        RegistroHistorial.objects.bulk_create([
+            RegistroHistorial(paciente=paciente, fecha=fecha, peso=peso) for fecha, peso in pesos
+        ])
+        Turno.objects.bulk_create([
+            Turno(paciente=paciente, fecha=date(2023, 1, 1) + timedelta(days=i), hora=time(9 + len(nombre)), estado='completado')
+            for i in range(completados)
+        ])
+        return paciente
+
+    def test_cambio_de_imc_y_baja_por_turnos(self):
+        hoy = date(2025, 1, 1)
+        # 2 m de altura: 4 kg menos son 1 punto de IMC
+        self._paciente('ana', 2, [(date(2024, 1, 1), 90), (date(2024, 9, 1), 88), (date(2024, 12, 1), 86)], completados=3)
+        # Sin registros dentro de los últimos 3 meses
+        self._paciente('beto', 2, [(date(2024, 1, 1), 80), (date(2024, 8, 1), 84)])
+        # Sin altura: no entra en el IMC pero sí en la baja por turnos
+        self._paciente('carla', None, [(date(2024, 1, 1), 70), (date(2024, 12, 1), 60)], completados=3)
+
+        reporte = reporte_poblacional(hoy)
+
+        self.assertEqual(reporte['pacientes_con_registros'], 3)
+        self.assertEqual(reporte['cambio_imc']['3 meses']['pacientes'], 1)
+        self.assertEqual(reporte['cambio_imc']['3 meses']['promedio'], -0.5)
+        self.assertEqual(reporte['cambio_imc']['12 meses']['pacientes'], 2)
+        self.assertEqual(reporte['cambio_imc']['12 meses']['percentiles'][10], -0.8)
+        self.assertEqual(reporte['cambio_imc']['12 meses']['promedio'], 0.0)
+        self.assertEqual(reporte['baja_por_turnos'], [
+            {'turnos': '0', 'pacientes': 1, 'baja_promedio': -4.0},
+            {'turnos': '3', 'pacientes': 2, 'baja_promedio': 7.0},
+        ])
+
+    def test_sin_registros(self):
+        reporte = reporte_poblacional(date(2025, 1, 1))
+
+        self.assertEqual(reporte['pacientes_con_registros'], 0)
+        self.assertEqual(reporte['cambio_imc']['3 meses'], {'pacientes': 0})
+        self.assertEqual(reporte['baja_por_turnos'], [])
+
+
+class ImportacionTests(TestCase):
+
+    CSV = (
+        'username,first_name,last_name,altura,fecha,peso,notas\n'
+        'ana,Ana,Pérez,"1,60",2024-01-01,"80,5",Inicio del plan\n'
+        'ana,,,,08/01/2024,80,\n'
+        'beto,Beto,Ruiz,,,,\n'
+        'carla,Carla,Gil,,2024-01-01,,\n'
+        ',Sin,Usuario,,2024-01-01,70,\n'
+    )
+
+    def test_importa_en_lotes_y_reporta_errores_por_linea(self):
+        resultado = importar_csv(io.StringIO(self.CSV), tamanio_lote=2)
+
+        self.assertEqual((resultado.filas, resultado.usuarios, resultado.pacientes, resultado.registros), (5, 2, 2, 2))
+        self.assertEqual(resultado.errores, [(5, 'falta peso'), (6, 'falta username')])
+
+        ana = Paciente.objects.get(usuario__username='ana')
+        self.assertEqual(ana.altura, Decimal('1.60'))
+        self.assertEqual(list(ana.historial.values_list('peso', flat=True)), [Decimal('80.00'), Decimal('80.50')])
+        self.assertFalse(ana.usuario.has_usable_password())
+        self.assertEqual([r['tipo'] for r in buscar('inicio plan')], ['registro'])
+
+    def test_un_lote_que_falla_en_la_base_no_corta_la_importacion(self):
+        original = RegistroHistorial.objects.bulk_create
+        llamadas = []
+
+        def falla_el_primero(objetos, *args, **kwargs):
+            llamadas.append(objetos)
+            if len(llamadas) == 1:
+                raise IntegrityError('UNIQUE constraint failed: usuarios_usuario.username')
+            return original(objetos, *args, **kwargs)
+
+        with mock.patch.object(RegistroHistorial.objects, 'bulk_create', side_effect=falla_el_primero):
+            resultado = importar_csv(io.StringIO(self.CSV), tamanio_lote=2)
+
+        # El primer lote (líneas 2 y 3) se deshizo entero; el resto se importó
+        self.assertEqual([linea for linea, _ in resultado.errores], [2, 3, 5, 6])
+        self.assertIn('lote no importado', resultado.errores[0][1])
+        self.assertFalse(Usuario.objects.filter(username='ana').exists())
+        self.assertEqual((resultado.usuarios, resultado.pacientes), (1, 1))
+        self.assertTrue(Paciente.objects.filter(usuario__username='beto').exists())
+
+    def test_reimportar_no_duplica_el_historial(self):
+        importar_csv(io.StringIO(self.CSV))
+        resultado = importar_csv(io.StringIO(self.CSV), tamanio_lote=2)
+
+        self.assertEqual((resultado.usuarios, resultado.pacientes, resultado.registros), (0, 0, 0))
+        self.assertEqual(resultado.registros_existentes, 2)
+
+        # Solo se agregan las fechas nuevas, una vez aunque se repitan en el archivo
+        resultado = importar_csv(io.StringIO(
+            'username,fecha,peso\nana,2024-01-15,79\nana,2024-01-01,81\nana,15/01/2024,78\n'
+        ))
+        self.assertEqual((resultado.registros, resultado.registros_existentes), (1, 2))
+        self.assertEqual(
+            list(RegistroHistorial.objects.filter(paciente__usuario__username='ana').values_list('peso', flat=True)),
+            [Decimal('79.00'), Decimal('80.00'), Decimal('80.50')],
+        )
+
+    def test_valida_username_y_email_con_los_validadores_del_modelo(self):
+        resultado = importar_csv(io.StringIO(
+            'username,email\n'
+            'ana perez,\n'
+            f"{'a' * 151},\n"
+            'beto,no-es-un-email\n'
+            'carla,carla@example.com\n'
+        ))
+
+        self.assertEqual([linea for linea, _ in resultado.errores], [2, 3, 4])
+        self.assertEqual(list(Usuario.objects.values_list('username', flat=True)), ['carla'])
+
+    def test_no_agrega_registros_a_un_profesional(self):
+        Usuario.objects.create_user('pro', tipo='profesional')
+
+        resultado = importar_csv(io.StringIO('username,fecha,peso\npro,2024-01-15,79\n'))
+
+        self.assertEqual(resultado.errores, [(2, 'pro no es un paciente')])
+        self.assertFalse(Paciente.objects.exists())
+
 
-# Create your tests here.
+class ExportacionTests(TestCase):
+    
+    def setUp(self):
+        self.profesional = Usuario.objects.create_user('pro', tipo='profesional')
+        self.paciente = Paciente.objects.create(
+            usuario=Usuario.objects.create_user('ana', first_name='Ana', last_name='Pérez, "la flaca"')
+        )
+        otro = Paciente.objects.create(usuario=Usuario.objects.create_user('beto'))
+        Turno.objects.bulk_create([
+            Turno(paciente=self.paciente, fecha=date(2024, 3, 1), hora=time(9), estado='completado'),
+            Turno(paciente=self.paciente, fecha=date(2024, 3, 2), hora=time(9), estado='cancelado'),
+            Turno(paciente=otro, fecha=date(2024, 3, 2), hora=time(10), estado='completado'),
+            Turno(paciente=self.paciente, fecha=date(2024, 4, 1), hora=time(9), estado='completado'),
+        ])
+        for dia in range(1, 6):
+            RegistroHistorial.objects.create(paciente=self.paciente, fecha=date(2024, 1, dia), peso=Decimal('80.50') - dia)
+    
+    def test_csv_filtra_y_escapa(self):
+        contenido = ''.join(exportar(
+            'turnos', 'csv', desde=date(2024, 3, 1), hasta=date(2024, 3, 31), estado='completado'
+        ))
+        filas = list(csv.reader(io.StringIO(contenido)))
+        
+        self.assertEqual(filas[0][:4], ['id', 'fecha', 'hora', 'estado'])
+        self.assertEqual([(f[1], f[2], f[5]) for f in filas[1:]], [('2024-03-01', '09:00', 'ana'), ('2024-03-02', '10:00', 'beto')])
+        self.assertEqual(filas[1][6], 'Pérez, "la flaca"')
+    
+    def test_jsonl_en_bloques(self):
+        bloques = list(exportar('historial', 'jsonl', tamanio_bloque=2, paciente=self.paciente.id))
+        registros = [json.loads(linea) for linea in ''.join(bloques).splitlines()]
+        
+        self.assertEqual(len(bloques), 3)
+        self.assertEqual([r['fecha'] for r in registros], [f'2024-01-0{dia}' for dia in range(1, 6)])
+        self.assertEqual(registros[0]['peso'], '79.50')
+        self.assertIsNone(registros[0]['cintura'])
+    
+    def test_lee_de_a_un_bloque_por_consulta(self):
+        with CaptureQueriesContext(connection) as consultas:
+            bloques = list(exportar('turnos', 'jsonl', tamanio_bloque=1))
+        registros = [json.loads(bloque) for bloque in bloques]
+        
+        self.assertEqual([(r['fecha'], r['hora']) for r in registros], [
+            ('2024-03-01', '09:00'), ('2024-03-02', '09:00'), ('2024-03-02', '10:00'), ('2024-04-01', '09:00'),
+        ])
+        # Una consulta por bloque más la que encuentra el final, cada una
+        # siguiendo el índice desde la última fila
+        self.assertEqual(len(consultas), 5)
+        with connection.cursor() as cursor:
+            for consulta in consultas:
+                cursor.execute(f"EXPLAIN QUERY PLAN {consulta['sql']}")
+                self.assertNotIn('USE TEMP B-TREE', str(cursor.fetchall()))
+    
+    def test_vista_descarga_y_valida_filtros(self):
+        self.client.force_login(self.profesional)
+        url = reverse('pacientes:exportar', args=['turnos'])
+        
+        response = self.client.get(url, {'estado': 'cancelado'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        contenido = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(contenido.splitlines()), 2)
+        
+        self.assertEqual(self.client.get(url, {'desde': '01/03/2024'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('pacientes:exportar', args=['otros'])).status_code, 404)
+        
+        self.client.force_login(self.paciente.usuario)
+        self.assertEqual(self.client.get(url).status_code, 403)
@@ -5,5 +5,12 @@ app_name = 'pacientes'
 
 urlpatterns = [
     path('', views.lista_pacientes_view, name='lista'),
-    #path('<int:paciente_id>/', views.detalle_paciente_view, name='detalle'),
+    path('buscar/', views.buscar_pacientes_view, name='buscar'),
+    path('reportes/', views.reportes_view, name='reportes'),
+    path('exportar/<str:tipo>/', views.exportar_view, name='exportar'),
+    path('api/buscar/', views.buscar_pacientes_api, name='api_buscar'),
+    path('<int:paciente_id>/', views.detalle_paciente_view, name='detalle'),
+    path('<int:paciente_id>/api/historial/', views.historial_paciente_api, name='api_historial'),
+    path('<int:paciente_id>/api/turnos/', views.turnos_paciente_api, name='api_turnos'),
+    path('<int:paciente_id>/api/tendencias/', views.tendencias_paciente_api, name='api_tendencias'),
 ]
\ No newline at end of file
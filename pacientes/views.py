@@ -2,34 +2,119 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.shortcuts import redirect
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
 from .models import Paciente, RegistroHistorial
-from turnos.models import Turno
+from .listado import pagina_pacientes, sugerencias
+from .busqueda import buscar
+from .analitica import tendencias_paciente
+from .reportes import reporte_poblacional
+from .exportacion import exportar, leer_filtros, FiltroInvalido, FORMATOS, COLUMNAS
+from .detalle import (
+    resumen_paciente, pagina_historial, pagina_turnos, tamanio_pedido,
+    TAMANIO_PAGINA_HISTORIAL, TAMANIO_PAGINA_TURNOS,
+)
 
 # Create your views here.
 @login_required
 def lista_pacientes_view(request):
-    """ Lista de todos los pacientes"""
+    """ Lista de pacientes, de a una página por cursor (?desde=) """
     if request.user.tipo != 'profesional':
         messages.error(request, "No tienes permiso para acceder a esta página.")
         return redirect('core:home')
     
-    pacientes = Paciente.objects.select_related('usuario').all()
+    busqueda = request.GET.get('q', '').strip()
+    cursor = request.GET.get('desde')
+    pacientes, siguiente = pagina_pacientes(cursor, busqueda)
     
     context = {
-        'pacientes' : pacientes
+        'pacientes' : pacientes,
+        'busqueda': busqueda,
+        'siguiente': siguiente,
+        'es_primera_pagina': not cursor,
     }
     return render(request, 'pacientes/lista.html', context)
 
 
+@login_required
+@require_GET
+def buscar_pacientes_api(request):
+    """ Sugerencias por prefijo de nombre o apellido (?q=) para el buscador """
+    if request.user.tipo != 'profesional':
+        return JsonResponse({'error': 'Acceso denegado.'}, status=403)
+    
+    return JsonResponse({'resultados': sugerencias(request.GET.get('q', ''))})
+
+
+
+@login_required
+def buscar_pacientes_view(request):
+    """ Búsqueda de texto completo en fichas y notas clínicas (?q=) """
+    if request.user.tipo != 'profesional':
+        messages.error(request, "No tienes permiso para acceder a esta página.")
+        return redirect('core:home')
+    
+    texto = request.GET.get('q', '').strip()
+    
+    context = {
+        'texto': texto,
+        'resultados': buscar(texto) if texto else [],
+    }
+    return render(request, 'pacientes/buscar.html', context)
+
+
+
+@login_required
+def reportes_view(request):
+    """ Tablero con los resultados de toda la población de pacientes """
+    if request.user.tipo != 'profesional':
+        messages.error(request, "No tienes permiso para acceder a esta página.")
+        return redirect('core:home')
+    
+    return render(request, 'pacientes/reportes.html', {'reporte': reporte_poblacional()})
+
+
+
+@login_required
+@require_GET
+def exportar_view(request, tipo):
+    """
+    Descarga de turnos o historial (?formato=csv|jsonl&desde=&hasta=&estado=&paciente=).
+    El archivo se genera mientras se envía, sin armarlo entero en memoria.
+    """
+    if request.user.tipo != 'profesional':
+        return JsonResponse({'error': 'Acceso denegado.'}, status=403)
+    if tipo not in COLUMNAS:
+        return JsonResponse({'error': 'Tipo de exportación desconocido.'}, status=404)
+    
+    formato = request.GET.get('formato', 'csv')
+    try:
+        if formato not in FORMATOS:
+            raise FiltroInvalido(f'formato desconocido: {formato}')
+        filtros = leer_filtros(request.GET)
+    except FiltroInvalido as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    
+    response = StreamingHttpResponse(exportar(tipo, formato, **filtros), content_type=FORMATOS[formato])
+    nombre = f"{tipo}-{timezone.localdate():%Y-%m-%d}.{formato}"
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+
 
 @login_required
 def detalle_paciente_view(request, paciente_id):
-    """ Detalle de un paciente específico """
+    """
+    Detalle de un paciente específico.
+    Se renderiza solo el resumen; historial y turnos los pide la página
+    de a una página a las APIs de abajo.
+    """
     if request.user.tipo != 'profesional':
         messages.error(request, "Acceso denegado.")
         return redirect('core:home')
     
-    paciente = get_object_or_404(Paciente, id=paciente_id)
+    paciente = get_object_or_404(Paciente.objects.select_related('usuario'), id=paciente_id)
     
     # agregar un nuevo registro
     if request.method == 'POST':
@@ -39,19 +124,50 @@ def detalle_paciente_view(request, paciente_id):
             peso=request.POST.get('peso'),
             notas=request.POST.get('notas', ''),
             circunferencia_cintura=request.POST.get('cintura') or None,
-            circunferencia_cadera=request.POST.get('caderaS') or None,
+            circunferencia_cadera=request.POST.get('cadera') or None,
         )
         messages.success(request, "Registro agregado exitosamente.")
         return redirect('pacientes:detalle', paciente_id=paciente.id)
     
-    historial = paciente.historial.all()
-    turnos = paciente.turnos.all().order_by('-fecha', '-hora')
-    
     context = {
         'paciente': paciente,
-        'historial': historial,
-        'turnos': turnos,
+        'resumen': resumen_paciente(paciente),
     }
     
     return render(request, 'pacientes/detalle.html', context)
-    
\ No newline at end of file
+
+
+def _pagina_json(request, paciente_id, obtener_pagina, tamanio):
+    if request.user.tipo != 'profesional':
+        return JsonResponse({'error': 'Acceso denegado.'}, status=403)
+    
+    paciente = get_object_or_404(Paciente, id=paciente_id)
+    items, siguiente = obtener_pagina(
+        paciente, request.GET.get('desde'), tamanio_pedido(request, tamanio)
+    )
+    return JsonResponse({'items': items, 'siguiente': siguiente})
+
+
+@login_required
+@require_GET
+def historial_paciente_api(request, paciente_id):
+    """ Una página del historial (?desde=cursor&cantidad=N), del más reciente al más viejo """
+    return _pagina_json(request, paciente_id, pagina_historial, TAMANIO_PAGINA_HISTORIAL)
+
+
+@login_required
+@require_GET
+def turnos_paciente_api(request, paciente_id):
+    """ Una página de los turnos del paciente (?desde=cursor&cantidad=N) """
+    return _pagina_json(request, paciente_id, pagina_turnos, TAMANIO_PAGINA_TURNOS)
+
+
+@login_required
+@require_GET
+def tendencias_paciente_api(request, paciente_id):
+    """ Indicadores y series de peso y medidas del paciente, para graficar """
+    if request.user.tipo != 'profesional':
+        return JsonResponse({'error': 'Acceso denegado.'}, status=403)
+    
+    paciente = get_object_or_404(Paciente.objects.only('id', 'altura'), id=paciente_id)
+    return JsonResponse({'tendencias': tendencias_paciente(paciente)})
@@ -1,19 +1,27 @@
+// Cada cuánto se consultan los cambios de horarios mientras la página está abierta
+const INTERVALO_CAMBIOS_MS = 30000;
+
 class CalendarApp {
     constructor() {
         this.currentDate = new Date();
         this.selectedDate = null;
         this.selectedTime = null;
         this.appointments = JSON.parse(localStorage.getItem('appointments')) || [];
-        this.timeSlots = [
-            '09:00', '09:30', '10:00', '10:30', '11:00', '11:30',
-            '14:00', '14:30', '15:00', '15:30', '16:00', '16:30', '17:00'
-        ];
+        // Horarios libres calculados por el servidor: {'AAAA-MM-DD': ['HH:MM', ...]}
+        this.horariosLibres = {};
+        this.apiHorarios = document.getElementById('calendar').dataset.apiHorarios;
+        this.apiCambios = document.getElementById('calendar').dataset.apiCambios;
+        this.apiEventos = document.getElementById('calendar').dataset.apiEventos;
+        this.eventos = null;
+        // Último cambio de horarios que conoce la página
+        this.seq = null;
         
         this.init();
     }
 
     init() {
         this.renderCalendar();
+        this.cargarHorarios();
         this.renderAppointments();
         this.bindEvents();
     }
@@ -88,8 +96,12 @@ class CalendarApp {
             dayNumber.textContent = cellDate.getDate();
             cell.appendChild(dayNumber);
 
-            // Only allow future dates
-            if (cellDate >= today && cellDate.getMonth() === month) {
+            // Only allow future dates with free slots
+            const tieneHorarios = this.horariosLibres[this.formatoISO(cellDate)] !== undefined;
+            if (cellDate.getMonth() === month && !tieneHorarios) {
+                cell.classList.add('sin-horarios');
+            }
+            if (cellDate >= today && cellDate.getMonth() === month && tieneHorarios) {
                 cell.addEventListener('click', () => {
                     this.selectDate(cellDate);
                 });
@@ -102,6 +114,117 @@ class CalendarApp {
         }
     }
 
+    async cargarHorarios() {
+        // El navegador revalida con ETag/Last-Modified; si nada cambió el servidor responde 304
+        const respuesta = await fetch(`${this.apiHorarios}?formato=bitmap`, { credentials: 'same-origin' });
+        if (!respuesta.ok) {
+            return;
+        }
+        const datos = await respuesta.json();
+        this.horariosLibres = this.decodificarMascaras(datos);
+        this.seq = datos.seq;
+        this.renderCalendar();
+
+        if (!this.intervaloCambios) {
+            this.intervaloCambios = setInterval(() => this.buscarCambios(), INTERVALO_CAMBIOS_MS);
+            this.escucharEventos();
+        }
+    }
+
+    escucharEventos() {
+        // Con SSE el servidor avisa cada horario ocupado/liberado y se piden
+        // los cambios en el momento; el sondeo queda como respaldo
+        if (!window.EventSource) {
+            return;
+        }
+        this.eventos = new EventSource(this.apiEventos);
+        ['ocupado', 'liberado', 'disponibilidad', 'recargar'].forEach(tipo => {
+            this.eventos.addEventListener(tipo, () => this.buscarCambios(true));
+        });
+    }
+
+    decodificarMascaras(datos) {
+        // Formato bitmap: base64 con una máscara de bytes_por_dia bytes por día
+        // desde datos.desde; el bit i (little-endian) es la franja i del día
+        const bytes = Uint8Array.from(atob(datos.mascaras), c => c.charCodeAt(0));
+        const [anio, mes, dia] = datos.desde.split('-').map(Number);
+        const horarios = {};
+
+        for (let d = 0; d * datos.bytes_por_dia < bytes.length; d++) {
+            const libres = [];
+            for (let slot = 0; slot < datos.bytes_por_dia * 8; slot++) {
+                if (bytes[d * datos.bytes_por_dia + (slot >> 3)] & (1 << (slot & 7))) {
+                    const minutos = slot * datos.minutos_por_turno;
+                    const hh = String(Math.floor(minutos / 60)).padStart(2, '0');
+                    const mm = String(minutos % 60).padStart(2, '0');
+                    libres.push(`${hh}:${mm}`);
+                }
+            }
+            if (libres.length > 0) {
+                horarios[this.formatoISO(new Date(anio, mes - 1, dia + d))] = libres;
+            }
+        }
+        return horarios;
+    }
+
+    async buscarCambios(avisado = false) {
+        // Solo se descargan los días cuyos horarios cambiaron desde this.seq
+        if (this.seq === null || (document.hidden && !avisado)) {
+            return;
+        }
+        // Si el flujo SSE está abierto el sondeo periódico no hace falta
+        if (!avisado && this.eventos && this.eventos.readyState === EventSource.OPEN) {
+            return;
+        }
+        const respuesta = await fetch(`${this.apiCambios}?desde=${this.seq}`, { credentials: 'same-origin' });
+        if (!respuesta.ok) {
+            return;
+        }
+        const datos = await respuesta.json();
+        if (datos.recargar) {
+            await this.cargarHorarios();
+            this.refrescarSeleccion();
+            return;
+        }
+
+        const dias = Object.keys(datos.dias);
+        dias.forEach(dia => {
+            if (datos.dias[dia].length > 0) {
+                this.horariosLibres[dia] = datos.dias[dia];
+            } else {
+                delete this.horariosLibres[dia];
+            }
+        });
+        this.seq = datos.seq;
+
+        if (dias.length > 0) {
+            this.renderCalendar();
+            this.refrescarSeleccion();
+        }
+    }
+
+    refrescarSeleccion() {
+        // Vuelve a mostrar los horarios del día elegido; si el horario
+        // seleccionado ya no está libre se descarta la selección
+        if (!this.selectedDate) {
+            return;
+        }
+        const horarios = this.horariosLibres[this.formatoISO(this.selectedDate)] || [];
+        if (this.selectedTime && !horarios.includes(this.selectedTime)) {
+            this.selectedTime = null;
+            document.getElementById('inputHora').value = '';
+            document.getElementById('bookingForm').classList.remove('active');
+        }
+        this.showTimeSlots();
+        if (this.selectedTime) {
+            document.querySelectorAll('.time-slot').forEach(slot => {
+                if (slot.textContent === this.selectedTime) {
+                    slot.classList.add('selected');
+                }
+            });
+        }
+    }
+
     selectDate(date) {
         // Remove previous selection
         document.querySelectorAll('.day-cell.selected').forEach(cell => {
@@ -112,7 +235,7 @@ class CalendarApp {
         this.selectedDate = new Date(date);
 
         // Guardar fecha en el input hidden en formato YYYY-MM-DD
-        const fechaISO = this.selectedDate.toISOString().split('T')[0];
+        const fechaISO = this.formatoISO(this.selectedDate);
         document.getElementById('inputFecha').value = fechaISO;
 
         this.showTimeSlots();
@@ -147,31 +270,32 @@ class CalendarApp {
 
         slotsGrid.innerHTML = '';
 
-        this.timeSlots.forEach(time => {
+        const horarios = this.horariosLibres[this.formatoISO(this.selectedDate)] || [];
+
+        if (horarios.length === 0) {
+            slotsGrid.innerHTML = '<p style="color: #666; font-style: italic;">No hay horarios disponibles para este día</p>';
+        }
+
+        horarios.forEach(time => {
             const slot = document.createElement('div');
             slot.className = 'time-slot';
             slot.textContent = time;
-
-            // Check if slot is occupied
-            const isOccupied = this.appointments.some(apt => 
-                apt.date === this.selectedDate.toDateString() && apt.time === time
-            );
-
-            if (isOccupied) {
-                slot.classList.add('occupied');
-                slot.textContent += ' (Ocupado)';
-            } else {
-                slot.addEventListener('click', () => {
-                    this.selectTimeSlot(time, slot);
-                });
-            }
-
+            slot.addEventListener('click', () => {
+                this.selectTimeSlot(time, slot);
+            });
             slotsGrid.appendChild(slot);
         });
 
         timeSlots.classList.add('active');
     }
 
+    formatoISO(date) {
+        // AAAA-MM-DD en hora local (toISOString usa UTC y puede cambiar el día)
+        const mes = String(date.getMonth() + 1).padStart(2, '0');
+        const dia = String(date.getDate()).padStart(2, '0');
+        return `${date.getFullYear()}-${mes}-${dia}`;
+    }
+
     showBookingForm() {
         const bookingForm = document.getElementById('bookingForm');
         bookingForm.classList.add('active');
@@ -0,0 +1,115 @@
+// Lista que se va completando a medida que el usuario llega al final:
+// cada página se pide con el cursor que devolvió la anterior
+class ListaPorCursor {
+    constructor(cuerpo, fin, armarFila) {
+        this.cuerpo = cuerpo;
+        this.fin = fin;
+        this.api = fin.dataset.api;
+        this.armarFila = armarFila;
+        this.siguiente = null;
+        this.cargando = false;
+        this.terminada = false;
+
+        // El marcador al pie de la tabla dispara la carga al hacerse visible
+        this.observador = new IntersectionObserver(entradas => {
+            if (entradas.some(entrada => entrada.isIntersecting)) {
+                this.cargar();
+            }
+        }, { rootMargin: '200px' });
+        this.observador.observe(this.fin);
+    }
+
+    async cargar() {
+        if (this.cargando || this.terminada) {
+            return;
+        }
+        this.cargando = true;
+        try {
+            const url = this.siguiente
+                ? `${this.api}?desde=${encodeURIComponent(this.siguiente)}`
+                : this.api;
+            const respuesta = await fetch(url);
+            if (!respuesta.ok) {
+                throw new Error(`HTTP ${respuesta.status}`);
+            }
+            const datos = await respuesta.json();
+            const fragmento = document.createDocumentFragment();
+            datos.items.forEach(item => fragmento.appendChild(this.armarFila(item)));
+            this.cuerpo.appendChild(fragmento);
+
+            this.siguiente = datos.siguiente;
+            if (!this.siguiente) {
+                this.terminar(this.cuerpo.children.length ? '' : 'Sin datos.');
+            }
+        } catch (error) {
+            console.error('No se pudo cargar la página', error);
+            this.fin.textContent = 'No se pudo cargar. Recargá la página para reintentar.';
+            this.observador.disconnect();
+        } finally {
+            this.cargando = false;
+        }
+        // Si la página entró entera en pantalla el marcador sigue visible
+        // y el observador no vuelve a avisar: se pide la siguiente
+        if (!this.terminada && this.fin.getBoundingClientRect().top < window.innerHeight) {
+            this.cargar();
+        }
+    }
+
+    terminar(texto) {
+        this.terminada = true;
+        this.fin.textContent = texto;
+        this.observador.disconnect();
+    }
+}
+
+function celda(fila, texto) {
+    const td = document.createElement('td');
+    td.textContent = texto ?? '';
+    fila.appendChild(td);
+    return td;
+}
+
+function formatoFecha(iso) {
+    const [anio, mes, dia] = iso.split('-');
+    return `${dia}/${mes}/${anio}`;
+}
+
+function filaHistorial(registro) {
+    const fila = document.createElement('tr');
+    celda(fila, formatoFecha(registro.fecha));
+    celda(fila, `${registro.peso} kg`);
+    celda(fila, registro.cintura ? `${registro.cintura} cm` : '-');
+    celda(fila, registro.cadera ? `${registro.cadera} cm` : '-');
+    celda(fila, registro.notas);
+    return fila;
+}
+
+function filaTurno(turno) {
+    const fila = document.createElement('tr');
+    const fecha = celda(fila, '');
+    const enlace = document.createElement('a');
+    enlace.href = turno.url;
+    enlace.textContent = formatoFecha(turno.fecha);
+    fecha.appendChild(enlace);
+    celda(fila, turno.hora);
+    const estado = celda(fila, '');
+    const badge = document.createElement('span');
+    badge.className = `badge badge-${turno.estado}`;
+    badge.textContent = turno.estado_display;
+    estado.appendChild(badge);
+    celda(fila, turno.motivo);
+    return fila;
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    new ListaPorCursor(
+        document.getElementById('historialPaciente'),
+        document.getElementById('finHistorial'),
+        filaHistorial
+    );
+    new ListaPorCursor(
+        document.getElementById('turnosPaciente'),
+        document.getElementById('finTurnos'),
+        filaTurno
+    );
+});
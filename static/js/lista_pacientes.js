@@ -0,0 +1,69 @@
+// Espera entre teclas antes de pedir sugerencias al servidor
+const ESPERA_SUGERENCIAS_MS = 200;
+
+class BuscadorPacientes {
+    constructor() {
+        this.input = document.getElementById('busquedaPacientes');
+        this.lista = document.getElementById('sugerenciasPacientes');
+        this.apiBuscar = this.input.dataset.apiBuscar;
+        this.temporizador = null;
+        // Cada pedido cancela el anterior para no pintar respuestas viejas
+        this.pedido = null;
+
+        this.input.addEventListener('input', () => {
+            clearTimeout(this.temporizador);
+            this.temporizador = setTimeout(() => this.buscar(), ESPERA_SUGERENCIAS_MS);
+        });
+        this.input.addEventListener('blur', () => {
+            setTimeout(() => this.ocultar(), 150);
+        });
+    }
+
+    async buscar() {
+        const texto = this.input.value.trim();
+        if (this.pedido) {
+            this.pedido.abort();
+        }
+        if (!texto) {
+            this.ocultar();
+            return;
+        }
+
+        this.pedido = new AbortController();
+        try {
+            const url = `${this.apiBuscar}?q=${encodeURIComponent(texto)}`;
+            const respuesta = await fetch(url, { signal: this.pedido.signal });
+            if (!respuesta.ok) {
+                return;
+            }
+            const datos = await respuesta.json();
+            this.mostrar(datos.resultados);
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                console.error('No se pudieron cargar las sugerencias', error);
+            }
+        }
+    }
+
+    mostrar(resultados) {
+        this.lista.innerHTML = '';
+        resultados.forEach(resultado => {
+            const item = document.createElement('li');
+            item.textContent = resultado.nombre;
+            // Elegir una sugerencia abre la ficha de ese paciente
+            item.addEventListener('mousedown', () => {
+                window.location.href = resultado.url;
+            });
+            this.lista.appendChild(item);
+        });
+        this.lista.hidden = resultados.length === 0;
+    }
+
+    ocultar() {
+        this.lista.hidden = true;
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    new BuscadorPacientes();
+});
@@ -0,0 +1,70 @@
+"""
+Cambios de estado de muchos turnos a la vez (confirmar, completar, cancelar,
+marcar ausente).
+
+En lugar de un get() y un save() completo por turno, se leen solo las
+columnas que necesitan los índices (id, fecha, hora, estado) y se cambia el
+estado con un único UPDATE ... WHERE id IN (...) que toca solo `estado` y
+`fecha_actualizacion`. Como update() no dispara post_save, al final se envía
+la señal turnos_actualizados una sola vez con todos los turnos cambiados:
+ahí se actualizan el índice de horarios, las versiones del cache y los
+eventos (ver turnos/signals.py).
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Turno
+
+# Se envía con turnos=[TurnoCambiado, ...] y estado=<estado nuevo>, dentro
+# de la transacción del UPDATE
+turnos_actualizados = Signal()
+
+TurnoCambiado = namedtuple('TurnoCambiado', ['id', 'paciente_id', 'fecha', 'hora', 'estado_anterior'])
+
+# Acción -> (estado nuevo, estados desde los que se puede pasar)
+ACCIONES = {
+    'confirmar': ('confirmado', ('pendiente',)),
+    'completar': ('completado', ('pendiente', 'confirmado')),
+    'cancelar': ('cancelado', ('pendiente', 'confirmado')),
+    'ausente': ('ausente', ('pendiente', 'confirmado')),
+}
+
+
+def cambiar_estado(turnos, accion):
+    """
+    Aplica la acción a los turnos del queryset que estén en un estado que lo
+    permita; el resto se ignora. Devuelve la lista de TurnoCambiado.
+    """
+    estado, desde = ACCIONES[accion]
+    with transaction.atomic():
+        candidatos = [
+            TurnoCambiado._make(fila)
+            for fila in turnos.select_for_update().filter(estado__in=desde).order_by()
+            .values_list('id', 'paciente_id', 'fecha', 'hora', 'estado')
+        ]
+        if not candidatos:
+            return []
+
+        ids = [turno.id for turno in candidatos]
+        actualizados = Turno.objects.filter(id__in=ids, estado__in=desde).update(
+            estado=estado, fecha_actualizacion=timezone.now()
+        )
+        if actualizados != len(candidatos):
+            # Otro pedido cambió alguno entre la lectura y el UPDATE (en las
+            # bases que no bloquean filas con select_for_update)
+            cambiados = set(Turno.objects.filter(id__in=ids, estado=estado).values_list('id', flat=True))
+            candidatos = [turno for turno in candidatos if turno.id in cambiados]
+
+        turnos_actualizados.send(sender=Turno, turnos=candidatos, estado=estado)
+    return candidatos
+
+
+def cambiar_estado_por_ids(ids, accion):
+    return cambiar_estado(Turno.objects.filter(id__in=ids), accion)
+
+
+def cambiar_estado_del_dia(fecha, accion):
+    return cambiar_estado(Turno.objects.filter(fecha=fecha), accion)
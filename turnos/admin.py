@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Turno, DisponibilidadHoraria
+from .models import Turno, DisponibilidadHoraria, EstadisticaDiaria
 
 # Register your models here.
 @admin.register(Turno)
@@ -12,4 +12,9 @@ class TurnoAdmin(admin.ModelAdmin):
 @admin.register(DisponibilidadHoraria)
 class DisponibilidadHorariaAdmin(admin.ModelAdmin):
     list_display = ['dia_semana', 'hora_inicio', 'hora_fin', 'activo']
-    list_filter = ['dia_semana', 'activo']
\ No newline at end of file
+    list_filter = ['dia_semana', 'activo']
+
+@admin.register(EstadisticaDiaria)
+class EstadisticaDiariaAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'pendientes', 'confirmados', 'completados', 'cancelados', 'ausentes']
+    date_hierarchy = 'fecha'
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TurnosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'turnos'
+
+    def ready(self):
+        # Registrar las señales que mantienen los índices de la agenda
+        from . import signals  # noqa: F401
+        # El cierre automático de turnos lo arrancan config/wsgi.py y
+        # config/asgi.py: acá correría también en migrate, shell y los tests
@@ -0,0 +1,141 @@
+"""
+Armado del calendario del profesional: grilla mensual (cacheada) y vistas
+de día, semana y agenda.
+
+La grilla renderizada de cada mes se guarda en el cache de Django con una
+clave que incluye la versión del mes; las señales de Turno incrementan esa
+versión (ver turnos/versiones.py), así que solo se recalculan los meses que
+realmente cambiaron.
+"""
+from calendar import monthcalendar, monthrange
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from .lecturas import TurnoCalendario, armador_url_detalle
+from .models import Turno
+from .versiones import version_mes
+
+# Aunque no cambie nada, una grilla cacheada se descarta al día siguiente
+DURACION_CACHE_GRILLA = 60 * 60 * 24
+
+VISTAS_RANGO = ('dia', 'semana', 'agenda')
+DIAS_AGENDA = 14
+
+
+def turnos_en_rango(desde, hasta):
+    """
+    Turnos entre desde y hasta (inclusive), en orden, como TurnoCalendario.
+    Todas las vistas del calendario consultan por acá: un rango explícito
+    sobre `fecha` usa el índice, a diferencia de fecha__year/fecha__month.
+    """
+    return TurnoCalendario.leer(
+        Turno.objects.filter(fecha__range=(desde, hasta)).order_by('fecha', 'hora')
+    )
+
+
+def _armador_de_items():
+    """
+    Devuelve una función que convierte un TurnoCalendario en el dict que muestran
+    las plantillas, con la etiqueta y la URL de detalle ya armadas.
+    """
+    url_detalle = armador_url_detalle()
+    
+    def armar(turno):
+        return {
+            'id': turno.id,
+            'url': url_detalle(turno.id),
+            'estado': turno.estado,
+            'etiqueta': f"{turno.hora:%H:%M} - {Truncator(turno.nombre).words(2)}",
+        }
+    
+    return armar
+
+
+def armar_grilla_mes(anio, mes, turnos, hoy):
+    """
+    Arma la grilla del calendario mensual.
+    Devuelve la lista de semanas (cada celda es None fuera del mes o un dict
+    con el día y sus turnos con la etiqueta ya armada) y la cantidad de días
+    con turnos. Los turnos deben venir ordenados por fecha y hora.
+    """
+    armar_item = _armador_de_items()
+    
+    celdas = {}
+    for dia in range(1, monthrange(anio, mes)[1] + 1):
+        celdas[dia] = {
+            'dia': dia,
+            'es_hoy': hoy == date(anio, mes, dia),
+            'turnos': [],
+        }
+    
+    for turno in turnos:
+        celdas[turno.fecha.day]['turnos'].append(armar_item(turno))
+    
+    semanas = [
+        [celdas[dia] if dia else None for dia in semana]
+        for semana in monthcalendar(anio, mes)
+    ]
+    dias_con_turnos = sum(1 for celda in celdas.values() if celda['turnos'])
+    return semanas, dias_con_turnos
+
+
+def rango_de_vista(vista, fecha):
+    """
+    Rango (desde, hasta) que muestra cada vista de lista del calendario y el
+    salto para navegar al anterior/siguiente.
+    """
+    if vista == 'dia':
+        return fecha, fecha, timedelta(days=1)
+    if vista == 'semana':
+        lunes = fecha - timedelta(days=fecha.weekday())
+        return lunes, lunes + timedelta(days=6), timedelta(days=7)
+    # agenda: los próximos DIAS_AGENDA días a partir de la fecha
+    return fecha, fecha + timedelta(days=DIAS_AGENDA - 1), timedelta(days=DIAS_AGENDA)
+
+
+def armar_dias(desde, hasta, turnos, hoy, solo_con_turnos=False):
+    """
+    Lista de días [{'fecha', 'es_hoy', 'turnos'}] entre desde y hasta para
+    las vistas de día, semana y agenda. Los turnos deben venir ordenados.
+    """
+    armar_item = _armador_de_items()
+    
+    dias = {}
+    fecha = desde
+    while fecha <= hasta:
+        dias[fecha] = {'fecha': fecha, 'es_hoy': fecha == hoy, 'turnos': []}
+        fecha += timedelta(days=1)
+    
+    for turno in turnos:
+        dias[turno.fecha]['turnos'].append(armar_item(turno))
+    
+    if solo_con_turnos:
+        return [dia for dia in dias.values() if dia['turnos']]
+    return list(dias.values())
+
+
+def obtener_grilla_mes(anio, mes):
+    """
+    Devuelve {'html': ..., 'dias_con_turnos': ...} para el mes pedido,
+    desde el cache si la versión del mes no cambió.
+    """
+    hoy = timezone.localdate()
+    clave = f'turnos:calendario:{anio}-{mes:02d}:v{version_mes(anio, mes)}'
+    if (hoy.year, hoy.month) == (anio, mes):
+        # El mes actual resalta el día de hoy
+        clave += f':{hoy.day}'
+    
+    grilla = cache.get(clave)
+    if grilla is None:
+        turnos = turnos_en_rango(date(anio, mes, 1), date(anio, mes, monthrange(anio, mes)[1]))
+        semanas, dias_con_turnos = armar_grilla_mes(anio, mes, turnos, hoy)
+        grilla = {
+            'html': render_to_string('turnos/_calendario_grilla.html', {'semanas': semanas}),
+            'dias_con_turnos': dias_con_turnos,
+        }
+        cache.set(clave, grilla, DURACION_CACHE_GRILLA)
+    return grilla
@@ -0,0 +1,135 @@
+"""
+Cierre automático de turnos pasados.
+
+Un turno que ya pasó y sigue pendiente o confirmado se cierra solo: el
+confirmado pasa a completado y el pendiente (el paciente nunca confirmó) a
+ausente. Se procesa en lotes acotados, cada uno en su propia transacción
+corta con un UPDATE por estado (ver turnos/acciones.py), así SQLite no
+queda bloqueado para escritura mientras se recorren años de atrasos.
+
+Los lotes avanzan por (fecha, hora) en el orden del índice turno_fecha_idx:
+cada consulta sigue desde el último turno visto en lugar de volver a
+recorrer los que ya se cerraron. Entre los turnos no cancelados (fecha,
+hora) es única, así que alcanza como cursor.
+
+El cierre puede correr con el comando `cerrar_turnos` (por ejemplo desde
+cron) o con el programador de este módulo dentro del proceso web, activado
+con settings.TURNOS_CIERRE_INTERVALO. Lo arrancan los puntos de entrada web
+(config/wsgi.py, config/asgi.py; runserver también pasa por wsgi.py) y no
+AppConfig.ready(), para que no corra en comandos de manage.py. Es idempotente: si corre en varios
+procesos a la vez, un turno ya cerrado simplemente no se vuelve a tocar.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .acciones import ACCIONES, cambiar_estado
+from .models import Turno
+
+logger = logging.getLogger(__name__)
+
+TAMANIO_LOTE = 500
+
+# Estado actual -> acción que lo cierra
+CIERRE = {
+    'confirmado': 'completar',
+    'pendiente': 'ausente',
+}
+
+
+class ResultadoCierre:
+    def __init__(self):
+        self.lotes = 0
+        self.por_estado = {}
+
+    @property
+    def total(self):
+        return sum(self.por_estado.values())
+
+
+def cerrar_turnos_pasados(hasta=None, tamanio_lote=TAMANIO_LOTE, pausa=0, al_avanzar=None):
+    """
+    Cierra los turnos pendientes o confirmados con fecha anterior a `hasta`
+    (por defecto, hoy). `pausa` son segundos de espera entre lotes para dejar
+    pasar otras escrituras. Devuelve un ResultadoCierre.
+    """
+    hasta = hasta or timezone.localdate()
+    resultado = ResultadoCierre()
+    abiertos = Turno.objects.filter(fecha__lt=hasta, estado__in=CIERRE).order_by('fecha', 'hora')
+
+    ultimo = None
+    while True:
+        lote = abiertos
+        if ultimo:
+            fecha, hora = ultimo
+            # El rango sobre fecha solo deja que SQLite recorra el índice en
+            # orden; con un OR de nivel superior ordenaría todo el resto
+            lote = lote.filter(Q(fecha__gte=fecha), Q(fecha__gt=fecha) | Q(hora__gt=hora))
+        filas = list(lote.values_list('id', 'estado', 'fecha', 'hora')[:tamanio_lote])
+        if not filas:
+            return resultado
+
+        with transaction.atomic():
+            for estado, accion in CIERRE.items():
+                ids = [turno_id for turno_id, estado_turno, _, _ in filas if estado_turno == estado]
+                if ids:
+                    cambiados = cambiar_estado(Turno.objects.filter(id__in=ids), accion)
+                    nuevo = ACCIONES[accion][0]
+                    resultado.por_estado[nuevo] = resultado.por_estado.get(nuevo, 0) + len(cambiados)
+
+        resultado.lotes += 1
+        ultimo = filas[-1][2:]
+        if al_avanzar:
+            al_avanzar(resultado)
+        if pausa:
+            time.sleep(pausa)
+
+
+# Programador dentro del proceso
+
+_programador = None
+
+
+def _ciclo(intervalo, detener):
+    # La primera pasada espera un intervalo: no se toca la base mientras
+    # el proceso todavía está arrancando
+    while not detener.wait(intervalo):
+        try:
+            resultado = cerrar_turnos_pasados()
+            if resultado.total:
+                logger.info('Cierre automático: %s turnos cerrados', resultado.total)
+        except Exception:
+            logger.exception('Falló el cierre automático de turnos')
+        finally:
+            close_old_connections()
+
+
+def iniciar_programador(intervalo):
+    """
+    Corre el cierre cada `intervalo` segundos en un hilo de fondo del
+    proceso. Devuelve el Event que lo detiene. Llamarlo de nuevo no
+    arranca otro hilo.
+    """
+    global _programador
+    if _programador is None:
+        detener = threading.Event()
+        hilo = threading.Thread(
+            target=_ciclo, args=(intervalo, detener), name='cierre-turnos', daemon=True
+        )
+        hilo.start()
+        _programador = detener
+    return _programador
+
+
+def iniciar_programador_configurado():
+    """Arranca el programador si settings.TURNOS_CIERRE_INTERVALO lo pide."""
+    intervalo = getattr(settings, 'TURNOS_CIERRE_INTERVALO', None)
+    if intervalo:
+        return iniciar_programador(intervalo)
+    return None
+
@@ -0,0 +1,150 @@
+"""
+Estadísticas diarias de turnos (tabla EstadisticaDiaria).
+
+Cada fila resume un día: turnos por estado, pacientes nuevos y recurrentes y
+la anticipación de las cancelaciones. Los tableros suman unas pocas filas
+por día del rango pedido en lugar de agregar la tabla de turnos completa.
+
+Las filas se mantienen desde las señales de Turno, dentro de la misma
+transacción que el cambio: cada cambio vuelve a calcular solo los días que
+toca (unos pocos turnos por día, por el índice turno_fecha_idx), así que el
+resumen no se desvía aunque los turnos se editen o se muevan de fecha.
+
+Un turno es "nuevo" si es el primer turno no cancelado del paciente. Cuando
+cambia un turno puede cambiar cuál es el primero del paciente, por eso
+también se recalculan los días de sus dos primeros turnos (ver
+dias_afectados). La anticipación de una cancelación se mide desde la última
+modificación del turno cancelado hasta su fecha y hora.
+"""
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+
+from django.db.models import Exists, OuterRef, Q, Sum
+from django.utils import timezone
+
+from .models import EstadisticaDiaria, Turno
+
+HORAS_CANCELACION_TARDIA = 24
+
+COLUMNA_POR_ESTADO = {
+    'pendiente': 'pendientes',
+    'confirmado': 'confirmados',
+    'completado': 'completados',
+    'cancelado': 'cancelados',
+    'ausente': 'ausentes',
+}
+CAMPOS = (
+    *COLUMNA_POR_ESTADO.values(),
+    'pacientes_nuevos', 'pacientes_recurrentes',
+    'horas_anticipacion_cancelacion', 'cancelaciones_tardias',
+)
+
+
+def _calcular(turnos, modelo_turno=Turno, modelo_estadistica=EstadisticaDiaria):
+    """Arma (sin guardar) una EstadisticaDiaria por cada día con turnos del queryset."""
+    anteriores = modelo_turno.objects.filter(
+        Q(fecha__lte=OuterRef('fecha')),
+        Q(fecha__lt=OuterRef('fecha')) | Q(hora__lt=OuterRef('hora')),
+        paciente_id=OuterRef('paciente_id'),
+    ).exclude(estado='cancelado')
+    filas = turnos.annotate(recurrente=Exists(anteriores)).order_by().values_list(
+        'fecha', 'hora', 'estado', 'fecha_actualizacion', 'recurrente'
+    )
+
+    dias = {}
+    zona = timezone.get_current_timezone()
+    for fecha, hora, estado, modificado, recurrente in filas.iterator(chunk_size=2000):
+        dia = dias.get(fecha)
+        if dia is None:
+            dia = dias[fecha] = modelo_estadistica(fecha=fecha)
+        columna = COLUMNA_POR_ESTADO.get(estado)
+        if columna:
+            setattr(dia, columna, getattr(dia, columna) + 1)
+        if estado == 'cancelado':
+            inicio = timezone.make_aware(datetime.combine(fecha, hora), zona)
+            horas = max(0.0, (inicio - modificado).total_seconds() / 3600)
+            dia.horas_anticipacion_cancelacion += horas
+            dia.cancelaciones_tardias += horas < HORAS_CANCELACION_TARDIA
+        elif recurrente:
+            dia.pacientes_recurrentes += 1
+        else:
+            dia.pacientes_nuevos += 1
+    return dias
+
+
+def _guardar(dias, modelo_estadistica=EstadisticaDiaria):
+    if dias:
+        modelo_estadistica.objects.bulk_create(
+            dias.values(), update_conflicts=True, unique_fields=['fecha'], update_fields=CAMPOS,
+        )
+
+
+def actualizar_dias(fechas):
+    """Vuelve a calcular las filas de esos días; borra las de días sin turnos."""
+    fechas = set(fechas)
+    if not fechas:
+        return
+    dias = _calcular(Turno.objects.filter(fecha__in=fechas))
+    _guardar(dias)
+    vacios = fechas - set(dias)
+    if vacios:
+        EstadisticaDiaria.objects.filter(fecha__in=vacios).delete()
+
+
+def dias_afectados(paciente_id, fechas):
+    """
+    Días a recalcular cuando cambia un turno del paciente: los del turno
+    más los de sus dos primeros turnos no cancelados (el que era primero y
+    el que puede pasar a serlo).
+    """
+    primeros = Turno.objects.filter(paciente_id=paciente_id).exclude(estado='cancelado').order_by(
+        'fecha', 'hora'
+    ).values_list('fecha', flat=True)[:2]
+    return set(fechas) | set(primeros)
+
+
+def reconstruir(modelo_turno=Turno, modelo_estadistica=EstadisticaDiaria):
+    """
+    Recalcula toda la tabla, de a un mes por vez. Recibe los modelos para
+    poder usarse también desde una migración.
+    """
+    extremos = modelo_turno.objects.order_by('fecha').values_list('fecha', flat=True)
+    primera, ultima = extremos.first(), extremos.reverse().first()
+    if primera is None:
+        modelo_estadistica.objects.all().delete()
+        return 0
+
+    modelo_estadistica.objects.exclude(fecha__range=(primera, ultima)).delete()
+    filas = 0
+    inicio = primera.replace(day=1)
+    while inicio <= ultima:
+        fin = inicio.replace(day=monthrange(inicio.year, inicio.month)[1])
+        dias = _calcular(
+            modelo_turno.objects.filter(fecha__range=(inicio, fin)), modelo_turno, modelo_estadistica
+        )
+        _guardar(dias, modelo_estadistica)
+        modelo_estadistica.objects.filter(fecha__range=(inicio, fin)).exclude(fecha__in=dias).delete()
+        filas += len(dias)
+        inicio = fin + timedelta(days=1)
+    return filas
+
+
+def resumen(desde, hasta):
+    """
+    Totales del rango y la lista de días con turnos, leídos de las filas
+    diarias (dos consultas sobre a lo sumo una fila por día).
+    """
+    filas = EstadisticaDiaria.objects.filter(fecha__range=(desde, hasta))
+    totales = {campo: valor or 0 for campo, valor in filas.aggregate(
+        **{campo: Sum(campo) for campo in CAMPOS}
+    ).items()}
+    totales['turnos'] = sum(totales[columna] for columna in COLUMNA_POR_ESTADO.values())
+    totales['anticipacion_promedio_horas'] = (
+        round(totales['horas_anticipacion_cancelacion'] / totales['cancelados'], 1)
+        if totales['cancelados'] else None
+    )
+    return {'desde': desde, 'hasta': hasta, 'totales': totales, 'dias': list(filas)}
+
+
+def resumen_mes(anio, mes):
+    return resumen(date(anio, mes, 1), date(anio, mes, monthrange(anio, mes)[1]))
@@ -0,0 +1,96 @@
+"""
+Difusión de eventos de horarios ("slot ocupado", "slot liberado") a las
+páginas de reserva abiertas, vía server-sent events.
+
+El backend se elige con settings.TURNOS_EVENTOS_BACKEND. BackendLocal
+reparte los eventos dentro del proceso y alcanza para un solo worker ASGI
+(y para los tests); con varios workers hace falta un backend que implemente
+la misma interfaz sobre un canal compartido.
+"""
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Eventos que puede acumular una conexión lenta antes de empezar a descartar
+MAX_EVENTOS_PENDIENTES = 100
+
+
+class BackendEventos:
+    """Interfaz de los backends de difusión."""
+
+    def publicar(self, evento):
+        """
+        Envía el evento (un dict serializable a JSON) a todos los suscriptores.
+        Se llama desde código sincrónico, en cualquier thread.
+        """
+        raise NotImplementedError
+
+    def suscribir(self):
+        """
+        Context manager asíncrono que entrega una asyncio.Queue donde van
+        llegando los eventos mientras dure la suscripción.
+        """
+        raise NotImplementedError
+
+
+class BackendLocal(BackendEventos):
+    """
+    Pub/sub en memoria. Cada suscriptor es una cola del event loop que lo
+    atiende; publicar() la alimenta con call_soon_threadsafe, así que las
+    conexiones inactivas no ocupan ningún thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscriptores = set()
+
+    def publicar(self, evento):
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for loop, cola in suscriptores:
+            try:
+                loop.call_soon_threadsafe(self._entregar, cola, evento)
+            except RuntimeError:
+                # El loop ya se cerró
+                with self._lock:
+                    self._suscriptores.discard((loop, cola))
+
+    @staticmethod
+    def _entregar(cola, evento):
+        try:
+            cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente demasiado lento: se le pide que recargue todo
+            while not cola.empty():
+                cola.get_nowait()
+            cola.put_nowait({'tipo': 'recargar'})
+
+    @asynccontextmanager
+    async def suscribir(self):
+        suscripcion = (asyncio.get_running_loop(), asyncio.Queue(maxsize=MAX_EVENTOS_PENDIENTES))
+        with self._lock:
+            self._suscriptores.add(suscripcion)
+        try:
+            yield suscripcion[1]
+        finally:
+            with self._lock:
+                self._suscriptores.discard(suscripcion)
+
+    @property
+    def cantidad_suscriptores(self):
+        with self._lock:
+            return len(self._suscriptores)
+
+
+@lru_cache(maxsize=None)
+def obtener_backend():
+    ruta = getattr(settings, 'TURNOS_EVENTOS_BACKEND', 'turnos.eventos.BackendLocal')
+    return import_string(ruta)()
+
+
+def publicar(evento):
+    obtener_backend().publicar(evento)
@@ -0,0 +1,264 @@
+"""
+Índice en memoria de horarios libres.
+
+La disponibilidad semanal se convierte en una máscara de bits por día de la
+semana (un bit por franja de MINUTOS_POR_TURNO minutos) y los turnos activos
+en una máscara de ocupación por fecha. Los horarios libres de un día salen de
+una sola operación: ``semanal[dia] & ~ocupados[fecha]``.
+
+El índice se construye la primera vez que se consulta y después se mantiene
+de forma incremental desde las señales de ``Turno`` y ``DisponibilidadHoraria``
+(ver ``turnos/signals.py``), así que una consulta no depende de la cantidad de
+turnos guardados.
+
+Cada proceso tiene su propio índice y las señales solo llegan al proceso que
+guardó el cambio. Para que los demás workers no sigan ofreciendo horarios ya
+tomados, el índice recuerda la última secuencia de ``CambioHorario`` que
+refleja y cada consulta la compara con la de la base (una consulta por la
+clave primaria): si otro proceso registró cambios, el índice se rearma.
+"""
+import base64
+import threading
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
+
+MINUTOS_POR_TURNO = 30
+SLOTS_POR_DIA = 24 * 60 // MINUTOS_POR_TURNO
+# Ancho fijo de la máscara de un día en el formato binario de la API
+BYTES_POR_DIA = -(-SLOTS_POR_DIA // 8)
+
+# Días hacia adelante que se ofrecen en la página de reservas
+DIAS_RESERVA = 30
+# Máximo rango que se puede pedir a la API de horarios
+DIAS_MAXIMOS_API = 180
+
+
+def como_fecha(valor):
+    """Normaliza una fecha que puede llegar como string (ej: desde request.POST)."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return parse_date(valor)
+
+
+def como_hora(valor):
+    """Normaliza una hora que puede llegar como string 'HH:MM'."""
+    if isinstance(valor, time):
+        return valor
+    return parse_time(valor)
+
+
+def slot_de_hora(hora):
+    """Número de franja del día que contiene a la hora dada."""
+    return (hora.hour * 60 + hora.minute) // MINUTOS_POR_TURNO
+
+
+def hora_de_slot(slot):
+    minutos = slot * MINUTOS_POR_TURNO
+    return time(minutos // 60, minutos % 60)
+
+
+def inicio_franja_actual():
+    """Momento en que empezó la franja en curso (los horarios de hoy cambian ahí)."""
+    ahora = timezone.localtime()
+    minutos = slot_de_hora(ahora.time()) * MINUTOS_POR_TURNO
+    return ahora.replace(hour=minutos // 60, minute=minutos % 60, second=0, microsecond=0)
+
+
+def mascara_de_ventana(hora_inicio, hora_fin):
+    """
+    Máscara con las franjas que entran completas entre hora_inicio y hora_fin.
+    """
+    inicio = -(-(hora_inicio.hour * 60 + hora_inicio.minute) // MINUTOS_POR_TURNO)
+    fin = (hora_fin.hour * 60 + hora_fin.minute) // MINUTOS_POR_TURNO
+    if fin <= inicio:
+        return 0
+    return ((1 << (fin - inicio)) - 1) << inicio
+
+
+def horas_de_mascara(mascara):
+    """Lista de horas 'HH:MM' de los bits encendidos, en orden."""
+    horas = []
+    while mascara:
+        bit = mascara & -mascara
+        horas.append(hora_de_slot(bit.bit_length() - 1).strftime('%H:%M'))
+        mascara ^= bit
+    return horas
+
+
+class IndiceHorarios:
+    """
+    Índice de franjas libres por día.
+
+    Todas las operaciones toman el lock, por lo que se puede usar desde
+    varios threads del mismo proceso.
+
+    _secuencia es el último CambioHorario reflejado. Las señales de este
+    proceso la avanzan con cambios_aplicados() solo si sus cambios siguen
+    justo a ella; si no, hubo cambios de otro proceso en el medio y la
+    próxima consulta rearma el índice.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Descarta el índice; se vuelve a construir en la próxima consulta."""
+        with self._lock:
+            self._semanal = None
+            self._desde = None
+            self._secuencia = None
+            self._ocupados = {}
+            self._conteo = Counter()
+            self._turnos = {}
+
+    # Construcción
+
+    def _cargar_semanal(self):
+        from .models import DisponibilidadHoraria
+
+        semanal = [0] * 7
+        ventanas = DisponibilidadHoraria.objects.filter(activo=True).values_list(
+            'dia_semana', 'hora_inicio', 'hora_fin'
+        )
+        for dia_semana, hora_inicio, hora_fin in ventanas:
+            semanal[dia_semana] |= mascara_de_ventana(hora_inicio, hora_fin)
+        self._semanal = semanal
+
+    def _cargar_ocupados(self):
+        from .models import Turno
+
+        self._desde = timezone.localdate()
+        self._ocupados = {}
+        self._conteo = Counter()
+        self._turnos = {}
+        turnos = Turno.objects.filter(
+            fecha__gte=self._desde
+        ).exclude(estado='cancelado').values_list('id', 'fecha', 'hora')
+        for turno_id, fecha, hora in turnos.iterator(chunk_size=2000):
+            self._ocupar(turno_id, fecha, slot_de_hora(hora))
+
+    def _asegurar_construido(self):
+        from .models import CambioHorario
+
+        # La secuencia se lee antes que los turnos: si otro proceso guarda un
+        # cambio en el medio, la próxima consulta lo detecta y vuelve a armar
+        ultima = CambioHorario.ultima_secuencia()
+        if ultima != self._secuencia:
+            self._secuencia = ultima
+            self._cargar_semanal()
+            self._cargar_ocupados()
+        elif self._semanal is None:
+            self._cargar_semanal()
+
+    # Mantenimiento incremental
+
+    def _ocupar(self, turno_id, fecha, slot):
+        self._turnos[turno_id] = (fecha, slot)
+        self._conteo[fecha, slot] += 1
+        self._ocupados[fecha] = self._ocupados.get(fecha, 0) | (1 << slot)
+
+    def _liberar(self, turno_id):
+        anterior = self._turnos.pop(turno_id, None)
+        if anterior is None:
+            return
+        fecha, slot = anterior
+        self._conteo[anterior] -= 1
+        if self._conteo[anterior] <= 0:
+            del self._conteo[anterior]
+            mascara = self._ocupados.get(fecha, 0) & ~(1 << slot)
+            if mascara:
+                self._ocupados[fecha] = mascara
+            else:
+                self._ocupados.pop(fecha, None)
+
+    def turno_guardado(self, turno_id, fecha, hora, estado):
+        """Refleja un turno creado o modificado (incluida la cancelación)."""
+        with self._lock:
+            if self._desde is None:
+                return
+            self._liberar(turno_id)
+            fecha = como_fecha(fecha)
+            if estado != 'cancelado' and fecha >= self._desde:
+                self._ocupar(turno_id, fecha, slot_de_hora(como_hora(hora)))
+
+    def turno_eliminado(self, turno_id):
+        with self._lock:
+            self._liberar(turno_id)
+
+    def disponibilidad_cambiada(self):
+        """La disponibilidad semanal se recalcula en la próxima consulta."""
+        with self._lock:
+            self._semanal = None
+
+    def cambios_aplicados(self, secuencias):
+        """
+        Marca como reflejados los CambioHorario que acaban de aplicar las
+        señales de este proceso.
+        """
+        if not secuencias:
+            return
+        with self._lock:
+            if self._secuencia is not None and min(secuencias) == self._secuencia + 1:
+                self._secuencia = max(secuencias)
+
+    # Consultas
+
+    def mascara_libre(self, fecha):
+        """Máscara de franjas libres de una fecha."""
+        with self._lock:
+            self._asegurar_construido()
+            return self._semanal[fecha.weekday()] & ~self._ocupados.get(fecha, 0)
+
+    def esta_libre(self, fecha, hora):
+        fecha, hora = como_fecha(fecha), como_hora(hora)
+        return bool(self.mascara_libre(fecha) >> slot_de_hora(hora) & 1)
+
+    def mascaras_libres(self, desde, hasta):
+        """
+        Lista con la máscara de franjas libres de cada día entre desde y
+        hasta (inclusive). Las franjas de hoy que ya pasaron no se ofrecen.
+        """
+        ahora = timezone.localtime()
+        mascaras = []
+        with self._lock:
+            self._asegurar_construido()
+            fecha = desde
+            while fecha <= hasta:
+                mascara = self._semanal[fecha.weekday()] & ~self._ocupados.get(fecha, 0)
+                if fecha == ahora.date():
+                    mascara &= ~((1 << (slot_de_hora(ahora.time()) + 1)) - 1)
+                mascaras.append(mascara)
+                fecha += timedelta(days=1)
+        return mascaras
+
+    def horarios_libres(self, desde, hasta):
+        """
+        Diccionario {'AAAA-MM-DD': ['HH:MM', ...]} con los horarios libres
+        entre desde y hasta (inclusive).
+        """
+        libres = {}
+        for dias, mascara in enumerate(self.mascaras_libres(desde, hasta)):
+            if mascara:
+                libres[(desde + timedelta(days=dias)).isoformat()] = horas_de_mascara(mascara)
+        return libres
+
+    def horarios_libres_binario(self, desde, hasta):
+        """
+        Los mismos horarios en formato compacto: las máscaras de todos los
+        días, una tras otra con BYTES_POR_DIA bytes cada una (bit i = franja i,
+        little-endian), codificadas en base64.
+        """
+        datos = b''.join(
+            mascara.to_bytes(BYTES_POR_DIA, 'little')
+            for mascara in self.mascaras_libres(desde, hasta)
+        )
+        return base64.b64encode(datos).decode('ascii')
+
+
+indice_horarios = IndiceHorarios()
@@ -0,0 +1,191 @@
+"""
+Calendario de turnos en formato iCalendar (RFC 5545) para suscribirse desde
+el teléfono o Google Calendar.
+
+Cada usuario tiene una URL propia con un token firmado (django.core.signing)
+que identifica al usuario sin sesión: los clientes de calendario no inician
+sesión. La firma usa el hash de sesión del usuario, así que cambiar la
+contraseña invalida las URLs anteriores (en los otros workers, recién cuando
+vence su usuario cacheado; ver usuarios/sesion.py).
+
+Los clientes consultan la URL cada pocos minutos aunque nada haya cambiado.
+El contenido depende de una versión guardada en el cache (la de la agenda
+para el profesional, la del paciente para un paciente) y del día actual:
+con esa clave se arma el ETag, así que una consulta repetida se contesta
+con 304 sin tocar la base, y el feed serializado se guarda en el cache hasta
+que cambie un turno. Cuando hay que armarlo, los turnos se leen de a
+bloques con consultas cortas (core/consultas.py, sin dejar un cursor abierto
+mientras el cliente descarga) y se envían a medida que se generan.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone as zonas
+
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.consultas import en_bloques
+from usuarios.sesion import usuario_con_perfil
+from .horarios import MINUTOS_POR_TURNO
+from .models import Turno
+from .versiones import version_agenda, version_paciente
+
+SALT = 'turnos.ics'
+# Dominio de los UID de los eventos: fijo, para que no cambien con el host del pedido
+DOMINIO = 'nutricion-yl'
+# Turnos pasados que se siguen mostrando en el calendario
+DIAS_PASADOS = 30
+TAMANIO_BLOQUE = 500
+TIEMPO_CACHE = 24 * 60 * 60
+
+CAMPOS = [
+    'id', 'fecha', 'hora', 'estado', 'motivo', 'fecha_actualizacion',
+    'paciente__usuario__first_name', 'paciente__usuario__last_name',
+]
+ESTADOS_ICS = {
+    'pendiente': 'TENTATIVE',
+    'confirmado': 'CONFIRMED',
+    'completado': 'CONFIRMED',
+    # El paciente no vino: el calendario no debe mostrarlo como atendido
+    'ausente': 'CANCELLED',
+}
+
+
+def _firmante(usuario):
+    return signing.Signer(salt=f'{SALT}:{usuario.get_session_auth_hash()}')
+
+
+def token_para(usuario):
+    return _firmante(usuario).sign(str(usuario.pk))
+
+
+def usuario_del_token(token):
+    """Usuario dueño del token, o None si el token no es válido."""
+    usuario_id, _, _ = token.partition(':')
+    # isdigit() sola acepta dígitos que no son ASCII, como '²'
+    if not (usuario_id.isascii() and usuario_id.isdigit() and len(usuario_id) <= 18):
+        return None
+    usuario = usuario_con_perfil(int(usuario_id))
+    if usuario is None or not usuario.is_active:
+        return None
+    try:
+        _firmante(usuario).unsign(token)
+    except signing.BadSignature:
+        return None
+    if usuario.tipo == 'paciente' and getattr(usuario, 'paciente', None) is None:
+        return None
+    return usuario
+
+
+def _clave(usuario):
+    if usuario.tipo == 'profesional':
+        version, _ = version_agenda()
+    else:
+        version = version_paciente(usuario.paciente.id)
+    return f'turnos:ics:{usuario.pk}:{version}:{timezone.localdate():%Y%m%d}'
+
+
+def etag(usuario):
+    return hashlib.sha1(_clave(usuario).encode()).hexdigest()
+
+
+# Formato
+
+def _texto(valor):
+    return (
+        valor.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _plegar(linea):
+    """Corta la línea en renglones de hasta 75 bytes, como pide el RFC."""
+    if len(linea.encode()) <= 75:
+        return linea + '\r\n'
+    partes, actual, largo = [], '', 0
+    for caracter in linea:
+        bytes_caracter = len(caracter.encode())
+        if largo + bytes_caracter > 75:
+            partes.append(actual)
+            # Los renglones de continuación empiezan con un espacio
+            actual, largo = ' ', 1
+        actual += caracter
+        largo += bytes_caracter
+    partes.append(actual)
+    return '\r\n'.join(partes) + '\r\n'
+
+
+def _utc(momento):
+    return momento.astimezone(zonas.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _evento(fila, profesional, zona):
+    turno_id, fecha, hora, estado, motivo, modificado, nombre, apellido = fila
+    inicio = timezone.make_aware(datetime.combine(fecha, hora), zona)
+    if profesional:
+        resumen = f'Turno: {nombre} {apellido}'.strip()
+    else:
+        resumen = 'Turno de nutrición'
+    lineas = [
+        'BEGIN:VEVENT',
+        f'UID:turno-{turno_id}@{DOMINIO}',
+        f'DTSTAMP:{_utc(modificado)}',
+        f'LAST-MODIFIED:{_utc(modificado)}',
+        f'DTSTART:{_utc(inicio)}',
+        f'DTEND:{_utc(inicio + timedelta(minutes=MINUTOS_POR_TURNO))}',
+        f'SUMMARY:{_texto(resumen)}',
+        f'STATUS:{ESTADOS_ICS.get(estado, "CONFIRMED")}',
+    ]
+    if motivo:
+        lineas.append(f'DESCRIPTION:{_texto(motivo)}')
+    lineas.append('END:VEVENT')
+    return ''.join(map(_plegar, lineas))
+
+
+def _generar(usuario):
+    profesional = usuario.tipo == 'profesional'
+    turnos = Turno.objects.filter(
+        fecha__gte=timezone.localdate() - timedelta(days=DIAS_PASADOS)
+    ).exclude(estado='cancelado')
+    if not profesional:
+        turnos = turnos.filter(paciente_id=usuario.paciente.id)
+    filas = en_bloques(turnos, CAMPOS, ('fecha', 'hora', 'id'), TAMANIO_BLOQUE)
+
+    yield ''.join(map(_plegar, [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:-//{DOMINIO}//Turnos//ES',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        'X-WR-CALNAME:Turnos Nutrición YL',
+    ]))
+    zona = timezone.get_current_timezone()
+    bloque = []
+    for fila in filas:
+        bloque.append(_evento(fila, profesional, zona))
+        if len(bloque) == TAMANIO_BLOQUE:
+            yield ''.join(bloque)
+            bloque = []
+    bloque.append(_plegar('END:VCALENDAR'))
+    yield ''.join(bloque)
+
+
+def feed(usuario):
+    """
+    Bloques del calendario del usuario. Si está en el cache se devuelve de
+    una vez; si no, se genera de a bloques y se guarda al terminar (si el
+    cliente corta la descarga no queda nada a medias en el cache).
+    """
+    clave = _clave(usuario)
+    guardado = cache.get(clave)
+    if guardado is not None:
+        return iter([guardado])
+
+    def generar():
+        partes = []
+        for bloque in _generar(usuario):
+            partes.append(bloque)
+            yield bloque
+        cache.set(clave, ''.join(partes), TIEMPO_CACHE)
+
+    return generar()
@@ -0,0 +1,93 @@
+"""
+Proyecciones livianas de turnos para listas y grillas.
+
+Las pantallas que listan turnos muestran fecha, hora, estado y poco más,
+pero un Turno completo trae también notas_profesional (texto sin límite),
+las fechas de auditoría y, con select_related, el Paciente y el Usuario
+enteros. Acá cada lista pide con values_list() solo las columnas que usa y
+las guarda en tuplas con nombre: sin instancias de modelos, sin __dict__ por
+fila y sin la señal de carga de Turno.from_db.
+
+Las tuplas responden a los mismos atributos que usan las plantillas
+(turno.fecha, turno.get_estado_display, ...), así que se pueden pasar en
+lugar de los modelos.
+"""
+from collections import namedtuple
+
+from django.urls import reverse
+
+from .models import Turno
+
+ESTADOS = dict(Turno.ESTADO_CHOICES)
+ESTADOS_ACTIVOS = ('pendiente', 'confirmado')
+
+
+class _Lectura:
+    __slots__ = ()
+
+    def get_estado_display(self):
+        return ESTADOS.get(self.estado, self.estado)
+
+    @classmethod
+    def leer(cls, turnos):
+        """Lista de registros a partir de un queryset de Turno."""
+        return list(map(cls._make, turnos.values_list(*cls._fields)))
+
+
+class TurnoCalendario(_Lectura, namedtuple('TurnoCalendario', [
+    'id', 'fecha', 'hora', 'estado', 'paciente__usuario__first_name', 'paciente__usuario__last_name',
+])):
+    """Un turno en la grilla o las listas del calendario del profesional."""
+    __slots__ = ()
+
+    @property
+    def nombre(self):
+        return f"{self.paciente__usuario__first_name} {self.paciente__usuario__last_name}".strip()
+
+
+class TurnoPaciente(_Lectura, namedtuple('TurnoPaciente', ['id', 'fecha', 'hora', 'estado', 'motivo'])):
+    """Un turno en las listas de un paciente."""
+    __slots__ = ()
+
+
+class TurnoConNotas(_Lectura, namedtuple('TurnoConNotas', [
+    'id', 'fecha', 'hora', 'estado', 'motivo', 'notas_profesional',
+])):
+    """Un turno pasado, con las notas que dejó el profesional."""
+    __slots__ = ()
+
+
+def proximos_turnos(paciente, hoy):
+    """Turnos del paciente desde hoy, sin los cancelados."""
+    return TurnoPaciente.leer(
+        Turno.objects.filter(paciente=paciente, fecha__gte=hoy)
+        .exclude(estado='cancelado').order_by('fecha', 'hora')
+    )
+
+
+def ultimos_turnos(paciente, hoy, cantidad=10):
+    """Los últimos turnos anteriores a hoy, del más reciente al más viejo."""
+    return TurnoConNotas.leer(
+        Turno.objects.filter(paciente=paciente, fecha__lt=hoy).order_by('-fecha', '-hora')[:cantidad]
+    )
+
+
+def proximo_turno_activo(paciente, hoy):
+    """El próximo turno pendiente o confirmado del paciente, o None."""
+    turnos = TurnoPaciente.leer(
+        Turno.objects.filter(paciente=paciente, fecha__gte=hoy, estado__in=ESTADOS_ACTIVOS)
+        .order_by('fecha', 'hora')[:1]
+    )
+    return turnos[0] if turnos else None
+
+
+def armador_url_detalle():
+    """
+    Función turno_id -> URL de detalle del turno. Llama a reverse() una sola
+    vez: en listas largas la URL de cada turno solo cambia en el id.
+    """
+    url = reverse('turnos:detalle_turno', args=[0])
+    corte = url.rindex('0')
+    prefijo, sufijo = url[:corte], url[corte + 1:]
+    return lambda turno_id: f'{prefijo}{turno_id}{sufijo}'
+
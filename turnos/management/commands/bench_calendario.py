@@ -0,0 +1,97 @@
+import random
+from calendar import monthcalendar, monthrange
+from datetime import date, time
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Template
+from django.template.loader import get_template
+from django.utils import timezone
+
+from core.benchmarks import base_de_prueba, cronometrar, crear_pacientes
+from turnos.models import Turno
+from turnos.calendario import armar_grilla_mes, turnos_en_rango
+
+
+# Grilla tal como se armaba antes: recorre todas las fechas con turnos en cada celda
+GRILLA_ANTERIOR = '''
+{% for semana in calendario %}
+    {% for dia in semana %}
+        {% if dia == 0 %}
+            <div class="celda-dia otro-mes"></div>
+        {% else %}
+            {% with fecha=anio|add:"-"|add:mes|add:"-"|add:dia %}
+                <div class="celda-dia {% if hoy.day == dia and hoy.month == mes and hoy.year == anio %}hoy{% endif %}">
+                    <div class="numero-dia">{{ dia }}</div>
+                    {% for fecha_str, turnos in turnos_por_fecha.items %}
+                        {% if fecha_str|slice:"8:" == dia|stringformat:"02d" %}
+                            {% for turno in turnos %}
+                                <a href="{% url 'turnos:detalle_turno' turno.id %}" class="turno-item turno-{{ turno.estado }}">
+                                    {{ turno.hora|slice:":5" }} - {{ turno.paciente.usuario.get_full_name|truncatewords:2 }}
+                                </a>
+                            {% endfor %}
+                        {% endif %}
+                    {% endfor %}
+                </div>
+            {% endwith %}
+        {% endif %}
+    {% endfor %}
+{% endfor %}
+'''
+
+
+class Command(BaseCommand):
+    help = 'Compara el armado y renderizado de la grilla del calendario mensual (anterior vs. actual).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turnos', type=int, default=1200)
+        parser.add_argument('--repeticiones', type=int, default=10)
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        anio, mes = hoy.year, hoy.month
+
+        with base_de_prueba():
+            pacientes = crear_pacientes(300)
+            dias = monthrange(anio, mes)[1]
+            lugares = random.Random(0).sample(range(dias * 24 * 60), options['turnos'])
+            Turno.objects.bulk_create([
+                Turno(
+                    paciente=pacientes[i % len(pacientes)],
+                    fecha=date(anio, mes, lugar // 1440 + 1),
+                    hora=time(lugar % 1440 // 60, lugar % 60),
+                )
+                for i, lugar in enumerate(lugares)
+            ])
+
+            def turnos_del_mes():
+                return Turno.objects.filter(
+                    fecha__year=anio, fecha__month=mes
+                ).select_related('paciente__usuario').order_by('fecha', 'hora')
+
+            plantilla_anterior = Template(GRILLA_ANTERIOR)
+            plantilla_actual = get_template('turnos/_calendario_grilla.html')
+
+            def anterior():
+                turnos_por_fecha = {}
+                for turno in turnos_del_mes():
+                    turnos_por_fecha.setdefault(turno.fecha.isoformat(), []).append(turno)
+                return plantilla_anterior.render(Context({
+                    'calendario': monthcalendar(anio, mes),
+                    'turnos_por_fecha': turnos_por_fecha,
+                    'anio': anio,
+                    'mes': mes,
+                    'hoy': hoy,
+                }))
+
+            def actual():
+                turnos = turnos_en_rango(date(anio, mes, 1), date(anio, mes, dias))
+                semanas, _ = armar_grilla_mes(anio, mes, turnos, hoy)
+                return plantilla_actual.render({'semanas': semanas})
+
+            repeticiones = options['repeticiones']
+            tiempo_anterior = cronometrar(anterior, repeticiones)
+            tiempo_actual = cronometrar(actual, repeticiones)
+
+        self.stdout.write(f"{options['turnos']} turnos en {mes:02d}/{anio}")
+        self.stdout.write(f'  plantilla cuadrática: mejor {tiempo_anterior[0]:8.2f} ms  promedio {tiempo_anterior[1]:8.2f} ms')
+        self.stdout.write(f'  grilla en Python:     mejor {tiempo_actual[0]:8.2f} ms  promedio {tiempo_actual[1]:8.2f} ms')
@@ -0,0 +1,69 @@
+import random
+import time as reloj
+from datetime import time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from core.benchmarks import base_de_prueba, cronometrar, crear_pacientes
+from turnos.estadisticas import reconstruir, resumen
+from turnos.models import Turno
+
+ESTADOS = ['pendiente', 'confirmado', 'completado', 'completado', 'cancelado', 'ausente']
+
+
+class Command(BaseCommand):
+    help = 'Compara el resumen de un año calculado sobre la tabla de turnos contra las estadísticas diarias.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turnos', type=int, default=30000)
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        desde = hoy - timedelta(days=365)
+        azar = random.Random(0)
+
+        with base_de_prueba():
+            pacientes = crear_pacientes(2000)
+            lugares = azar.sample(range(3 * 365 * 24 * 4), options['turnos'])
+            Turno.objects.bulk_create([
+                Turno(
+                    paciente=azar.choice(pacientes),
+                    fecha=hoy - timedelta(days=lugar // 96),
+                    hora=time(lugar % 96 // 4, lugar % 4 * 15),
+                    estado=azar.choice(ESTADOS),
+                )
+                for lugar in lugares
+            ], batch_size=2000)
+
+            inicio = reloj.perf_counter()
+            dias = reconstruir()
+            segundos = reloj.perf_counter() - inicio
+
+            def sobre_turnos():
+                turnos = Turno.objects.filter(fecha__range=(desde, hoy))
+                anteriores = Turno.objects.filter(
+                    Q(fecha__lte=OuterRef('fecha')),
+                    Q(fecha__lt=OuterRef('fecha')) | Q(hora__lt=OuterRef('hora')),
+                    paciente_id=OuterRef('paciente_id'),
+                ).exclude(estado='cancelado')
+                por_estado = dict(turnos.values_list('estado').annotate(n=Count('id')).order_by())
+                nuevos = turnos.exclude(estado='cancelado').exclude(Exists(anteriores)).count()
+                return por_estado, nuevos
+
+            def con_estadisticas():
+                return resumen(desde, hoy)
+
+            resultados = [
+                (nombre, cronometrar(funcion, options['repeticiones']))
+                for nombre, funcion in [
+                    ('agregando turnos', sobre_turnos),
+                    ('estadísticas diarias', con_estadisticas),
+                ]
+            ]
+
+        self.stdout.write(f"{options['turnos']} turnos; reconstruir {dias} días: {segundos:.2f} s")
+        for nombre, (mejor, promedio) in resultados:
+            self.stdout.write(f'  {nombre:22} mejor {mejor:9.2f} ms  promedio {promedio:9.2f} ms')
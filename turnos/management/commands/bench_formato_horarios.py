@@ -0,0 +1,124 @@
+import base64
+import gzip
+import json
+import random
+from datetime import time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.benchmarks import base_de_prueba, cronometrar, crear_pacientes
+from turnos.horarios import indice_horarios, BYTES_POR_DIA, MINUTOS_POR_TURNO
+from turnos.models import Turno, DisponibilidadHoraria
+
+
+def decodificar_bitmap(datos):
+    """
+    Réplica en Python de decodificarMascaras() de agendar_turno.js. Sirve de
+    aproximación: los tiempos no son los del navegador, donde el bucle de
+    bits es mucho más barato en relación con json.loads.
+    """
+    crudo = base64.b64decode(datos['mascaras'])
+    horarios = {}
+    for dia in range(len(crudo) // BYTES_POR_DIA):
+        mascara = int.from_bytes(crudo[dia * BYTES_POR_DIA:(dia + 1) * BYTES_POR_DIA], 'little')
+        libres = []
+        slot = 0
+        while mascara:
+            if mascara & 1:
+                minutos = slot * MINUTOS_POR_TURNO
+                libres.append(f'{minutos // 60:02d}:{minutos % 60:02d}')
+            mascara >>= 1
+            slot += 1
+        if libres:
+            horarios[dia] = libres
+    return horarios
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara tamaño y tiempo de parseo de los horarios para 30/90/180 días: '
+        'lista de turnos ocupados en JSON (formato anterior), lista de horas '
+        'libres por día y máscaras de bits en base64. El parseo se mide en '
+        'Python como aproximación del decodificador de agendar_turno.js.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, nargs='+', default=[30, 90, 180])
+        parser.add_argument('--ocupacion', type=float, default=0.6,
+                            help='Fracción de horarios disponibles que están ocupados.')
+        parser.add_argument('--repeticiones', type=int, default=50)
+
+    def handle(self, *args, **options):
+        horizonte = max(options['dias'])
+        with base_de_prueba():
+            self._preparar(horizonte, options['ocupacion'])
+            hoy = timezone.localdate() + timedelta(days=1)
+            indice_horarios.reiniciar()
+
+            self.stdout.write(f"{'días':>5} {'formato':<22} {'bytes':>9} {'gzip':>8} {'parseo (Python)':>16}")
+            for dias in options['dias']:
+                hasta = hoy + timedelta(days=dias - 1)
+                cuerpos = {
+                    'ocupados (anterior)': (self._formato_anterior(hoy, hasta), json.loads),
+                    'horas por día': (
+                        json.dumps({'horarios': indice_horarios.horarios_libres(hoy, hasta)}),
+                        json.loads,
+                    ),
+                    'bitmap base64': (
+                        json.dumps({
+                            'desde': hoy.isoformat(),
+                            'mascaras': indice_horarios.horarios_libres_binario(hoy, hasta),
+                        }),
+                        lambda cuerpo: decodificar_bitmap(json.loads(cuerpo)),
+                    ),
+                }
+                # Piso del formato binario si el cliente decodifica cada día recién al mostrarlo
+                cuerpos['bitmap (sin expandir)'] = (
+                    cuerpos['bitmap base64'][0],
+                    lambda cuerpo: base64.b64decode(json.loads(cuerpo)['mascaras']),
+                )
+                for nombre, (cuerpo, parsear) in cuerpos.items():
+                    mejor, _ = cronometrar(lambda: parsear(cuerpo), options['repeticiones'])
+                    crudo = cuerpo.encode()
+                    self.stdout.write(
+                        f'{dias:>5} {nombre:<22} {len(crudo):>9} {len(gzip.compress(crudo)):>8} {mejor:>14.3f}ms'
+                    )
+            indice_horarios.reiniciar()
+
+    def _preparar(self, horizonte, ocupacion):
+        for dia in range(6):
+            DisponibilidadHoraria.objects.create(dia_semana=dia, hora_inicio=time(8), hora_fin=time(13))
+            DisponibilidadHoraria.objects.create(dia_semana=dia, hora_inicio=time(14), hora_fin=time(20))
+
+        pacientes = crear_pacientes(200)
+        azar = random.Random(0)
+        hoy = timezone.localdate()
+        turnos = []
+        for dias in range(1, horizonte + 1):
+            fecha = hoy + timedelta(days=dias)
+            if fecha.weekday() == 6:
+                continue
+            for minutos in list(range(8 * 60, 13 * 60, 30)) + list(range(14 * 60, 20 * 60, 30)):
+                if azar.random() < ocupacion:
+                    turnos.append(Turno(
+                        paciente=azar.choice(pacientes),
+                        fecha=fecha,
+                        hora=time(minutos // 60, minutos % 60),
+                    ))
+        Turno.objects.bulk_create(turnos, batch_size=2000)
+
+    def _formato_anterior(self, desde, hasta):
+        disponibilidades = list(DisponibilidadHoraria.objects.filter(activo=True).values(
+            'dia_semana', 'hora_inicio', 'hora_fin'
+        ))
+        for disp in disponibilidades:
+            disp['hora_inicio'] = disp['hora_inicio'].strftime('%H:%M')
+            disp['hora_fin'] = disp['hora_fin'].strftime('%H:%M')
+        ocupados = list(Turno.objects.filter(
+            fecha__gte=desde, fecha__lte=hasta
+        ).exclude(estado='cancelado').values('fecha', 'hora'))
+        for turno in ocupados:
+            turno['fecha'] = turno['fecha'].isoformat()
+            turno['hora'] = turno['hora'].strftime('%H:%M')
+        return json.dumps({'disponibilidades': disponibilidades, 'turnos_ocupados': ocupados})
@@ -0,0 +1,82 @@
+import json
+import random
+from datetime import time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.benchmarks import base_de_prueba, cronometrar, crear_pacientes
+from turnos.horarios import indice_horarios, DIAS_RESERVA
+from turnos.models import Turno, DisponibilidadHoraria
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el cálculo de horarios de la página de reservas: consulta + '
+        'serialización JSON de todos los turnos contra el índice en memoria.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turnos', type=int, nargs='+', default=[10_000, 100_000])
+        parser.add_argument('--dias', type=int, default=120,
+                            help='Días hacia adelante en los que se reparten los turnos.')
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        for cantidad in options['turnos']:
+            with base_de_prueba():
+                self._preparar(cantidad, options['dias'])
+                self._medir(cantidad, options['repeticiones'])
+
+    def _preparar(self, cantidad, dias):
+        for dia in range(5):
+            DisponibilidadHoraria.objects.create(dia_semana=dia, hora_inicio=time(9), hora_fin=time(12))
+            DisponibilidadHoraria.objects.create(dia_semana=dia, hora_inicio=time(14), hora_fin=time(17, 30))
+
+        pacientes = crear_pacientes(200)
+        hoy = timezone.localdate()
+        # Horas con resolución de minuto para poder cargar muchos turnos por día
+        lugares = random.Random(0).sample(range(dias * 24 * 60), cantidad)
+        Turno.objects.bulk_create([
+            Turno(
+                paciente=pacientes[i % len(pacientes)],
+                fecha=hoy + timedelta(days=lugar // 1440),
+                hora=time(lugar % 1440 // 60, lugar % 60),
+                estado='cancelado' if i % 10 == 0 else 'pendiente',
+            )
+            for i, lugar in enumerate(lugares)
+        ], batch_size=2000)
+
+    def _medir(self, cantidad, repeticiones):
+        hoy = timezone.localdate()
+        limite = hoy + timedelta(days=DIAS_RESERVA)
+
+        def enfoque_anterior():
+            disponibilidades = list(DisponibilidadHoraria.objects.filter(activo=True).values(
+                'dia_semana', 'hora_inicio', 'hora_fin'
+            ))
+            for disp in disponibilidades:
+                disp['hora_inicio'] = disp['hora_inicio'].strftime('%H:%M')
+                disp['hora_fin'] = disp['hora_fin'].strftime('%H:%M')
+            ocupados = list(Turno.objects.filter(
+                fecha__gte=hoy, fecha__lte=limite
+            ).exclude(estado='cancelado').values('fecha', 'hora'))
+            for turno in ocupados:
+                turno['fecha'] = turno['fecha'].isoformat()
+                turno['hora'] = turno['hora'].strftime('%H:%M')
+            return json.dumps(disponibilidades), json.dumps(ocupados)
+
+        def indice():
+            return indice_horarios.horarios_libres(hoy, limite)
+
+        indice_horarios.reiniciar()
+        construccion, _ = cronometrar(indice, repeticiones=1)
+
+        anterior = cronometrar(enfoque_anterior, repeticiones)
+        nuevo = cronometrar(indice, repeticiones)
+
+        self.stdout.write(f'\n{cantidad} turnos futuros')
+        self.stdout.write(f'  consulta + JSON:      mejor {anterior[0]:8.2f} ms  promedio {anterior[1]:8.2f} ms')
+        self.stdout.write(f'  índice en memoria:    mejor {nuevo[0]:8.2f} ms  promedio {nuevo[1]:8.2f} ms')
+        self.stdout.write(f'  construcción inicial: {construccion:8.2f} ms (al arrancar y tras cambios de otro proceso)')
+        indice_horarios.reiniciar()
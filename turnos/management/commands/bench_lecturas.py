@@ -0,0 +1,89 @@
+import random
+import tracemalloc
+from calendar import monthrange
+from datetime import date, time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.benchmarks import base_de_prueba, cronometrar, crear_pacientes
+from turnos.calendario import turnos_en_rango
+from turnos.lecturas import TurnoConNotas
+from turnos.models import Turno
+
+# Notas de un largo habitual en una consulta
+NOTAS = 'Control mensual. Buena adherencia al plan, ajustar colaciones. ' * 12
+
+
+def _memoria(funcion):
+    """Pico de memoria (KB) de Python mientras se ejecuta la función y se conserva su resultado."""
+    tracemalloc.start()
+    try:
+        resultado = funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del resultado
+    return pico / 1024
+
+
+class Command(BaseCommand):
+    help = 'Compara memoria y tiempo de los querysets de modelos completos contra las proyecciones de turnos/lecturas.py.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turnos', type=int, default=2000)
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        anio, mes = hoy.year, hoy.month
+        desde, hasta = date(anio, mes, 1), date(anio, mes, monthrange(anio, mes)[1])
+
+        with base_de_prueba():
+            pacientes = crear_pacientes(300)
+            lugares = random.Random(0).sample(range(hasta.day * 24 * 60), options['turnos'])
+            Turno.objects.bulk_create([
+                Turno(
+                    paciente=pacientes[i % len(pacientes)],
+                    fecha=date(anio, mes, lugar // 1440 + 1),
+                    hora=time(lugar % 1440 // 60, lugar % 60),
+                    estado='completado',
+                    notas_profesional=NOTAS,
+                )
+                for i, lugar in enumerate(lugares)
+            ])
+            paciente = pacientes[0]
+
+            def calendario_antes():
+                return list(Turno.objects.filter(
+                    fecha__range=(desde, hasta)
+                ).select_related('paciente__usuario').order_by('fecha', 'hora'))
+
+            def calendario_ahora():
+                return turnos_en_rango(desde, hasta)
+
+            # Lista de turnos pasados de un paciente con todo el mes agendado
+            Turno.objects.filter(fecha__range=(desde, hasta)).update(paciente=paciente)
+
+            def paciente_antes():
+                return list(Turno.objects.filter(paciente=paciente).order_by('-fecha', '-hora'))
+
+            def paciente_ahora():
+                return TurnoConNotas.leer(Turno.objects.filter(paciente=paciente).order_by('-fecha', '-hora'))
+
+            repeticiones = options['repeticiones']
+            resultados = [
+                (nombre, cronometrar(funcion, repeticiones), _memoria(funcion))
+                for nombre, funcion in [
+                    ('calendario: modelos completos', calendario_antes),
+                    ('calendario: TurnoCalendario', calendario_ahora),
+                    ('paciente: modelos completos', paciente_antes),
+                    ('paciente: TurnoConNotas', paciente_ahora),
+                ]
+            ]
+
+        self.stdout.write(f"{options['turnos']} turnos en {mes:02d}/{anio}")
+        for nombre, (mejor, promedio), memoria in resultados:
+            self.stdout.write(
+                f'  {nombre:30} mejor {mejor:8.2f} ms  promedio {promedio:8.2f} ms  memoria {memoria:8.0f} KB'
+            )
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from turnos.cierre import TAMANIO_LOTE, cerrar_turnos_pasados
+
+
+class Command(BaseCommand):
+    help = (
+        'Cierra los turnos pasados que siguen abiertos: los confirmados pasan a completado y '
+        'los pendientes a ausente. Trabaja en lotes cortos para no bloquear la base.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hasta', help='Cerrar los turnos anteriores a esta fecha (AAAA-MM-DD); por defecto, hoy')
+        parser.add_argument('--lote', type=int, default=TAMANIO_LOTE)
+        parser.add_argument('--pausa', type=float, default=0,
+                            help='Segundos de espera entre lotes, para dejar pasar otras escrituras')
+
+    def handle(self, *args, **options):
+        hasta = None
+        if options['hasta']:
+            hasta = parse_date(options['hasta'])
+            if not hasta:
+                raise CommandError('--hasta debe tener el formato AAAA-MM-DD')
+
+        def al_avanzar(resultado):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  lote {resultado.lotes}: {resultado.total} turnos cerrados')
+
+        inicio = time.perf_counter()
+        resultado = cerrar_turnos_pasados(hasta, options['lote'], options['pausa'], al_avanzar)
+        segundos = time.perf_counter() - inicio
+
+        detalle = ', '.join(f'{cantidad} {estado}' for estado, cantidad in resultado.por_estado.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.total} turnos cerrados en {resultado.lotes} lotes ({segundos:.1f} s)'
+            + (f': {detalle}.' if detalle else '.')
+        ))
@@ -0,0 +1,98 @@
+import multiprocessing
+import statistics
+import time
+from datetime import time as hora_del_dia, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+
+from core.benchmarks import base_de_prueba, crear_pacientes
+from turnos.models import Turno
+from turnos.reservas import reservar_turno, RESERVADO, OCUPADO, CONGESTION
+
+
+def _reservar_en_proceso(barrera, cola, pedidos):
+    """Cuerpo de cada proceso: espera a los demás y reserva en ráfaga."""
+    from pacientes.models import Paciente
+
+    pacientes = Paciente.objects.in_bulk({paciente_id for paciente_id, _, _ in pedidos})
+    barrera.wait()
+    resultados = []
+    for paciente_id, fecha, hora in pedidos:
+        inicio = time.perf_counter()
+        resultado = reservar_turno(pacientes[paciente_id], fecha, hora)
+        resultados.append((resultado.resultado, time.perf_counter() - inicio))
+    connections.close_all()
+    cola.put(resultados)
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de estrés: varios procesos reservan a la vez los mismos horarios '
+        'sobre SQLite y se informa cuántas reservas entraron, cuántas se '
+        'rechazaron y la latencia.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=8)
+        parser.add_argument('--reservas', type=int, default=400,
+                            help='Cantidad total de intentos de reserva por ronda.')
+        parser.add_argument('--horarios', type=int, default=10,
+                            help='Cantidad de horarios distintos por los que se compite.')
+
+    def handle(self, *args, **options):
+        with base_de_prueba():
+            pacientes = crear_pacientes(options['reservas'])
+            manana = timezone.localdate() + timedelta(days=1)
+            horarios = [
+                (manana, hora_del_dia(9 + i // 2, 30 * (i % 2)))
+                for i in range(options['horarios'])
+            ]
+            pedidos = [
+                (pacientes[i].id, *horarios[i % len(horarios)])
+                for i in range(options['reservas'])
+            ]
+
+            self._ronda('Ronda 1: horarios libres', pedidos, horarios, options['procesos'])
+
+            # Los horarios cancelados tienen que poder volver a reservarse
+            Turno.objects.update(estado='cancelado')
+            self._ronda('Ronda 2: mismos horarios, ya cancelados', pedidos, horarios, options['procesos'])
+
+    def _ronda(self, titulo, pedidos, horarios, procesos):
+        contexto = multiprocessing.get_context('fork')
+        barrera = contexto.Barrier(procesos)
+        cola = contexto.Queue()
+        # Cada proceso abre su propia conexión
+        connections.close_all()
+
+        trabajadores = [
+            contexto.Process(target=_reservar_en_proceso, args=(barrera, cola, pedidos[i::procesos]))
+            for i in range(procesos)
+        ]
+        inicio = time.perf_counter()
+        for trabajador in trabajadores:
+            trabajador.start()
+        resultados = [resultado for _ in trabajadores for resultado in cola.get()]
+        for trabajador in trabajadores:
+            trabajador.join()
+        duracion = time.perf_counter() - inicio
+
+        conteo = {}
+        for resultado, _ in resultados:
+            conteo[resultado] = conteo.get(resultado, 0) + 1
+        latencias = sorted(latencia * 1000 for _, latencia in resultados)
+        duplicados = Turno.objects.exclude(estado='cancelado').values(
+            'fecha', 'hora'
+        ).annotate(cantidad=Count('id')).filter(cantidad__gt=1).count()
+
+        self.stdout.write(f'\n{titulo}')
+        self.stdout.write(f'  {len(resultados)} intentos en {procesos} procesos sobre {len(horarios)} horarios ({duracion:.2f} s)')
+        self.stdout.write(f'  reservados: {conteo.get(RESERVADO, 0)}  rechazados: {conteo.get(OCUPADO, 0)}  '
+                          f'congestión: {conteo.get(CONGESTION, 0)}')
+        self.stdout.write(f'  latencia: p50 {statistics.median(latencias):.1f} ms  '
+                          f'p95 {latencias[int(len(latencias) * 0.95) - 1]:.1f} ms  máx {latencias[-1]:.1f} ms')
+        estilo = self.style.SUCCESS if duplicados == 0 and conteo.get(RESERVADO, 0) == len(horarios) else self.style.ERROR
+        self.stdout.write(estilo(f'  horarios con más de un turno activo: {duplicados}'))
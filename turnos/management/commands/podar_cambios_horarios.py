@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from turnos.models import CambioHorario
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra los registros de cambios de horarios más viejos que --dias. '
+        'Los clientes con una secuencia anterior reciben "recargar".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=7)
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(days=options['dias'])
+        # Se conserva siempre el último registro para que la secuencia no retroceda
+        ultimo = CambioHorario.ultima_secuencia()
+        borrados, _ = CambioHorario.objects.filter(
+            fecha_creacion__lt=limite
+        ).exclude(id=ultimo).delete()
+        self.stdout.write(self.style.SUCCESS(f'{borrados} cambios borrados.'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0003_registrohistorial_registro_paciente_fecha_idx'),
+        ('turnos', '0003_turno_turno_paciente_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='turno',
+            index=models.Index(fields=['fecha', 'hora'], name='turno_fecha_idx'),
+        ),
+    ]
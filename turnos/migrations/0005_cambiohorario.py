@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('turnos', '0004_turno_turno_fecha_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioHorario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('ocupado', 'Horario ocupado'), ('liberado', 'Horario liberado'), ('disponibilidad', 'Cambio de disponibilidad')], max_length=20)),
+                ('fecha', models.DateField(blank=True, null=True)),
+                ('hora', models.TimeField(blank=True, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Cambio de Horario',
+                'verbose_name_plural': 'Cambios de Horario',
+                'ordering': ['id'],
+            },
+        ),
+    ]
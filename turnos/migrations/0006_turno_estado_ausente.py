@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('turnos', '0005_cambiohorario'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='turno',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmado', 'Confirmado'), ('cancelado', 'Cancelado'), ('completado', 'Completado'), ('ausente', 'Ausente')], default='pendiente', max_length=20),
+        ),
+    ]
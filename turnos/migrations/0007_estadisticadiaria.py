@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:12
+
+from datetime import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def calcular_existentes(apps, schema_editor):
+    # Copia de turnos.estadisticas al momento de esta migración, sobre los
+    # modelos históricos: el módulo puede cambiar junto con el modelo y esta
+    # migración tiene que poder volver a correr igual. Después de aplicar
+    # migraciones posteriores se puede recalcular con `reconstruir_estadisticas`.
+    Turno = apps.get_model('turnos', 'Turno')
+    EstadisticaDiaria = apps.get_model('turnos', 'EstadisticaDiaria')
+    columnas = {
+        'pendiente': 'pendientes',
+        'confirmado': 'confirmados',
+        'completado': 'completados',
+        'cancelado': 'cancelados',
+        'ausente': 'ausentes',
+    }
+    zona = timezone.get_current_timezone()
+
+    dias = {}
+    con_turno = set()
+    filas = Turno.objects.order_by('paciente_id', 'fecha', 'hora').values_list(
+        'paciente_id', 'fecha', 'hora', 'estado', 'fecha_actualizacion'
+    )
+    for paciente_id, fecha, hora, estado, modificado in filas.iterator(chunk_size=2000):
+        dia = dias.get(fecha)
+        if dia is None:
+            dia = dias[fecha] = EstadisticaDiaria(fecha=fecha)
+        if estado in columnas:
+            setattr(dia, columnas[estado], getattr(dia, columnas[estado]) + 1)
+        if estado == 'cancelado':
+            inicio = timezone.make_aware(datetime.combine(fecha, hora), zona)
+            horas = max(0.0, (inicio - modificado).total_seconds() / 3600)
+            dia.horas_anticipacion_cancelacion += horas
+            dia.cancelaciones_tardias += horas < 24
+        elif paciente_id in con_turno:
+            dia.pacientes_recurrentes += 1
+        else:
+            # Primer turno no cancelado del paciente
+            con_turno.add(paciente_id)
+            dia.pacientes_nuevos += 1
+    EstadisticaDiaria.objects.bulk_create(dias.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('turnos', '0006_turno_estado_ausente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('pendientes', models.PositiveIntegerField(default=0)),
+                ('confirmados', models.PositiveIntegerField(default=0)),
+                ('completados', models.PositiveIntegerField(default=0)),
+                ('cancelados', models.PositiveIntegerField(default=0)),
+                ('ausentes', models.PositiveIntegerField(default=0)),
+                ('pacientes_nuevos', models.PositiveIntegerField(default=0)),
+                ('pacientes_recurrentes', models.PositiveIntegerField(default=0)),
+                ('horas_anticipacion_cancelacion', models.FloatField(default=0)),
+                ('cancelaciones_tardias', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Estadística Diaria',
+                'verbose_name_plural': 'Estadísticas Diarias',
+                'ordering': ['fecha'],
+            },
+        ),
+        migrations.RunPython(calcular_existentes, migrations.RunPython.noop),
+    ]
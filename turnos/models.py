@@ -13,6 +13,8 @@ class Turno(models.Model):
         ('confirmado', 'Confirmado'),
         ('cancelado', 'Cancelado'),
         ('completado', 'Completado'),
+        # Turno pasado al que el paciente no vino (lo marca el cierre automático)
+        ('ausente', 'Ausente'),
     ]
     
     paciente = models.ForeignKey(
@@ -41,11 +43,36 @@ class Turno(models.Model):
         verbose_name = 'Turno'
         verbose_name_plural = 'Turnos'
         ordering = ['fecha', 'hora']
-        # Evita que se agenden dos turnos a la misma hora
-        unique_together = ['fecha', 'hora']
+        indexes = [
+            # Turnos de un paciente por fecha (mis turnos, próximos y pasados)
+            models.Index(fields=['paciente', 'fecha', 'hora'], name='turno_paciente_fecha_idx'),
+            # Rangos de fechas del calendario (incluye cancelados)
+            models.Index(fields=['fecha', 'hora'], name='turno_fecha_idx'),
+        ]
+        # La restricción de abajo también funciona como índice parcial de los
+        # turnos activos por fecha y hora (horarios ocupados, reservas)
+        constraints = [
+            # Evita que se agenden dos turnos a la misma hora; los cancelados
+            # no cuentan, así el horario se puede volver a reservar
+            models.UniqueConstraint(
+                fields=['fecha', 'hora'],
+                condition=~models.Q(estado='cancelado'),
+                name='turno_unico_activo',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.paciente} - {self.fecha} {self.hora}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores leídos de la base, para saber qué cambió al guardar
+        # (mes anterior del calendario, horario que se libera, etc.)
+        instance._original = {
+            campo: instance.__dict__.get(campo) for campo in ('fecha', 'hora', 'estado')
+        }
+        return instance
 
 
 class DisponibilidadHoraria(models.Model):
@@ -73,4 +100,69 @@ class DisponibilidadHoraria(models.Model):
         ordering = ['dia_semana', 'hora_inicio']
     
     def __str__(self):
-        return f"{self.get_dia_semana_display()}: {self.hora_inicio} - {self.hora_fin}"
\ No newline at end of file
+        return f"{self.get_dia_semana_display()}: {self.hora_inicio} - {self.hora_fin}"
+
+
+class CambioHorario(models.Model):
+    """
+    Registro de cambios en la ocupación de horarios.
+    El id es un número de secuencia creciente: los clientes piden
+    "qué cambió desde N" en lugar de descargar todos los horarios de nuevo.
+    """
+    TIPO_CHOICES = [
+        ('ocupado', 'Horario ocupado'),
+        ('liberado', 'Horario liberado'),
+        ('disponibilidad', 'Cambio de disponibilidad'),
+    ]
+    
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    # Vacíos para los cambios de disponibilidad, que afectan a todos los días
+    fecha = models.DateField(null=True, blank=True)
+    hora = models.TimeField(null=True, blank=True)
+    
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Cambio de Horario'
+        verbose_name_plural = 'Cambios de Horario'
+        ordering = ['id']
+    
+    @classmethod
+    def ultima_secuencia(cls):
+        return cls.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    
+    def __str__(self):
+        return f"#{self.id} {self.get_tipo_display()} {self.fecha or ''} {self.hora or ''}".strip()
+
+
+class EstadisticaDiaria(models.Model):
+    """
+    Resumen de los turnos de un día. Lo mantienen las señales de Turno
+    (ver turnos/estadisticas.py): los tableros suman estas filas en lugar
+    de agregar la tabla de turnos.
+    """
+    fecha = models.DateField(unique=True)
+    
+    # Turnos del día en cada estado
+    pendientes = models.PositiveIntegerField(default=0)
+    confirmados = models.PositiveIntegerField(default=0)
+    completados = models.PositiveIntegerField(default=0)
+    cancelados = models.PositiveIntegerField(default=0)
+    ausentes = models.PositiveIntegerField(default=0)
+    
+    # Turnos no cancelados que son el primero del paciente / los demás
+    pacientes_nuevos = models.PositiveIntegerField(default=0)
+    pacientes_recurrentes = models.PositiveIntegerField(default=0)
+    
+    # Anticipación de las cancelaciones: suma en horas (para el promedio) y
+    # cuántas fueron con menos de un día de aviso
+    horas_anticipacion_cancelacion = models.FloatField(default=0)
+    cancelaciones_tardias = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Estadística Diaria'
+        verbose_name_plural = 'Estadísticas Diarias'
+        ordering = ['fecha']
+    
+    def __str__(self):
+        return f"Estadísticas del {self.fecha}"
@@ -0,0 +1,83 @@
+"""
+Reserva de turnos segura ante pacientes que reservan al mismo tiempo.
+
+La garantía la da la restricción única parcial `turno_unico_activo` (un solo
+turno no cancelado por fecha y hora): si dos reservas compiten por el mismo
+horario, la base rechaza la segunda y acá se traduce en "horario ocupado".
+Si SQLite está bloqueado por otra escritura se reintenta unas pocas veces
+con espera exponencial antes de rendirse.
+"""
+import random
+import time
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from .horarios import como_fecha, como_hora
+from .models import Turno
+
+RESERVADO = 'reservado'
+OCUPADO = 'ocupado'
+CONGESTION = 'congestion'
+INVALIDO = 'invalido'
+
+MAX_INTENTOS = 5
+ESPERA_BASE = 0.05  # segundos
+
+
+class ResultadoReserva(NamedTuple):
+    resultado: str
+    turno: Optional[Turno] = None
+
+    @property
+    def ok(self):
+        return self.resultado == RESERVADO
+
+
+def _es_bloqueo(error):
+    mensaje = str(error).lower()
+    return 'locked' in mensaje or 'busy' in mensaje
+
+
+def reservar_turno(paciente, fecha, hora, motivo=''):
+    """
+    Intenta reservar el horario para el paciente.
+    Devuelve un ResultadoReserva; nunca deja escapar el IntegrityError de
+    un horario ya tomado. Una fecha u hora ilegible o ya pasada es INVALIDO.
+    """
+    try:
+        fecha, hora = como_fecha(fecha), como_hora(hora)
+    except ValueError:
+        return ResultadoReserva(INVALIDO)
+    if fecha is None or hora is None:
+        return ResultadoReserva(INVALIDO)
+    if datetime.combine(fecha, hora) <= timezone.localtime().replace(tzinfo=None):
+        return ResultadoReserva(INVALIDO)
+
+    for intento in range(MAX_INTENTOS):
+        try:
+            with transaction.atomic():
+                ocupado = Turno.objects.filter(
+                    fecha=fecha, hora=hora
+                ).exclude(estado='cancelado').exists()
+                if ocupado:
+                    return ResultadoReserva(OCUPADO)
+                turno = Turno.objects.create(
+                    paciente=paciente,
+                    fecha=fecha,
+                    hora=hora,
+                    motivo=motivo,
+                    estado='pendiente'
+                )
+            return ResultadoReserva(RESERVADO, turno)
+        except IntegrityError:
+            return ResultadoReserva(OCUPADO)
+        except OperationalError as error:
+            if not _es_bloqueo(error):
+                raise
+            # Espera exponencial con jitter para no reintentar todos juntos
+            time.sleep(random.uniform(0, ESPERA_BASE * 2 ** intento))
+
+    return ResultadoReserva(CONGESTION)
@@ -0,0 +1,175 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .acciones import turnos_actualizados
+from .models import Turno, DisponibilidadHoraria, CambioHorario
+from .horarios import indice_horarios, como_fecha, como_hora
+from .versiones import invalidar_mes, invalidar_paciente, marcar_cambio_agenda
+from . import eventos, estadisticas
+
+
+# Los índices en memoria y las versiones del cache se actualizan recién
+# cuando se confirma la transacción, para no reflejar cambios que después
+# se deshacen. El registro de CambioHorario y las estadísticas diarias, en
+# cambio, se escriben dentro de la misma transacción que el turno.
+
+def _meses_afectados(instance):
+    fechas = {como_fecha(instance.fecha)}
+    original = getattr(instance, '_original', None)
+    if original and original['fecha']:
+        fechas.add(original['fecha'])
+    return {(fecha.year, fecha.month): fecha for fecha in fechas}.values()
+
+
+def _cambios_de_ocupacion(instance, eliminado=False):
+    """Lista de (tipo, fecha, hora) de los horarios que se ocupan o liberan."""
+    original = getattr(instance, '_original', None)
+    anterior = None
+    if original and original['estado'] and original['estado'] != 'cancelado':
+        anterior = (original['fecha'], original['hora'])
+    elif eliminado and not original and instance.estado != 'cancelado':
+        anterior = (como_fecha(instance.fecha), como_hora(instance.hora))
+    
+    actual = None
+    if not eliminado and instance.estado != 'cancelado':
+        actual = (como_fecha(instance.fecha), como_hora(instance.hora))
+    
+    if actual == anterior:
+        return []
+    cambios = []
+    if anterior:
+        cambios.append(('liberado', *anterior))
+    if actual:
+        cambios.append(('ocupado', *actual))
+    return cambios
+
+
+def _actualizar_estadisticas(instance):
+    fechas = {como_fecha(instance.fecha)}
+    original = getattr(instance, '_original', None)
+    if original and original['fecha']:
+        fechas.add(original['fecha'])
+    estadisticas.actualizar_dias(estadisticas.dias_afectados(instance.paciente_id, fechas))
+
+
+def _registrar_cambios(cambios):
+    """Guarda los cambios y devuelve los eventos para difundir por SSE."""
+    if not cambios:
+        return []
+    registros = CambioHorario.objects.bulk_create([
+        CambioHorario(tipo=tipo, fecha=fecha, hora=hora) for tipo, fecha, hora in cambios
+    ])
+    return [
+        {
+            'seq': registro.id,
+            'tipo': registro.tipo,
+            'fecha': registro.fecha.isoformat() if registro.fecha else None,
+            'hora': registro.hora.strftime('%H:%M') if registro.hora else None,
+        }
+        for registro in registros
+    ]
+
+
+def _publicar(eventos_sse):
+    for evento in eventos_sse:
+        eventos.publicar(evento)
+
+
+def _recordar_original(instance):
+    instance._original = {
+        'fecha': como_fecha(instance.fecha),
+        'hora': como_hora(instance.hora),
+        'estado': instance.estado,
+    }
+
+
+@receiver(post_save, sender=Turno)
+def turno_guardado(sender, instance, **kwargs):
+    datos = (instance.id, instance.fecha, instance.hora, instance.estado)
+    paciente_id = instance.paciente_id
+    meses = _meses_afectados(instance)
+    eventos_sse = _registrar_cambios(_cambios_de_ocupacion(instance))
+    _actualizar_estadisticas(instance)
+    _recordar_original(instance)
+    
+    def actualizar():
+        indice_horarios.turno_guardado(*datos)
+        indice_horarios.cambios_aplicados([evento['seq'] for evento in eventos_sse])
+        marcar_cambio_agenda()
+        invalidar_paciente(paciente_id)
+        _publicar(eventos_sse)
+        for fecha in meses:
+            invalidar_mes(fecha)
+    
+    transaction.on_commit(actualizar)
+
+
+@receiver(post_delete, sender=Turno)
+def turno_eliminado(sender, instance, **kwargs):
+    turno_id = instance.id
+    paciente_id = instance.paciente_id
+    meses = _meses_afectados(instance)
+    eventos_sse = _registrar_cambios(_cambios_de_ocupacion(instance, eliminado=True))
+    _actualizar_estadisticas(instance)
+    
+    def actualizar():
+        indice_horarios.turno_eliminado(turno_id)
+        indice_horarios.cambios_aplicados([evento['seq'] for evento in eventos_sse])
+        marcar_cambio_agenda()
+        invalidar_paciente(paciente_id)
+        _publicar(eventos_sse)
+        for fecha in meses:
+            invalidar_mes(fecha)
+    
+    transaction.on_commit(actualizar)
+
+
+@receiver(turnos_actualizados)
+def turnos_actualizados_en_lote(sender, turnos, estado, **kwargs):
+    # Cambio de estado masivo (turnos/acciones.py): misma lógica que
+    # turno_guardado, pero con un solo registro de cambios y una sola
+    # invalidación por mes para todo el lote
+    cambios = []
+    fechas = {turno.fecha for turno in turnos}
+    for turno in turnos:
+        ocupaba = turno.estado_anterior != 'cancelado'
+        ocupa = estado != 'cancelado'
+        if ocupaba != ocupa:
+            cambios.append(('ocupado' if ocupa else 'liberado', turno.fecha, turno.hora))
+    eventos_sse = _registrar_cambios(cambios)
+    
+    # Cancelar puede cambiar cuál es el primer turno de cada paciente
+    pacientes = {turno.paciente_id for turno in turnos}
+    if cambios:
+        for paciente_id in pacientes:
+            fechas = estadisticas.dias_afectados(paciente_id, fechas)
+    estadisticas.actualizar_dias(fechas)
+    datos = [(turno.id, turno.fecha, turno.hora, estado) for turno in turnos]
+    meses = {(turno.fecha.year, turno.fecha.month): turno.fecha for turno in turnos}.values()
+    
+    def actualizar():
+        for dato in datos:
+            indice_horarios.turno_guardado(*dato)
+        indice_horarios.cambios_aplicados([evento['seq'] for evento in eventos_sse])
+        marcar_cambio_agenda()
+        for paciente_id in pacientes:
+            invalidar_paciente(paciente_id)
+        _publicar(eventos_sse)
+        for fecha in meses:
+            invalidar_mes(fecha)
+    
+    transaction.on_commit(actualizar)
+
+
+@receiver(post_save, sender=DisponibilidadHoraria)
+@receiver(post_delete, sender=DisponibilidadHoraria)
+def disponibilidad_cambiada(sender, **kwargs):
+    eventos_sse = _registrar_cambios([('disponibilidad', None, None)])
+    
+    def actualizar():
+        indice_horarios.disponibilidad_cambiada()
+        indice_horarios.cambios_aplicados([evento['seq'] for evento in eventos_sse])
+        marcar_cambio_agenda()
+        _publicar(eventos_sse)
+    
+    transaction.on_commit(actualizar)
@@ -1,3 +1,817 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import json
+from datetime import date, time, timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.models import Count
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from pacientes.models import Paciente
+from usuarios.models import Usuario
+from .acciones import cambiar_estado_del_dia, cambiar_estado_por_ids
+from .calendario import armar_grilla_mes, turnos_en_rango
+from .cierre import cerrar_turnos_pasados, iniciar_programador_configurado
+from .estadisticas import reconstruir, resumen
+from .eventos import BackendLocal
+from .horarios import horas_de_mascara, indice_horarios
+from .ics import token_para, usuario_del_token
+from .models import Turno, CambioHorario, DisponibilidadHoraria, EstadisticaDiaria
+from .reservas import CONGESTION, ESPERA_BASE, INVALIDO, MAX_INTENTOS, OCUPADO, RESERVADO, reservar_turno
+from .versiones import version_mes
+
+
+class PlanDeConsultasTests(TestCase):
+    """
+    Verifica con EXPLAIN QUERY PLAN que las consultas de las vistas sobre
+    turnos_turno usen un índice en lugar de recorrer la tabla.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.profesional = Usuario.objects.create_user('profesional', password='clave', tipo='profesional')
+        cls.usuario = Usuario.objects.create_user('paciente', password='clave', tipo='paciente')
+        cls.paciente = Paciente.objects.create(usuario=cls.usuario)
+        hoy = timezone.localdate()
+        for dias in (-20, -10, -1, 1, 5, 10):
+            Turno.objects.create(paciente=cls.paciente, fecha=hoy + timedelta(days=dias), hora=time(10))
+
+    def setUp(self):
+        indice_horarios.reiniciar()
+        self.client.force_login(self.usuario)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [fila[-1] for fila in cursor.fetchall()]
+
+    def assertConsultasUsanIndice(self, consultas, tabla='turnos_turno'):
+        consultas = [c['sql'] for c in consultas if f'FROM "{tabla}"' in c['sql'] and c['sql'].startswith('SELECT')]
+        self.assertTrue(consultas, f'No hubo consultas sobre {tabla}')
+        for sql in consultas:
+            plan = self.plan(sql)
+            with self.subTest(sql=sql):
+                self.assertFalse(
+                    [paso for paso in plan if paso == f'SCAN {tabla}'],
+                    f'Recorre la tabla completa: {plan}'
+                )
+                self.assertTrue(
+                    [paso for paso in plan if paso.startswith(f'SEARCH {tabla} USING')],
+                    f'No usa índice: {plan}'
+                )
+                self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_mis_turnos(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/turnos/mis-turnos/')
+        self.assertConsultasUsanIndice(consultas)
+
+    def test_agendar_turno(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/turnos/agendar/')
+        self.assertConsultasUsanIndice(consultas)
+
+    def test_reservar_turno(self):
+        fecha = timezone.localdate() + timedelta(days=3)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.post('/turnos/agendar/', {'fecha': fecha.isoformat(), 'hora': '09:00'})
+        self.assertConsultasUsanIndice(consultas)
+
+    def test_calendario_mes(self):
+        cache.clear()
+        self.client.force_login(self.profesional)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/turnos/calendario/')
+        self.assertConsultasUsanIndice(consultas)
+
+    def test_calendario_dia_semana_y_agenda(self):
+        self.client.force_login(self.profesional)
+        for vista in ('dia', 'semana', 'agenda'):
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.get(f'/turnos/calendario/{vista}/')
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertConsultasUsanIndice(consultas)
+
+
+class ReservasTests(TestCase):
+    
+    def setUp(self):
+        self.paciente = Paciente.objects.create(usuario=Usuario.objects.create_user('paciente'))
+        self.otro = Paciente.objects.create(usuario=Usuario.objects.create_user('otro'))
+        self.fecha = timezone.localdate() + timedelta(days=2)
+    
+    def test_horario_cancelado_se_puede_volver_a_reservar(self):
+        primero = reservar_turno(self.paciente, self.fecha, time(9))
+        self.assertEqual(primero.resultado, RESERVADO)
+        primero.turno.estado = 'cancelado'
+        primero.turno.save()
+        
+        segundo = reservar_turno(self.otro, self.fecha.isoformat(), '09:00')
+        self.assertTrue(segundo.ok)
+        self.assertEqual(Turno.objects.filter(fecha=self.fecha, hora=time(9)).count(), 2)
+    
+    def test_segunda_reserva_del_mismo_horario_esta_ocupada(self):
+        reservar_turno(self.paciente, self.fecha, time(9))
+        self.assertEqual(reservar_turno(self.otro, self.fecha, time(9)).resultado, OCUPADO)
+        
+        # Si otra reserva gana entre la comprobación y el INSERT, responde
+        # la restricción única
+        with patch('turnos.reservas.Turno.objects.filter') as filtro:
+            filtro.return_value.exclude.return_value.exists.return_value = False
+            resultado = reservar_turno(self.otro, self.fecha, time(9))
+        self.assertEqual(resultado, (OCUPADO, None))
+        self.assertEqual(Turno.objects.filter(fecha=self.fecha, hora=time(9)).count(), 1)
+    
+    def test_fecha_u_hora_invalida_o_pasada(self):
+        ayer = timezone.localdate() - timedelta(days=1)
+        for fecha, hora in [('31/12/2030', '09:00'), (self.fecha, '25:00'), (self.fecha, 'x'), (ayer, time(9))]:
+            with self.subTest(fecha=fecha, hora=hora):
+                self.assertEqual(reservar_turno(self.paciente, fecha, hora).resultado, INVALIDO)
+        self.assertFalse(Turno.objects.exists())
+    
+    def test_base_bloqueada_reintenta_con_espera(self):
+        crear = Turno.objects.create
+        fallos = [OperationalError('database is locked')] * 2
+        
+        def crear_con_bloqueos(**datos):
+            if fallos:
+                raise fallos.pop()
+            return crear(**datos)
+        
+        with patch('turnos.reservas.Turno.objects.create', side_effect=crear_con_bloqueos), \
+                patch('turnos.reservas.time.sleep') as dormir:
+            self.assertTrue(reservar_turno(self.paciente, self.fecha, time(9)).ok)
+        self.assertEqual(dormir.call_count, 2)
+        # La espera máxima se duplica en cada intento
+        self.assertLessEqual(dormir.call_args_list[1].args[0], 2 * ESPERA_BASE)
+        
+        with patch('turnos.reservas.Turno.objects.create', side_effect=OperationalError('database is locked')), \
+                patch('turnos.reservas.time.sleep') as dormir:
+            self.assertEqual(reservar_turno(self.paciente, self.fecha, time(10)).resultado, CONGESTION)
+        self.assertEqual(dormir.call_count, MAX_INTENTOS)
+        
+        with patch('turnos.reservas.Turno.objects.create', side_effect=OperationalError('no such table')):
+            with self.assertRaises(OperationalError):
+                reservar_turno(self.paciente, self.fecha, time(11))
+
+
+class HorariosApiTests(TestCase):
+    
+    def setUp(self):
+        indice_horarios.reiniciar()
+        self.paciente = Paciente.objects.create(usuario=Usuario.objects.create_user('paciente'))
+        self.client.force_login(self.paciente.usuario)
+        self.fecha = timezone.localdate() + timedelta(days=2)
+        DisponibilidadHoraria.objects.create(dia_semana=self.fecha.weekday(), hora_inicio=time(9), hora_fin=time(10))
+        self.url = reverse('turnos:api_horarios')
+        self.rango = {'desde': self.fecha.isoformat(), 'hasta': (self.fecha + timedelta(days=6)).isoformat()}
+    
+    def test_misma_version_responde_304(self):
+        respuesta = self.client.get(self.url, self.rango)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['horarios'], {self.fecha.isoformat(): ['09:00', '09:30']})
+        self.assertIn('Last-Modified', respuesta)
+        
+        repetida = self.client.get(self.url, self.rango, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(repetida.status_code, 304)
+        self.assertEqual(repetida.content, b'')
+        # Otro rango u otro formato no comparten ETag
+        bitmap = self.client.get(self.url, {**self.rango, 'formato': 'bitmap'}, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(bitmap.status_code, 200)
+    
+    def test_reservar_cambia_el_etag(self):
+        etag = self.client.get(self.url, self.rango)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            reservar_turno(self.paciente, self.fecha, time(9))
+        
+        respuesta = self.client.get(self.url, self.rango, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(respuesta.json()['horarios'], {self.fecha.isoformat(): ['09:30']})
+        self.assertEqual(respuesta.json()['seq'], CambioHorario.ultima_secuencia())
+    
+    def test_bitmap_coincide_con_las_horas(self):
+        for dia_semana in range(7):
+            DisponibilidadHoraria.objects.create(
+                dia_semana=dia_semana, hora_inicio=time(8 + dia_semana // 2), hora_fin=time(12, 30),
+            )
+        # Rango que cruza un cambio de mes; el último día tiene un turno
+        primero_del_mes = (timezone.localdate().replace(day=1) + timedelta(days=62)).replace(day=1)
+        desde, hasta = primero_del_mes - timedelta(days=3), primero_del_mes + timedelta(days=9)
+        for fecha, hora in [(desde, time(11)), (primero_del_mes, time(11, 30)), (hasta, time(12))]:
+            Turno.objects.create(paciente=self.paciente, fecha=fecha, hora=hora)
+        rango = {'desde': desde.isoformat(), 'hasta': hasta.isoformat()}
+        
+        horarios = self.client.get(self.url, rango).json()['horarios']
+        datos = self.client.get(self.url, {**rango, 'formato': 'bitmap'}).json()
+        crudo = base64.b64decode(datos['mascaras'])
+        self.assertEqual(len(crudo), 13 * datos['bytes_por_dia'])
+        decodificado = {}
+        for dias in range(13):
+            bloque = crudo[dias * datos['bytes_por_dia']:(dias + 1) * datos['bytes_por_dia']]
+            mascara = int.from_bytes(bloque, 'little')
+            if mascara:
+                decodificado[(desde + timedelta(days=dias)).isoformat()] = horas_de_mascara(mascara)
+        
+        self.assertEqual(decodificado, horarios)
+        self.assertEqual(len(horarios), 13)
+        self.assertNotIn('12:00', horarios[hasta.isoformat()])
+        self.assertNotIn('11:30', horarios[primero_del_mes.isoformat()])
+    
+    def test_rango_invalido(self):
+        ayer = timezone.localdate() - timedelta(days=1)
+        for rango in [{'desde': '2030-02-30'}, {'hasta': ayer.isoformat()}, {'hasta': '2999-01-01'}]:
+            with self.subTest(rango=rango):
+                self.assertEqual(self.client.get(self.url, rango).status_code, 400)
+
+
+class CambiosHorariosApiTests(TestCase):
+    
+    def setUp(self):
+        indice_horarios.reiniciar()
+        self.paciente = Paciente.objects.create(usuario=Usuario.objects.create_user('paciente'))
+        self.client.force_login(self.paciente.usuario)
+        self.fecha = timezone.localdate() + timedelta(days=2)
+        DisponibilidadHoraria.objects.create(dia_semana=self.fecha.weekday(), hora_inicio=time(9), hora_fin=time(10))
+        self.url = reverse('turnos:api_cambios_horarios')
+    
+    def reservar(self, fecha, hora):
+        with self.captureOnCommitCallbacks(execute=True):
+            return reservar_turno(self.paciente, fecha, hora).turno
+    
+    def test_devuelve_los_dias_cambiados_desde_la_secuencia(self):
+        self.reservar(self.fecha, time(9))
+        seq = CambioHorario.ultima_secuencia()
+        self.assertEqual(self.client.get(self.url, {'desde': seq}).json(), {'seq': seq, 'dias': {}})
+        
+        otra_fecha = self.fecha + timedelta(days=7)
+        self.reservar(otra_fecha, time(9, 30))
+        respuesta = self.client.get(self.url, {'desde': seq}).json()
+        self.assertEqual(respuesta['seq'], CambioHorario.ultima_secuencia())
+        self.assertEqual(respuesta['dias'], {otra_fecha.isoformat(): ['09:00']})
+    
+    def test_pide_recargar(self):
+        self.reservar(self.fecha, time(9))
+        seq = CambioHorario.ultima_secuencia()
+        ultima = {'seq': seq, 'recargar': True}
+        # Secuencia que todavía no existe
+        self.assertEqual(self.client.get(self.url, {'desde': seq + 5}).json(), ultima)
+        
+        # Demasiados cambios pendientes
+        self.reservar(self.fecha, time(9, 30))
+        with patch('turnos.views.MAX_CAMBIOS_DELTA', 1):
+            self.assertEqual(self.client.get(self.url, {'desde': 0}).json(), {**ultima, 'seq': seq + 1})
+        
+        # Secuencia ya podada del registro
+        CambioHorario.objects.filter(id__lte=seq).delete()
+        self.assertEqual(self.client.get(self.url, {'desde': seq - 1}).json(), {**ultima, 'seq': seq + 1})
+        self.assertFalse(self.client.get(self.url, {'desde': seq}).json().get('recargar'))
+        
+        # Cambio de disponibilidad
+        DisponibilidadHoraria.objects.create(dia_semana=0, hora_inicio=time(8), hora_fin=time(9))
+        self.assertTrue(self.client.get(self.url, {'desde': seq + 1}).json()['recargar'])
+    
+    def test_secuencia_invalida(self):
+        for parametros in [{}, {'desde': ''}, {'desde': 'x'}, {'desde': '1.5'}]:
+            with self.subTest(parametros=parametros):
+                self.assertEqual(self.client.get(self.url, parametros).status_code, 400)
+
+
+class LecturasTests(TestCase):
+    
+    def setUp(self):
+        usuario = Usuario.objects.create_user('paciente', first_name='Ana', last_name='Pérez')
+        self.paciente = Paciente.objects.create(usuario=usuario)
+        self.hoy = timezone.localdate()
+        Turno.objects.create(
+            paciente=self.paciente, fecha=self.hoy - timedelta(days=3), hora=time(9),
+            estado='completado', notas_profesional='Buena adherencia al plan',
+        )
+        Turno.objects.create(paciente=self.paciente, fecha=self.hoy + timedelta(days=3), hora=time(9))
+    
+    def test_calendario_solo_trae_las_columnas_que_muestra(self):
+        with CaptureQueriesContext(connection) as consultas:
+            turnos = turnos_en_rango(self.hoy - timedelta(days=7), self.hoy + timedelta(days=7))
+        
+        self.assertEqual([(t.nombre, t.get_estado_display()) for t in turnos], [('Ana Pérez', 'Completado'), ('Ana Pérez', 'Pendiente')])
+        self.assertEqual(len(consultas), 1)
+        self.assertNotIn('notas_profesional', consultas[0]['sql'])
+    
+    def test_mis_turnos_con_proyecciones(self):
+        self.client.force_login(self.paciente.usuario)
+        respuesta = self.client.get('/turnos/mis-turnos/')
+        
+        self.assertContains(respuesta, 'Buena adherencia al plan')
+        self.assertEqual(len(respuesta.context['turnos_futuros']), 1)
+
+
+class CalendarioMesTests(TestCase):
+    
+    def setUp(self):
+        cache.clear()
+        self.profesional = Usuario.objects.create_user('profesional', tipo='profesional')
+        self.paciente = Paciente.objects.create(
+            usuario=Usuario.objects.create_user('paciente', first_name='Ana', last_name='Pérez'),
+        )
+        # Un mes futuro que no contiene hoy; el 1 de marzo de 2030 es viernes
+        self.fecha = date(2030, 3, 15)
+        Turno.objects.create(paciente=self.paciente, fecha=self.fecha, hora=time(9))
+        self.client.force_login(self.profesional)
+    
+    def grilla(self):
+        return self.client.get('/turnos/calendario/', {'mes': 3, 'anio': 2030}).context['grilla_html']
+    
+    def test_grilla_con_los_turnos_de_cada_dia(self):
+        semanas, dias_con_turnos = armar_grilla_mes(2030, 3, turnos_en_rango(date(2030, 3, 1), date(2030, 3, 31)), self.fecha)
+        
+        self.assertEqual(dias_con_turnos, 1)
+        self.assertEqual(semanas[0][:4], [None] * 4)
+        self.assertEqual(semanas[0][4]['dia'], 1)
+        self.assertEqual(sum(celda is not None for semana in semanas for celda in semana), 31)
+        celda = semanas[2][4]
+        self.assertEqual((celda['dia'], celda['es_hoy']), (15, True))
+        self.assertEqual([turno['etiqueta'] for turno in celda['turnos']], ['09:00 - Ana Pérez'])
+        
+        html = self.grilla()
+        self.assertEqual(html.count('class="turno-item turno-pendiente"'), 1)
+        self.assertIn('09:00 - Ana Pérez', html)
+    
+    def test_reservar_y_cancelar_cambian_la_grilla_cacheada(self):
+        version = version_mes(2030, 3)
+        self.grilla()
+        # La segunda vez la grilla sale del cache, sin leer los turnos
+        with CaptureQueriesContext(connection) as consultas:
+            self.grilla()
+        self.assertFalse([c for c in consultas if 'FROM "turnos_turno"' in c['sql']])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            turno = Turno.objects.create(paciente=self.paciente, fecha=date(2030, 3, 20), hora=time(10, 30))
+        self.assertEqual(version_mes(2030, 3), version + 1)
+        html = self.grilla()
+        self.assertIn('10:30 - Ana Pérez', html)
+        self.assertEqual(html.count('turno-item'), 2)
+        
+        turno.estado = 'cancelado'
+        with self.captureOnCommitCallbacks(execute=True):
+            turno.save()
+        self.assertEqual(version_mes(2030, 3), version + 2)
+        self.assertEqual(self.grilla().count('class="turno-item turno-cancelado"'), 1)
+        
+        # Un turno de otro mes no invalida este
+        with self.captureOnCommitCallbacks(execute=True):
+            Turno.objects.create(paciente=self.paciente, fecha=date(2030, 4, 1), hora=time(9))
+        self.assertEqual(version_mes(2030, 3), version + 2)
+
+
+class IndiceHorariosTests(TestCase):
+    
+    def setUp(self):
+        indice_horarios.reiniciar()
+        self.paciente = Paciente.objects.create(usuario=Usuario.objects.create_user('paciente'))
+        self.fecha = timezone.localdate() + timedelta(days=2)
+        self.disponibilidad = DisponibilidadHoraria.objects.create(
+            dia_semana=self.fecha.weekday(), hora_inicio=time(9), hora_fin=time(11),
+        )
+    
+    def libres(self):
+        return indice_horarios.horarios_libres(self.fecha, self.fecha).get(self.fecha.isoformat(), [])
+    
+    def reservar(self, hora):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Turno.objects.create(paciente=self.paciente, fecha=self.fecha, hora=hora)
+    
+    def test_reservar_cancelar_y_eliminar(self):
+        self.assertEqual(self.libres(), ['09:00', '09:30', '10:00', '10:30'])
+        turno = self.reservar(time(9, 30))
+        otro = self.reservar(time(10))
+        # Con las señales al día solo se compara la secuencia, sin rearmar
+        with self.assertNumQueries(1):
+            self.assertEqual(self.libres(), ['09:00', '10:30'])
+        
+        turno.estado = 'cancelado'
+        with self.captureOnCommitCallbacks(execute=True):
+            turno.save()
+        self.assertEqual(self.libres(), ['09:00', '09:30', '10:30'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            otro.delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.libres(), ['09:00', '09:30', '10:00', '10:30'])
+    
+    def test_activar_y_desactivar_la_disponibilidad(self):
+        self.reservar(time(9))
+        self.disponibilidad.activo = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.disponibilidad.save()
+        self.assertEqual(self.libres(), [])
+        
+        self.disponibilidad.activo = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.disponibilidad.save()
+        self.assertEqual(self.libres(), ['09:30', '10:00', '10:30'])
+    
+    def test_cambios_de_otro_proceso_rearman_el_indice(self):
+        self.assertEqual(len(self.libres()), 4)
+        # Lo que guardaría otro worker: el turno y su CambioHorario, sin que
+        # las señales lleguen a este proceso
+        Turno.objects.bulk_create([Turno(paciente=self.paciente, fecha=self.fecha, hora=time(10))])
+        CambioHorario.objects.create(tipo='ocupado', fecha=self.fecha, hora=time(10))
+        self.assertEqual(self.libres(), ['09:00', '09:30', '10:30'])
+        
+        # Un cambio propio después del ajeno no tapa el hueco
+        indice_horarios.reiniciar()
+        self.libres()
+        CambioHorario.objects.create(tipo='ocupado', fecha=self.fecha, hora=time(9))
+        Turno.objects.bulk_create([Turno(paciente=self.paciente, fecha=self.fecha, hora=time(9))])
+        self.reservar(time(10, 30))
+        self.assertEqual(self.libres(), ['09:30'])
+
+
+class AccionesTests(TestCase):
+    
+    def setUp(self):
+        indice_horarios.reiniciar()
+        self.profesional = Usuario.objects.create_user('profesional', tipo='profesional')
+        self.paciente = Paciente.objects.create(usuario=Usuario.objects.create_user('paciente'))
+        self.fecha = timezone.localdate() + timedelta(days=2)
+        DisponibilidadHoraria.objects.create(dia_semana=self.fecha.weekday(), hora_inicio=time(8), hora_fin=time(18))
+        estados = ['pendiente', 'pendiente', 'confirmado', 'cancelado']
+        self.turnos = [
+            Turno.objects.create(paciente=self.paciente, fecha=self.fecha, hora=time(9 + i), estado=estado)
+            for i, estado in enumerate(estados)
+        ]
+    
+    def estados(self):
+        return list(Turno.objects.order_by('hora').values_list('estado', flat=True))
+    
+    def test_confirma_los_pendientes_del_dia_con_un_solo_update(self):
+        with CaptureQueriesContext(connection) as consultas:
+            cambiados = cambiar_estado_del_dia(self.fecha, 'confirmar')
+        
+        self.assertEqual(len(cambiados), 2)
+        self.assertEqual(self.estados(), ['confirmado', 'confirmado', 'confirmado', 'cancelado'])
+        updates = [c['sql'] for c in consultas if c['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('notas_profesional', updates[0])
+    
+    def test_cancelar_libera_horarios_e_invalida_el_mes_una_vez(self):
+        version = version_mes(self.fecha.year, self.fecha.month)
+        ids = [turno.id for turno in self.turnos]
+        self.assertFalse(indice_horarios.esta_libre(self.fecha, time(9)))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            cambiados = cambiar_estado_por_ids(ids, 'cancelar')
+        
+        self.assertEqual(len(cambiados), 3)
+        self.assertEqual(self.estados(), ['cancelado'] * 4)
+        self.assertTrue(indice_horarios.esta_libre(self.fecha, time(9)))
+        self.assertEqual(version_mes(self.fecha.year, self.fecha.month), version + 1)
+        self.assertEqual(CambioHorario.objects.filter(tipo='liberado').count(), 3)
+    
+    def test_vista_solo_para_profesionales(self):
+        datos = {'accion': 'completar', 'turnos': [self.turnos[0].id, self.turnos[3].id]}
+        self.client.force_login(self.paciente.usuario)
+        self.client.post('/turnos/calendario/acciones/', datos)
+        self.assertEqual(self.estados()[0], 'pendiente')
+        
+        self.client.force_login(self.profesional)
+        respuesta = self.client.post('/turnos/calendario/acciones/', {**datos, 'siguiente': 'https://otro.sitio/'})
+        self.assertRedirects(respuesta, '/turnos/calendario/', fetch_redirect_response=False)
+        self.assertEqual(self.estados(), ['completado', 'pendiente', 'confirmado', 'cancelado'])
+
+
+class CierreTests(TestCase):
+    
+    def setUp(self):
+        self.paciente = Paciente.objects.create(usuario=Usuario.objects.create_user('paciente'))
+        self.hoy = timezone.localdate()
+        estados = ['pendiente', 'confirmado', 'cancelado', 'completado']
+        # Dos años de atrasos, más turnos de hoy y futuros que no se tocan
+        Turno.objects.bulk_create([
+            Turno(
+                paciente=self.paciente, fecha=self.hoy - timedelta(days=dias), hora=time(9 + i % 4),
+                estado=estados[i % 4],
+            )
+            for i, dias in enumerate(range(-5, 730, 7))
+        ])
+    
+    def conteo(self, **filtros):
+        return dict(
+            Turno.objects.filter(**filtros).values_list('estado').annotate(n=Count('id')).order_by()
+        )
+    
+    def test_cierra_el_atraso_en_lotes(self):
+        antes = self.conteo(fecha__lt=self.hoy)
+        futuros = self.conteo(fecha__gte=self.hoy)
+        
+        resultado = cerrar_turnos_pasados(tamanio_lote=10)
+        
+        self.assertEqual(resultado.por_estado, {'completado': antes['confirmado'], 'ausente': antes['pendiente']})
+        self.assertGreater(resultado.lotes, 5)
+        self.assertEqual(self.conteo(fecha__lt=self.hoy), {
+            'completado': antes['completado'] + antes['confirmado'],
+            'ausente': antes['pendiente'],
+            'cancelado': antes['cancelado'],
+        })
+        self.assertEqual(self.conteo(fecha__gte=self.hoy), futuros)
+        # Una segunda pasada no encuentra nada
+        self.assertEqual(cerrar_turnos_pasados().total, 0)
+    
+    def test_cada_lote_sigue_el_indice(self):
+        with CaptureQueriesContext(connection) as consultas:
+            cerrar_turnos_pasados(tamanio_lote=10)
+        
+        lotes = [c['sql'] for c in consultas if c['sql'].startswith('SELECT') and 'LIMIT 10' in c['sql']]
+        self.assertGreater(len(lotes), 5)
+        with connection.cursor() as cursor:
+            for sql in lotes:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [fila[-1] for fila in cursor.fetchall()]
+                with self.subTest(sql=sql):
+                    self.assertTrue([paso for paso in plan if 'USING INDEX turno_fecha_idx' in paso], plan)
+                    self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+    
+    def test_comando(self):
+        salida = io.StringIO()
+        call_command('cerrar_turnos', '--lote', '50', stdout=salida)
+        self.assertIn('turnos cerrados', salida.getvalue())
+        self.assertFalse(Turno.objects.filter(fecha__lt=self.hoy, estado__in=['pendiente', 'confirmado']).exists())
+    
+    def test_programador_solo_si_esta_configurado(self):
+        with patch('turnos.cierre.iniciar_programador') as iniciar:
+            with override_settings(TURNOS_CIERRE_INTERVALO=None):
+                iniciar_programador_configurado()
+            iniciar.assert_not_called()
+            with override_settings(TURNOS_CIERRE_INTERVALO=60):
+                iniciar_programador_configurado()
+            iniciar.assert_called_once_with(60)
+
+
+class EstadisticasTests(TestCase):
+    
+    def setUp(self):
+        cache.clear()
+        self.paciente = Paciente.objects.create(usuario=Usuario.objects.create_user('paciente'))
+        self.otro = Paciente.objects.create(usuario=Usuario.objects.create_user('otro'))
+        self.dia = timezone.localdate() + timedelta(days=10)
+    
+    def fila(self, fecha):
+        return EstadisticaDiaria.objects.filter(fecha=fecha).values(
+            'pendientes', 'confirmados', 'cancelados', 'pacientes_nuevos', 'pacientes_recurrentes',
+        ).first()
+    
+    def filas(self):
+        return list(EstadisticaDiaria.objects.values_list(
+            'fecha', 'pendientes', 'confirmados', 'completados', 'cancelados', 'ausentes',
+            'pacientes_nuevos', 'pacientes_recurrentes', 'cancelaciones_tardias',
+        ))
+    
+    def test_guardar_cancelar_mover_y_borrar(self):
+        turno = Turno.objects.create(paciente=self.paciente, fecha=self.dia, hora=time(9))
+        Turno.objects.create(paciente=self.otro, fecha=self.dia, hora=time(10), estado='confirmado')
+        self.assertEqual(self.fila(self.dia), {
+            'pendientes': 1, 'confirmados': 1, 'cancelados': 0,
+            'pacientes_nuevos': 2, 'pacientes_recurrentes': 0,
+        })
+        
+        turno.estado = 'cancelado'
+        turno.save()
+        self.assertEqual(self.fila(self.dia)['pendientes'], 0)
+        self.assertEqual(self.fila(self.dia)['cancelados'], 1)
+        
+        turno.estado = 'pendiente'
+        turno.fecha = self.dia + timedelta(days=1)
+        turno.save()
+        self.assertEqual(self.fila(self.dia)['cancelados'], 0)
+        self.assertEqual(self.fila(turno.fecha)['pendientes'], 1)
+        
+        turno.delete()
+        self.assertIsNone(self.fila(self.dia + timedelta(days=1)))
+    
+    def test_nuevos_y_recurrentes(self):
+        despues = Turno.objects.create(paciente=self.paciente, fecha=self.dia, hora=time(9))
+        self.assertEqual(self.fila(self.dia)['pacientes_nuevos'], 1)
+        
+        # Un turno anterior pasa a ser el primero del paciente
+        primero = Turno.objects.create(paciente=self.paciente, fecha=self.dia - timedelta(days=3), hora=time(9))
+        self.assertEqual(self.fila(primero.fecha)['pacientes_nuevos'], 1)
+        self.assertEqual(self.fila(self.dia)['pacientes_recurrentes'], 1)
+        
+        # Si se cancela, el siguiente vuelve a ser el primero
+        cambiar_estado_por_ids([primero.id], 'cancelar')
+        self.assertEqual(self.fila(self.dia)['pacientes_nuevos'], 1)
+        self.assertEqual(self.fila(despues.fecha)['pacientes_recurrentes'], 0)
+    
+    def test_acciones_y_cierre_actualizan_los_dias(self):
+        hoy = timezone.localdate()
+        Turno.objects.create(paciente=self.paciente, fecha=hoy - timedelta(days=2), hora=time(9))
+        Turno.objects.create(paciente=self.otro, fecha=hoy - timedelta(days=2), hora=time(10), estado='confirmado')
+        Turno.objects.create(paciente=self.paciente, fecha=self.dia, hora=time(9))
+        
+        cambiar_estado_del_dia(self.dia, 'confirmar')
+        self.assertEqual(self.fila(self.dia)['confirmados'], 1)
+        
+        cerrar_turnos_pasados()
+        totales = resumen(hoy - timedelta(days=2), hoy)['totales']
+        self.assertEqual((totales['ausentes'], totales['completados'], totales['turnos']), (1, 1, 2))
+    
+    def test_reconstruir_coincide_con_lo_incremental(self):
+        for i in range(12):
+            turno = Turno.objects.create(
+                paciente=self.paciente if i % 3 else self.otro,
+                fecha=self.dia + timedelta(days=i % 5 * 20), hora=time(8 + i),
+            )
+            if i % 4 == 0:
+                turno.estado = 'cancelado'
+                turno.save()
+        incremental = self.filas()
+        
+        EstadisticaDiaria.objects.all().delete()
+        self.assertEqual(reconstruir(), len(incremental))
+        self.assertEqual(self.filas(), incremental)
+        # Las cancelaciones hechas con diez días o más de aviso no son tardías
+        self.assertEqual(sum(fila[-1] for fila in incremental), 0)
+    
+    def test_vista_solo_para_profesionales(self):
+        Turno.objects.create(paciente=self.paciente, fecha=self.dia, hora=time(9))
+        profesional = Usuario.objects.create_user('profesional', tipo='profesional')
+        self.client.force_login(profesional)
+        respuesta = self.client.get('/turnos/estadisticas/', {'desde': self.dia.isoformat(), 'hasta': self.dia.isoformat()})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['estadisticas']['totales']['turnos'], 1)
+        
+        self.client.force_login(self.paciente.usuario)
+        self.assertEqual(self.client.get('/turnos/estadisticas/').status_code, 302)
+
+
+class IcsTests(TestCase):
+    
+    def setUp(self):
+        cache.clear()
+        caches['sesiones'].clear()
+        self.profesional = Usuario.objects.create_user('profesional', tipo='profesional')
+        self.paciente = Paciente.objects.create(usuario=Usuario.objects.create_user(
+            'paciente', first_name='Ana', last_name='Pérez'
+        ))
+        self.otro = Paciente.objects.create(usuario=Usuario.objects.create_user('otro'))
+        self.dia = timezone.localdate() + timedelta(days=3)
+        self.turno = Turno.objects.create(
+            paciente=self.paciente, fecha=self.dia, hora=time(9), motivo='Control, semana 2',
+        )
+        Turno.objects.create(paciente=self.otro, fecha=self.dia, hora=time(10))
+        Turno.objects.create(paciente=self.otro, fecha=self.dia, hora=time(11), estado='cancelado')
+    
+    def url(self, usuario):
+        return reverse('turnos:ics', args=[token_para(usuario)])
+    
+    def leer(self, respuesta):
+        return b''.join(respuesta.streaming_content).decode()
+    
+    def test_feed_del_profesional_y_del_paciente(self):
+        respuesta = self.client.get(self.url(self.profesional))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'text/calendar; charset=utf-8')
+        contenido = self.leer(respuesta)
+        self.assertTrue(contenido.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertEqual(contenido.count('BEGIN:VEVENT'), 2)
+        self.assertIn('SUMMARY:Turno: Ana Pérez\r\n', contenido)
+        self.assertIn('DESCRIPTION:Control\\, semana 2\r\n', contenido)
+        self.assertTrue(all(len(linea.encode()) <= 75 for linea in contenido.split('\r\n')))
+        
+        contenido = self.leer(self.client.get(self.url(self.paciente.usuario)))
+        self.assertEqual(contenido.count('BEGIN:VEVENT'), 1)
+        self.assertIn(f'UID:turno-{self.turno.id}@', contenido)
+    
+    def test_estado_de_cada_turno(self):
+        ausente = Turno.objects.create(
+            paciente=self.paciente, fecha=timezone.localdate() - timedelta(days=2), hora=time(9), estado='ausente',
+        )
+        completado = Turno.objects.create(
+            paciente=self.paciente, fecha=timezone.localdate() - timedelta(days=1), hora=time(9), estado='completado',
+        )
+        eventos = self.leer(self.client.get(self.url(self.paciente.usuario))).split('BEGIN:VEVENT')[1:]
+        estados = {
+            int(evento.split('UID:turno-')[1].split('@')[0]): evento.split('STATUS:')[1].split('\r\n')[0]
+            for evento in eventos
+        }
+        self.assertEqual(estados, {ausente.id: 'CANCELLED', completado.id: 'CONFIRMED', self.turno.id: 'TENTATIVE'})
+    
+    def test_lee_los_turnos_de_a_bloques(self):
+        for hora in range(12, 17):
+            Turno.objects.create(paciente=self.otro, fecha=self.dia, hora=time(hora))
+        with patch('turnos.ics.TAMANIO_BLOQUE', 2):
+            contenido = self.leer(self.client.get(self.url(self.profesional)))
+        horas = [linea[-7:-3] for linea in contenido.split('\r\n') if linea.startswith('DTSTART')]
+        self.assertEqual(len(horas), 7)
+        self.assertEqual(horas, sorted(horas))
+    
+    def test_token_invalido_o_revocado(self):
+        url = self.url(self.paciente.usuario)
+        self.assertEqual(self.client.get(url.replace('/turnos.ics', 'x/turnos.ics')).status_code, 404)
+        for token in ['²:x', '1' * 5000 + ':x', 'x:y', '']:
+            self.assertIsNone(usuario_del_token(token))
+        self.assertEqual(self.client.get('/turnos/ics/%C2%B2:x/turnos.ics').status_code, 404)
+        
+        self.paciente.usuario.set_password('otra-clave')
+        self.paciente.usuario.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(self.url(self.paciente.usuario)).status_code, 200)
+    
+    def test_token_falso_no_deja_claves_en_el_cache_de_sesiones(self):
+        caches['sesiones'].clear()
+        inexistente = Usuario.objects.order_by('-pk').first().pk + 1000
+        inactivo = Usuario.objects.create_user('inactivo', is_active=False)
+        for usuario_id in (inexistente, inactivo.pk):
+            respuesta = self.client.get(reverse('turnos:ics', args=[f'{usuario_id}:x']))
+            self.assertEqual(respuesta.status_code, 404)
+            self.assertIsNone(caches['sesiones'].get(f'usuarios:version:{usuario_id}'))
+        self.assertEqual(len(caches['sesiones']._cache), 0)
+    
+    def test_etag_y_cache_hasta_que_cambia_un_turno(self):
+        url = self.url(self.paciente.usuario)
+        respuesta = self.client.get(url)
+        etag = respuesta['ETag']
+        self.leer(respuesta)
+        
+        # Sin cambios: 304 sin consultar la base, y el feed queda en el cache
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertIn('BEGIN:VEVENT', self.leer(self.client.get(url)))
+        
+        # Un turno de otro paciente no cambia este feed
+        with self.captureOnCommitCallbacks(execute=True):
+            Turno.objects.create(paciente=self.otro, fecha=self.dia, hora=time(12))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            cambiar_estado_por_ids([self.turno.id], 'confirmar')
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertIn('STATUS:CONFIRMED', self.leer(respuesta))
+
+
+class BackendLocalTests(SimpleTestCase):
+    
+    async def test_publica_a_todos_los_suscriptores(self):
+        backend = BackendLocal()
+        async with backend.suscribir() as primera, backend.suscribir() as segunda:
+            self.assertEqual(backend.cantidad_suscriptores, 2)
+            backend.publicar({'tipo': 'ocupado', 'seq': 1})
+            for cola in (primera, segunda):
+                self.assertEqual(await asyncio.wait_for(cola.get(), 1), {'tipo': 'ocupado', 'seq': 1})
+        self.assertEqual(backend.cantidad_suscriptores, 0)
+    
+    async def test_cola_llena_pide_recargar(self):
+        backend = BackendLocal()
+        with patch('turnos.eventos.MAX_EVENTOS_PENDIENTES', 3):
+            async with backend.suscribir() as cola:
+                for seq in range(4):
+                    backend.publicar({'tipo': 'ocupado', 'seq': seq})
+                # Las entregas se agendan en el loop: se dejan correr
+                await asyncio.sleep(0)
+                self.assertEqual(cola.qsize(), 1)
+                self.assertEqual(cola.get_nowait(), {'tipo': 'recargar'})
+
+
+class EventosHorariosTests(TestCase):
+    
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('paciente')
+        self.paciente = Paciente.objects.create(usuario=self.usuario)
+        self.url = reverse('turnos:api_eventos_horarios')
+    
+    def test_bajo_wsgi_responde_204(self):
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get(self.url).status_code, 204)
+    
+    async def test_flujo_sse_recibe_el_turno_guardado(self):
+        await self.async_client.aforce_login(self.usuario)
+        respuesta = await self.async_client.get(self.url)
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        flujo = aiter(respuesta.streaming_content)
+        try:
+            # El primer bloque llega con la suscripción ya hecha
+            self.assertEqual(await anext(flujo), b'retry: 5000\n\n')
+            
+            def reservar():
+                with self.captureOnCommitCallbacks(execute=True):
+                    return Turno.objects.create(
+                        paciente=self.paciente, fecha=timezone.localdate() + timedelta(days=2), hora=time(9),
+                    )
+            turno = await sync_to_async(reservar)()
+            
+            bloque = (await asyncio.wait_for(anext(flujo), 5)).decode()
+            self.assertIn('event: ocupado\n', bloque)
+            datos = json.loads(bloque.split('data: ', 1)[1])
+            self.assertEqual((datos['fecha'], datos['hora']), (turno.fecha.isoformat(), '09:00'))
+        finally:
+            await flujo.aclose()
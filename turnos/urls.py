@@ -11,6 +11,17 @@ urlpatterns = [
     
     # URLs para profesional
     path('calendario/', views.calendario_view, name='calendario'),
+    path('calendario/acciones/', views.acciones_turnos_view, name='acciones'),
+    path('calendario/<str:vista>/', views.calendario_rango_view, name='calendario_rango'),
     path('turno/<int:turno_id>/', views.detalle_turno_view, name='detalle_turno'),
     path('disponibilidad/', views.disponibilidad_view, name='disponibilidad'),
+    path('estadisticas/', views.estadisticas_view, name='estadisticas'),
+    
+    # API JSON
+    path('api/horarios/', views.horarios_libres_api, name='api_horarios'),
+    path('api/horarios/cambios/', views.cambios_horarios_api, name='api_cambios_horarios'),
+    path('api/horarios/eventos/', views.eventos_horarios_view, name='api_eventos_horarios'),
+    
+    # Calendario para suscribirse (el token identifica al usuario)
+    path('ics/<str:token>/turnos.ics', views.calendario_ics_view, name='ics'),
 ]
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+Versiones de datos guardadas en el cache de Django.
+
+Cada versión forma parte de las claves de cache de lo que depende de ella;
+incrementarla invalida todo eso de una vez sin tener que buscar las claves.
+Los valores iniciales salen del reloj para que, si el cache descarta una
+versión, la nueva nunca coincida con una anterior.
+"""
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+CLAVE_AGENDA = 'turnos:version:agenda'
+
+
+def _clave_mes(anio, mes):
+    return f'turnos:version:mes:{anio}-{mes:02d}'
+
+
+def _obtener(clave):
+    return cache.get_or_set(clave, time.time_ns(), None)
+
+
+def _incrementar(clave):
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, time.time_ns(), None)
+
+
+def version_mes(anio, mes):
+    """Versión de los turnos de un mes."""
+    return _obtener(_clave_mes(anio, mes))
+
+
+def invalidar_mes(fecha):
+    _incrementar(_clave_mes(fecha.year, fecha.month))
+
+
+def _clave_paciente(paciente_id):
+    return f'turnos:version:paciente:{paciente_id}'
+
+
+def version_paciente(paciente_id):
+    """Versión de los turnos de un paciente."""
+    return _obtener(_clave_paciente(paciente_id))
+
+
+def invalidar_paciente(paciente_id):
+    _incrementar(_clave_paciente(paciente_id))
+
+
+def version_agenda():
+    """
+    (version, modificado) de la agenda completa: cambia con cualquier turno
+    o disponibilidad. Si el cache la perdió se toma como modificada ahora.
+    """
+    estado = cache.get(CLAVE_AGENDA)
+    if estado is None:
+        cache.add(CLAVE_AGENDA, (time.time_ns(), timezone.now()), None)
+        estado = cache.get(CLAVE_AGENDA)
+    return estado
+
+
+def marcar_cambio_agenda():
+    cache.set(CLAVE_AGENDA, (time.time_ns(), timezone.now()), None)
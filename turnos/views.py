@@ -1,15 +1,40 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from .models import Turno, DisponibilidadHoraria
+from .models import Turno, DisponibilidadHoraria, CambioHorario
+from .horarios import (
+    indice_horarios, inicio_franja_actual,
+    DIAS_RESERVA, DIAS_MAXIMOS_API, MINUTOS_POR_TURNO, BYTES_POR_DIA
+)
+from .calendario import (
+    obtener_grilla_mes, turnos_en_rango, rango_de_vista, armar_dias, VISTAS_RANGO
+)
+from .reservas import reservar_turno, OCUPADO, INVALIDO
+from .lecturas import proximos_turnos, ultimos_turnos
+from .acciones import ACCIONES, cambiar_estado_por_ids, cambiar_estado_del_dia
+from .estadisticas import resumen, resumen_mes
+from . import ics
+from . import eventos
 from calendar import monthcalendar, month_name
 from datetime import datetime, timedelta
-from pacientes.models import Paciente
 from django.db.models import Q, Count
 from django.contrib import messages
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
+import asyncio
 import calendar as cal
 import json
 
+def _url_ics(request):
+    """URL para suscribirse al calendario del usuario desde otra aplicación."""
+    return request.build_absolute_uri(reverse('turnos:ics', args=[ics.token_para(request.user)]))
+
+
 # Create your views here.
 @login_required
 def agendar_turno_view(request):
@@ -20,8 +45,8 @@ def agendar_turno_view(request):
         messages.error(request, 'Solo los pacientes pueden agendar turnos.')
         return redirect('core:home')
     
-    # Obtener o crear el perfil de paciente
-    paciente, created = Paciente.objects.get_or_create(usuario=request.user)
+    # Perfil del paciente (lo agrega PacienteMiddleware, sin consultar la base)
+    paciente = request.paciente
     
     # Obtener disponibilidades activas
     #disponibilidades = DisponibilidadHoraria.objects.filter(activo=True)
@@ -36,59 +61,28 @@ def agendar_turno_view(request):
             messages.error(request, "Debes seleccionar una fecha y una hora antes de confirmar el turno.")
             return redirect('turnos:agendar')
         
-        # Validar que no exista un turno en ese horario
-        if Turno.objects.filter(fecha=fecha, hora=hora).exclude(estado='cancelado').exists():
-            messages.error(request, 'Este horario ya está ocupado. Por favor elige otro.')
-            return redirect('turnos:agendar')
+        resultado = reservar_turno(paciente, fecha, hora, motivo)
         
-        # Crear el turno
-        Turno.objects.create(
-            paciente=paciente,
-            fecha=fecha,
-            hora=hora,
-            motivo=motivo,
-            estado='pendiente'
-        )
+        if resultado.ok:
+            messages.success(request, f'Turno agendado exitosamente para el {fecha} a las {hora}.')
+            return redirect('turnos:mis_turnos')
         
-        messages.success(request, f'Turno agendado exitosamente para el {fecha} a las {hora}.')
-        return redirect('turnos:mis_turnos')
-    
-    # Obtener disponibilidades activas
-    disponibilidades = list(DisponibilidadHoraria.objects.filter(activo=True).values(
-        'dia_semana', 'hora_inicio', 'hora_fin'
-    ))
-    
-    # Convertir time objects a strings para JSON
-    for disp in disponibilidades:
-        disp['hora_inicio'] = disp['hora_inicio'].strftime('%H:%M')
-        disp['hora_fin'] = disp['hora_fin'].strftime('%H:%M')
-    
-    # Generar horarios disponibles para los próximos 30 días
-    fecha_actual = datetime.now().date()
-    fecha_limite = fecha_actual + timedelta(days=30)
-    
-    turnos_ocupados = list(Turno.objects.filter(
-        fecha__gte=fecha_actual,
-        fecha__lte=fecha_limite
-    ).exclude(estado='cancelado').values('fecha', 'hora'))
-    
-    
-    #Convertir fechas a strings
-    for turno in turnos_ocupados:
-        turno['fecha'] = turno['fecha'].isoformat()
-        turno['hora'] = turno['hora'].strftime('%H:%M')
+        if resultado.resultado == OCUPADO:
+            messages.error(request, 'Este horario ya está ocupado. Por favor elige otro.')
+        elif resultado.resultado == INVALIDO:
+            messages.error(request, 'La fecha u hora seleccionada no es válida.')
+        else:
+            messages.error(request, 'Hay mucha demanda en este momento. Por favor intenta de nuevo.')
+        return redirect('turnos:agendar')
     
+    # Los horarios libres los pide el JS a la API (cacheable por el navegador)
+    fecha_actual = timezone.localdate()
     
     #turnos futuros del pacientes
-    turnos_futuros = Turno.objects.filter(
-        paciente=paciente,
-        fecha__gte=fecha_actual
-    ).exclude(estado='cancelado').order_by('fecha', 'hora')
+    turnos_futuros = proximos_turnos(paciente, fecha_actual)
     
     
     context = {
-        'disponibilidades': json.dumps(disponibilidades),
-        'turnos_ocupados': json.dumps(turnos_ocupados),
         'turnos_futuros': turnos_futuros,
     }
     
@@ -104,24 +98,18 @@ def mis_turnos_view(request):
         messages.error(request, 'Acceso denegado.')
         return redirect('core:home')
     
-    paciente = request.user.paciente
+    paciente = request.paciente
     
     # Obtener turnos futuros y pasados
     fecha_actual = datetime.now().date()
     
-    turnos_futuros = Turno.objects.filter(
-        paciente=paciente,
-        fecha__gte=fecha_actual
-    ).exclude(estado='cancelado').order_by('fecha', 'hora')
-    
-    turnos_pasados = Turno.objects.filter(
-        paciente=paciente,
-        fecha__lt=fecha_actual
-    ).order_by('-fecha', '-hora')[:10]  # Últimos 10
+    turnos_futuros = proximos_turnos(paciente, fecha_actual)
+    turnos_pasados = ultimos_turnos(paciente, fecha_actual, 10)  # Últimos 10
     
     context = {
         'turnos_futuros': turnos_futuros,
-        'turnos_pasados': turnos_pasados
+        'turnos_pasados': turnos_pasados,
+        'url_ics': _url_ics(request),
     }
     
     return render(request, 'turnos/mis_turnos.html', context)
@@ -166,22 +154,10 @@ def calendario_view(request):
     mes = int(request.GET.get('mes', datetime.now().month))
     anio = int(request.GET.get('anio', datetime.now().year))
     
-    # Obtener todos los turnos del mes
-    turnos = Turno.objects.filter(
-        fecha__year=anio,
-        fecha__month=mes
-    ).select_related('paciente__usuario').order_by('fecha', 'hora')
-    
-    # organizar los turnos por fecha
-    turnos_por_fecha = {}
-    for turno in turnos:
-        fecha_str = turno.fecha.isoformat()
-        if fecha_str not in turnos_por_fecha:
-            turnos_por_fecha[fecha_str] = []
-        turnos_por_fecha[fecha_str].append(turno)
-        
-    #generar el calendario 
-    cal_matrix = monthcalendar(anio, mes)
+    # Grilla del mes (cacheada hasta que cambie algún turno del mes)
+    grilla = obtener_grilla_mes(anio, mes)
+    # Totales del mes desde las estadísticas diarias
+    totales_mes = resumen_mes(anio, mes)['totales']
     
     # mes anterior y el siguiente
     if mes == 1:
@@ -202,17 +178,119 @@ def calendario_view(request):
         'mes': mes,
         'anio': anio,
         'mes_nombre': month_name[mes],
-        'calendario': cal_matrix,
-        'turnos_por_fecha': turnos_por_fecha,
+        'grilla_html': grilla['html'],
+        'dias_con_turnos': grilla['dias_con_turnos'],
+        'totales_mes': totales_mes,
         'mes_anterior': mes_anterior,
         'anio_anterior': anio_anterior,
         'mes_siguiente': mes_siguiente,
         'anio_siguiente': anio_siguiente,
-        'hoy': datetime.now().date(),
+        'url_ics': _url_ics(request),
     }
     return render(request, 'turnos/calendario.html', context)
 
 
+@login_required
+def calendario_rango_view(request, vista):
+    """
+    Vistas de día, semana y agenda del calendario del profesional.
+    Todas consultan solo el rango de fechas que muestran.
+    """
+    if request.user.tipo != 'profesional':
+        messages.error(request, 'Acceso denegado.')
+        return redirect('core:home')
+    
+    if vista not in VISTAS_RANGO:
+        raise Http404('Vista de calendario inexistente.')
+    
+    hoy = timezone.localdate()
+    try:
+        fecha = parse_date(request.GET.get('fecha', '')) or hoy
+    except ValueError:
+        fecha = hoy
+    
+    desde, hasta, salto = rango_de_vista(vista, fecha)
+    dias = armar_dias(
+        desde, hasta, turnos_en_rango(desde, hasta), hoy,
+        solo_con_turnos=(vista == 'agenda')
+    )
+    
+    context = {
+        'vista': vista,
+        'desde': desde,
+        'hasta': hasta,
+        'dias': dias,
+        'cantidad_turnos': sum(len(dia['turnos']) for dia in dias),
+        'fecha_anterior': fecha - salto,
+        'fecha_siguiente': fecha + salto,
+    }
+    return render(request, 'turnos/calendario_rango.html', context)
+
+
+@login_required
+def estadisticas_view(request):
+    """
+    Tablero de estadísticas de turnos para un rango de fechas (?desde=&hasta=),
+    leído de las filas diarias. Por defecto, los últimos 30 días.
+    """
+    if request.user.tipo != 'profesional':
+        messages.error(request, 'Acceso denegado.')
+        return redirect('core:home')
+    
+    hoy = timezone.localdate()
+    try:
+        hasta = parse_date(request.GET.get('hasta', '')) or hoy
+        desde = parse_date(request.GET.get('desde', '')) or hasta - timedelta(days=29)
+    except ValueError:
+        desde, hasta = hoy - timedelta(days=29), hoy
+    if desde > hasta:
+        desde, hasta = hasta, desde
+    
+    return render(request, 'turnos/estadisticas.html', {'estadisticas': resumen(desde, hasta)})
+
+
+@login_required
+@require_POST
+def acciones_turnos_view(request):
+    """
+    Cambia el estado de varios turnos a la vez desde el calendario: los
+    seleccionados (turnos=id&turnos=id...) o todos los de un día (fecha=).
+    """
+    if request.user.tipo != 'profesional':
+        messages.error(request, 'Acceso denegado.')
+        return redirect('core:home')
+    
+    siguiente = request.POST.get('siguiente', '')
+    if not url_has_allowed_host_and_scheme(siguiente, allowed_hosts={request.get_host()}):
+        siguiente = reverse('turnos:calendario')
+    
+    accion = request.POST.get('accion')
+    if accion not in ACCIONES:
+        messages.error(request, 'Acción desconocida.')
+        return redirect(siguiente)
+    
+    try:
+        fecha = parse_date(request.POST.get('fecha', ''))
+        ids = [int(turno_id) for turno_id in request.POST.getlist('turnos')]
+    except ValueError:
+        fecha, ids = None, []
+    
+    if ids:
+        cambiados = cambiar_estado_por_ids(ids, accion)
+    elif fecha:
+        cambiados = cambiar_estado_del_dia(fecha, accion)
+    else:
+        messages.error(request, 'No seleccionaste ningún turno.')
+        return redirect(siguiente)
+    
+    estado = dict(Turno.ESTADO_CHOICES)[ACCIONES[accion][0]].lower()
+    if cambiados:
+        messages.success(request, f'{len(cambiados)} turno(s) pasaron a {estado}.')
+    else:
+        messages.info(request, f'Ningún turno se podía pasar a {estado}.')
+    return redirect(siguiente)
+
+
 @login_required
 def detalle_turno_view(request, turno_id):
     """
@@ -310,4 +388,210 @@ def disponibilidad_view(request):
         'dias_semana': dias_semana
     }
     
-    return render(request, 'turnos/disponibilidad.html', context)
\ No newline at end of file
+    return render(request, 'turnos/disponibilidad.html', context)
+
+
+# API JSON de horarios libres
+
+# Con más cambios pendientes que estos conviene que el cliente recargue todo
+MAX_CAMBIOS_DELTA = 500
+
+def _rango_pedido(request):
+    """
+    Rango (desde, hasta) pedido por GET; por defecto los próximos
+    DIAS_RESERVA días. Devuelve None si el rango no es válido.
+    """
+    hoy = timezone.localdate()
+    try:
+        desde = parse_date(request.GET.get('desde', '')) or hoy
+        hasta = parse_date(request.GET.get('hasta', '')) or desde + timedelta(days=DIAS_RESERVA)
+    except ValueError:
+        return None
+    # El índice solo cubre desde hoy en adelante
+    desde = max(desde, hoy)
+    if hasta < desde or (hasta - desde).days > DIAS_MAXIMOS_API:
+        return None
+    return desde, hasta
+
+
+def _ultimo_cambio_horarios(request):
+    """
+    (seq, momento) del último CambioHorario, leído una vez por pedido.
+    Sale de la base y no de una versión en el cache local, así que todos
+    los workers responden el mismo ETag después de un cambio.
+    """
+    if not hasattr(request, '_ultimo_cambio_horarios'):
+        request._ultimo_cambio_horarios = CambioHorario.objects.order_by('-id').values_list(
+            'id', 'fecha_creacion'
+        ).first() or (0, None)
+    return request._ultimo_cambio_horarios
+
+
+def _etag_horarios(request):
+    rango = _rango_pedido(request)
+    if rango is None:
+        return None
+    seq, _ = _ultimo_cambio_horarios(request)
+    desde, hasta = rango
+    etag = f"{seq}-{desde}-{hasta}-{request.GET.get('formato', 'json')}"
+    if desde == timezone.localdate():
+        # Los horarios de hoy cambian al pasar cada franja aunque no cambien los datos
+        etag += f"-{inicio_franja_actual():%H%M}"
+    return etag
+
+
+def _ultima_modificacion_horarios(request):
+    rango = _rango_pedido(request)
+    if rango is None:
+        return None
+    _, modificado = _ultimo_cambio_horarios(request)
+    if rango[0] == timezone.localdate():
+        return max(filter(None, [modificado, inicio_franja_actual()]))
+    return modificado
+
+
+@require_GET
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_horarios, last_modified_func=_ultima_modificacion_horarios)
+def horarios_libres_api(request):
+    """
+    Horarios libres en un rango de fechas (?desde=AAAA-MM-DD&hasta=AAAA-MM-DD).
+    Con ?formato=bitmap cada día viaja como una máscara de bits de ancho fijo
+    en lugar de una lista de horas, útil para rangos largos.
+    Responde 304 si el cliente ya tiene la versión actual.
+    """
+    rango = _rango_pedido(request)
+    if rango is None:
+        return JsonResponse(
+            {'error': f'Rango inválido (máximo {DIAS_MAXIMOS_API} días desde hoy).'},
+            status=400
+        )
+    
+    desde, hasta = rango
+    # La secuencia se lee antes que los horarios: si algo cambia en el medio,
+    # el cliente lo vuelve a recibir en /cambios/ en lugar de perderlo
+    seq, _ = _ultimo_cambio_horarios(request)
+    if request.GET.get('formato') == 'bitmap':
+        return JsonResponse({
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat(),
+            'seq': seq,
+            'formato': 'bitmap',
+            'minutos_por_turno': MINUTOS_POR_TURNO,
+            'bytes_por_dia': BYTES_POR_DIA,
+            'mascaras': indice_horarios.horarios_libres_binario(desde, hasta),
+        })
+    return JsonResponse({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'seq': seq,
+        'horarios': indice_horarios.horarios_libres(desde, hasta),
+    })
+
+
+@require_GET
+@login_required
+def cambios_horarios_api(request):
+    """
+    Cambios de ocupación posteriores a la secuencia ?desde=N.
+    Devuelve los horarios libres actualizados de cada día afectado, o
+    'recargar' si el cliente tiene que volver a pedir todos los horarios
+    (cambió la disponibilidad, hubo demasiados cambios o la secuencia ya
+    no está en el registro).
+    """
+    try:
+        desde_seq = int(request.GET.get('desde', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Falta el número de secuencia (?desde=N).'}, status=400)
+    
+    cambios = list(
+        CambioHorario.objects.filter(id__gt=desde_seq)
+        .values_list('id', 'tipo', 'fecha')[:MAX_CAMBIOS_DELTA + 1]
+    )
+    primero = CambioHorario.objects.values_list('id', flat=True).first()
+    recargar = (
+        len(cambios) > MAX_CAMBIOS_DELTA
+        or any(tipo == 'disponibilidad' for _, tipo, _ in cambios)
+        or (primero is not None and desde_seq < primero - 1)
+        or (not cambios and desde_seq > CambioHorario.ultima_secuencia())
+    )
+    if recargar:
+        return JsonResponse({'seq': CambioHorario.ultima_secuencia(), 'recargar': True})
+    
+    if not cambios:
+        return JsonResponse({'seq': desde_seq, 'dias': {}})
+    
+    hoy = timezone.localdate()
+    limite = hoy + timedelta(days=DIAS_MAXIMOS_API)
+    dias = {}
+    for fecha in sorted({fecha for _, _, fecha in cambios if hoy <= fecha <= limite}):
+        libres = indice_horarios.horarios_libres(fecha, fecha)
+        dias[fecha.isoformat()] = libres.get(fecha.isoformat(), [])
+    
+    return JsonResponse({'seq': cambios[-1][0], 'dias': dias})
+
+
+
+# Eventos en vivo (server-sent events)
+
+# Cada cuánto se manda un comentario para que proxies y navegadores no
+# corten la conexión inactiva
+SEGUNDOS_LATIDO = 15
+
+
+@login_required
+async def eventos_horarios_view(request):
+    """
+    Flujo SSE con los horarios que se ocupan y liberan.
+    Es una vista asíncrona: cada conexión abierta es solo una corrutina
+    esperando en su cola, no un thread. Necesita correr bajo ASGI
+    (config.asgi); bajo WSGI responde 204 y el navegador no reintenta.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    async def flujo():
+        async with eventos.obtener_backend().suscribir() as cola:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    evento = await asyncio.wait_for(cola.get(), timeout=SEGUNDOS_LATIDO)
+                except asyncio.TimeoutError:
+                    yield ': latido\n\n'
+                    continue
+                lineas = f"event: {evento['tipo']}\ndata: {json.dumps(evento)}\n"
+                if evento.get('seq'):
+                    lineas = f"id: {evento['seq']}\n" + lineas
+                yield lineas + '\n'
+    
+    response = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+
+# Calendario para suscribirse (iCalendar)
+
+def _etag_ics(request, token):
+    usuario = ics.usuario_del_token(token)
+    return ics.etag(usuario) if usuario else None
+
+
+@require_GET
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_etag_ics)
+def calendario_ics_view(request, token):
+    """
+    Turnos del usuario del token en formato iCalendar, sin sesión (la URL
+    es la credencial). Responde 304 si el cliente ya tiene la versión actual.
+    """
+    usuario = ics.usuario_del_token(token)
+    if usuario is None:
+        raise Http404
+    
+    response = StreamingHttpResponse(ics.feed(usuario), content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="turnos.ics"'
+    return response
+
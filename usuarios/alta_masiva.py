@@ -0,0 +1,134 @@
+"""
+Alta masiva de pacientes (usuario + perfil de Paciente).
+
+Lo caro de crear una cuenta es el hash de la contraseña: PBKDF2 con las
+iteraciones por defecto de Django tarda del orden de medio segundo por cuenta.
+Acá los hashes se calculan en un pool de procesos (uno por núcleo) y después
+todos los usuarios y sus pacientes se insertan con bulk_create en una sola
+transacción: o se crean todas las cuentas válidas o ninguna.
+
+Las cuentas sin contraseña se crean con una contraseña inutilizable (el
+paciente la define después con el reseteo de contraseña) y no pasan por el
+hash, así que dar de alta miles de cuentas así toma segundos.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from pacientes import busqueda
+from pacientes.models import Paciente
+from .models import Usuario
+
+TAMANIO_LOTE = 500
+# Con menos contraseñas que esto no vale la pena levantar procesos
+MIN_CONTRASENIAS_POOL = 8
+
+CAMPOS_USUARIO = ('email', 'first_name', 'last_name', 'telefono', 'fecha_nacimiento')
+
+
+def _inicializar_proceso():
+    # Con el método "spawn" (macOS, Windows) el proceso hijo arranca sin Django
+    import django
+    django.setup()
+
+
+def hashear_contrasenias(contrasenias, procesos=None):
+    """Hashes de las contraseñas, en el mismo orden, usando todos los núcleos."""
+    contrasenias = list(contrasenias)
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1 or len(contrasenias) < MIN_CONTRASENIAS_POOL:
+        return [make_password(contrasenia) for contrasenia in contrasenias]
+
+    # Pedazos grandes para no pagar la comunicación entre procesos por cada
+    # contraseña, pero varios por proceso para repartir bien la carga
+    pedazo = max(1, len(contrasenias) // (procesos * 4))
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso) as pool:
+        return list(pool.map(make_password, contrasenias, chunksize=pedazo))
+
+
+class ResultadoAlta:
+    def __init__(self):
+        self.usuarios = []
+        self.omitidos = []
+
+    @property
+    def creados(self):
+        return len(self.usuarios)
+
+
+def _existentes(usernames):
+    existentes = set()
+    usernames = list(usernames)
+    for inicio in range(0, len(usernames), TAMANIO_LOTE):
+        existentes.update(Usuario.objects.filter(
+            username__in=usernames[inicio:inicio + TAMANIO_LOTE]
+        ).values_list('username', flat=True))
+    return existentes
+
+
+def alta_pacientes(datos, procesos=None, tamanio_lote=TAMANIO_LOTE):
+    """
+    Crea una cuenta de paciente por cada dict de `datos` (username,
+    password opcional y los CAMPOS_USUARIO). Las filas repetidas, con un
+    username que ya existe, con un campo inválido (por ejemplo una fecha que
+    no es AAAA-MM-DD) o con una contraseña que no pasa los validadores se
+    omiten y quedan en resultado.omitidos como (username, motivo).
+    """
+    resultado = ResultadoAlta()
+    datos = list(datos)
+    existentes = _existentes(fila.get('username') for fila in datos if fila.get('username'))
+
+    vistos = set()
+    usuarios, contrasenias = [], []
+    for fila in datos:
+        username = (fila.get('username') or '').strip()
+        if not username:
+            resultado.omitidos.append((username, 'falta username'))
+            continue
+        if username in existentes or username in vistos:
+            resultado.omitidos.append((username, 'el usuario ya existe'))
+            continue
+
+        usuario = Usuario(
+            username=username,
+            tipo='paciente',
+            **{campo: fila[campo] for campo in CAMPOS_USUARIO if fila.get(campo)},
+        )
+        contrasenia = fila.get('password') or None
+        try:
+            # Convierte y valida los campos (fecha, email, largos) como el
+            # save() de un formulario; un valor inválido en bulk_create
+            # haría fallar el lote entero
+            usuario.clean_fields(exclude=['password'])
+            if contrasenia:
+                validate_password(contrasenia, usuario)
+        except ValidationError as error:
+            resultado.omitidos.append((username, ' '.join(error.messages)))
+            continue
+        vistos.add(username)
+        usuarios.append(usuario)
+        contrasenias.append(contrasenia)
+
+    # Solo las contraseñas reales pasan por el pool; las vacías son inutilizables
+    con_contrasenia = [i for i, contrasenia in enumerate(contrasenias) if contrasenia]
+    hashes = hashear_contrasenias([contrasenias[i] for i in con_contrasenia], procesos)
+    for usuario in usuarios:
+        usuario.password = make_password(None)
+    for i, hash_ in zip(con_contrasenia, hashes):
+        usuarios[i].password = hash_
+
+    with transaction.atomic():
+        Usuario.objects.bulk_create(usuarios, batch_size=tamanio_lote)
+        pacientes = Paciente.objects.bulk_create(
+            [Paciente(usuario=usuario) for usuario in usuarios], batch_size=tamanio_lote
+        )
+        # bulk_create no dispara las señales que indexan la búsqueda
+        for paciente in pacientes:
+            busqueda.indexar_paciente(paciente)
+
+    resultado.usuarios = usuarios
+    return resultado
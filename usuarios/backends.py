@@ -0,0 +1,16 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .sesion import usuario_con_perfil
+
+
+class ModelBackendCacheado(ModelBackend):
+    """
+    ModelBackend que lee el usuario de cada pedido desde el cache
+    (ver usuarios/sesion.py) en lugar de consultarlo en la base.
+    """
+
+    def get_user(self, user_id):
+        usuario = usuario_con_perfil(user_id)
+        if usuario is None or not self.user_can_authenticate(usuario):
+            return None
+        return usuario
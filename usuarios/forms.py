@@ -1,4 +1,5 @@
 from django import forms
+from django.db import transaction
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from .models import Usuario
 from pacientes.models import Paciente
@@ -77,9 +78,11 @@ class RegistroForm(UserCreationForm):
         user.email = self.cleaned_data['email']
         
         if commit:
-            user.save()
-            # Crear automáticamente el perfil de paciente
-            Paciente.objects.create(usuario=user)
+            # Usuario y perfil se crean juntos o no se crea ninguno
+            with transaction.atomic():
+                user.save()
+                # Crear automáticamente el perfil de paciente
+                Paciente.objects.create(usuario=user)
         
         return user
 
@@ -0,0 +1,68 @@
+"""
+Límite de intentos de inicio de sesión.
+
+Cada intento cuesta un hash PBKDF2 completo (medio segundo de CPU), así que
+unos pocos clientes probando contraseñas alcanzan para ocupar todos los
+workers. Antes de validar el formulario se consume una ficha de dos "baldes"
+(token bucket): uno por nombre de usuario y otro por IP. Cada balde arranca
+lleno, se recarga a ritmo constante y, si está vacío, el intento se rechaza
+sin calcular ningún hash.
+
+Los baldes se guardan en el alias de cache 'sesiones', aparte del cache por
+defecto para que otras entradas no los desalojen. La lectura y la escritura
+no son atómicas: dos intentos simultáneos pueden gastar la misma ficha, lo
+que solo deja pasar algún intento de más.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+cache = ConnectionProxy(caches, 'sesiones')
+
+# (capacidad, fichas que se recuperan por minuto) de cada balde
+LIMITES_POR_DEFECTO = {
+    'usuario': (5, 5),
+    'ip': (30, 30),
+}
+
+
+def _limites():
+    return {**LIMITES_POR_DEFECTO, **getattr(settings, 'USUARIOS_LIMITES_LOGIN', {})}
+
+
+def _clave(tipo, valor):
+    # Hash para que cualquier nombre de usuario sea una clave válida de cache
+    resumen = hashlib.sha256(valor.encode()).hexdigest()[:32]
+    return f'usuarios:login:{tipo}:{resumen}'
+
+
+def consumir(clave, capacidad, por_minuto, ahora=None):
+    """
+    Saca una ficha del balde. Devuelve 0 si había, o los segundos que faltan
+    para que haya una.
+    """
+    ahora = time.time() if ahora is None else ahora
+    por_segundo = por_minuto / 60
+    fichas, ultimo = cache.get(clave, (capacidad, ahora))
+    fichas = min(capacidad, fichas + (ahora - ultimo) * por_segundo)
+    if fichas < 1:
+        return (1 - fichas) / por_segundo
+    # Vence cuando se habría vuelto a llenar: no hace falta guardarlo más
+    cache.set(clave, (fichas - 1, ahora), timeout=int(capacidad / por_segundo) + 1)
+    return 0
+
+
+def espera_login(request, username):
+    """
+    Registra un intento de login. Devuelve 0 si se puede intentar o los
+    segundos a esperar si se superó el límite de la IP o del usuario.
+    """
+    limites = _limites()
+    ip = request.META.get('REMOTE_ADDR') or ''
+    espera = consumir(_clave('ip', ip), *limites['ip'])
+    if not espera and username:
+        espera = consumir(_clave('usuario', username.strip().lower()), *limites['usuario'])
+    return espera
@@ -0,0 +1,41 @@
+import csv
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios.alta_masiva import CAMPOS_USUARIO, TAMANIO_LOTE, alta_pacientes
+
+
+class Command(BaseCommand):
+    help = (
+        'Da de alta cuentas de paciente desde un CSV con las columnas username, password '
+        f"(opcional) y {', '.join(CAMPOS_USUARIO)}. Las contraseñas se hashean en paralelo "
+        'y todas las cuentas se crean en una sola transacción.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--procesos', type=int, default=os.cpu_count(),
+                            help='Procesos para hashear contraseñas (por defecto, uno por núcleo)')
+        parser.add_argument('--lote', type=int, default=TAMANIO_LOTE)
+        parser.add_argument('--encoding', default='utf-8-sig')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], newline='', encoding=options['encoding']) as archivo:
+                filas = list(csv.DictReader(archivo))
+        except OSError as error:
+            raise CommandError(f'No se pudo leer el archivo: {error}')
+
+        inicio = time.perf_counter()
+        resultado = alta_pacientes(filas, options['procesos'], options['lote'])
+        segundos = time.perf_counter() - inicio
+
+        for username, motivo in resultado.omitidos:
+            self.stderr.write(self.style.WARNING(f'{username or "(sin username)"}: {motivo}'))
+        por_segundo = resultado.creados / segundos if segundos else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{resultado.creados} cuentas creadas en {segundos:.1f} s ({por_segundo:,.0f}/s) '
+            f'con {options["procesos"]} procesos; {len(resultado.omitidos)} omitidas.'
+        ))
@@ -0,0 +1,65 @@
+from django.contrib.auth import authenticate, login
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+
+from core.benchmarks import base_de_prueba, cronometrar
+from usuarios.forms import LoginForm
+from usuarios.models import Usuario
+from usuarios.views import login_view
+
+CONTRASENIA = 'Zanahoria-2024'
+SIN_LIMITE = {'usuario': (10 ** 9, 10 ** 9), 'ip': (10 ** 9, 10 ** 9)}
+
+
+def _login_antes(request):
+    """El login anterior: el formulario autenticaba y la vista volvía a autenticar."""
+    form = LoginForm(request, data=request.POST)
+    if form.is_valid():
+        user = authenticate(
+            username=form.cleaned_data.get('username'), password=form.cleaned_data.get('password')
+        )
+        login(request, user)
+
+
+class Command(BaseCommand):
+    help = 'Mide logins por segundo con el doble hash anterior, con el actual y los intentos rechazados por el límite.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=10)
+
+    def handle(self, *args, **options):
+        repeticiones = options['repeticiones']
+        fabrica = RequestFactory()
+
+        def pedido(password=CONTRASENIA):
+            request = fabrica.post('/usuarios/login/', {'username': 'ana', 'password': password})
+            SessionMiddleware(lambda r: None).process_request(request)
+            request._messages = FallbackStorage(request)
+            request.user = AnonymousUser()
+            return request
+
+        with base_de_prueba():
+            Usuario.objects.create_user('ana', password=CONTRASENIA)
+            with override_settings(USUARIOS_LIMITES_LOGIN=SIN_LIMITE):
+                antes = cronometrar(lambda: _login_antes(pedido()), repeticiones)
+                despues = cronometrar(lambda: login_view(pedido()), repeticiones)
+
+            # Con el balde vacío el intento se rechaza antes de hashear
+            caches['sesiones'].clear()
+            with override_settings(USUARIOS_LIMITES_LOGIN={'usuario': (1, 1), 'ip': (10 ** 9, 10 ** 9)}):
+                login_view(pedido('mal'))
+                rechazado = cronometrar(lambda: login_view(pedido('mal')), repeticiones * 10)
+            caches['sesiones'].clear()
+
+        for nombre, (mejor, promedio) in [
+            ('login con doble hash (antes)', antes),
+            ('login con un hash', despues),
+            ('intento rechazado por límite', rechazado),
+        ]:
+            self.stdout.write(
+                f'  {nombre:30} promedio {promedio:9.2f} ms  ->  {1000 / promedio:9.1f} por segundo'
+            )
@@ -0,0 +1,29 @@
+from django.utils.functional import SimpleLazyObject
+
+from pacientes.models import Paciente
+
+
+def _paciente(request):
+    usuario = request.user
+    if not usuario.is_authenticated or usuario.tipo != 'paciente':
+        return None
+    try:
+        # Viene cargado junto con el usuario: no consulta la base
+        return usuario.paciente
+    except Paciente.DoesNotExist:
+        # Pacientes creados desde el admin, sin perfil todavía
+        return Paciente.objects.create(usuario=usuario)
+
+
+class PacienteMiddleware:
+    """
+    Agrega request.paciente: el perfil del paciente logueado o None. Se
+    resuelve recién cuando se usa. Va después de AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.paciente = SimpleLazyObject(lambda: _paciente(request))
+        return self.get_response(request)
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:26
+
+import unicodedata
+
+import usuarios.models
+from django.db import migrations, models
+
+
+def _clave(texto):
+    # Copia de usuarios.models.clave_busqueda al momento de esta migración
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+def calcular_claves(apps, schema_editor):
+    Usuario = apps.get_model('usuarios', 'Usuario')
+    usuarios = []
+    for usuario in Usuario.objects.only('id', 'first_name', 'last_name').iterator(chunk_size=2000):
+        usuario.apellido_busqueda = _clave(usuario.last_name)
+        usuario.nombre_busqueda = _clave(usuario.first_name)
+        usuarios.append(usuario)
+    Usuario.objects.bulk_update(usuarios, ['apellido_busqueda', 'nombre_busqueda'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('usuarios', '0002_usuario_indices_nombre'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='usuario',
+            name='usuario_apellido_lower_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='usuario',
+            name='usuario_nombre_lower_idx',
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='apellido_busqueda',
+            field=usuarios.models.ClaveBusquedaField(blank=True, editable=False, max_length=150, origen='last_name'),
+        ),
+        migrations.AddField(
+            model_name='usuario',
+            name='nombre_busqueda',
+            field=usuarios.models.ClaveBusquedaField(blank=True, editable=False, max_length=150, origen='first_name'),
+        ),
+        migrations.RunPython(calcular_claves, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['apellido_busqueda'], name='usuario_apellido_busqueda_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usuario',
+            index=models.Index(fields=['nombre_busqueda'], name='usuario_nombre_busqueda_idx'),
+        ),
+    ]
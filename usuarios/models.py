@@ -1,6 +1,43 @@
+import unicodedata
+
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+
+def clave_busqueda(texto):
+    """
+    Texto normalizado para buscar por prefijo: sin acentos ni diéresis y en
+    minúsculas también fuera de ASCII ('Álvarez' -> 'alvarez', 'Ñuñez' -> 'nunez').
+    """
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+
+class ClaveBusquedaField(models.CharField):
+    """
+    Copia de otro campo pasada por clave_busqueda(). Se recalcula en pre_save,
+    que Django llama en save() y también en bulk_create(); los update() y
+    bulk_update() la dejan desactualizada.
+    """
+
+    def __init__(self, *args, origen=None, **kwargs):
+        self.origen = origen
+        kwargs.setdefault('max_length', 150)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['origen'] = self.origen
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        valor = clave_busqueda(getattr(model_instance, self.origen))
+        setattr(model_instance, self.attname, valor)
+        return valor
+
+
 # Create your models here.
 class Usuario(AbstractUser):
     """
@@ -20,9 +57,33 @@ class Usuario(AbstractUser):
     telefono = models.CharField(max_length=20, blank=True)
     fecha_nacimiento = models.DateField(null=True, blank=True)
     
+    # Apellido y nombre normalizados para la búsqueda por prefijo (SQLite
+    # solo pasa a minúsculas en LOWER() los caracteres ASCII)
+    apellido_busqueda = ClaveBusquedaField(origen='last_name')
+    nombre_busqueda = ClaveBusquedaField(origen='first_name')
+    
     class Meta:
         verbose_name = 'Usuario'
         verbose_name_plural = 'Usuarios'
+        indexes = [
+            # Orden de la lista de pacientes y su paginación por cursor
+            models.Index(fields=['last_name', 'first_name', 'id'], name='usuario_apellido_nombre_idx'),
+            # Búsqueda por prefijo sin distinguir mayúsculas ni acentos
+            models.Index(fields=['apellido_busqueda'], name='usuario_apellido_busqueda_idx'),
+            models.Index(fields=['nombre_busqueda'], name='usuario_nombre_busqueda_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        # Con update_fields solo se escriben los campos pedidos: si cambia el
+        # nombre, también su clave de búsqueda
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            for campo in (self._meta.get_field('apellido_busqueda'), self._meta.get_field('nombre_busqueda')):
+                if campo.origen in update_fields:
+                    update_fields.add(campo.name)
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.get_full_name()} ({self.get_tipo_display()})"
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+Usuario de la sesión, con su perfil de Paciente, guardado en el cache.
+
+Sin esto cada pedido autenticado consulta el Usuario (AuthenticationMiddleware)
+y después la vista vuelve a consultar su Paciente. Acá el par se lee una vez
+con select_related y se guarda en el cache bajo una clave con versión por
+usuario; las señales incrementan la versión cuando se guarda o borra el
+usuario o su perfil, así la próxima lectura vuelve a la base.
+
+Los cambios hechos con update() o bulk_update() no disparan señales: después
+de usarlos sobre usuarios o pacientes hay que llamar a invalidar_usuario().
+
+Se usa el alias de cache 'sesiones' (ver CACHES en config/settings.py). Si
+ese cache es local de cada proceso, la invalidación solo llega al worker que
+guardó el cambio: en los demás un usuario desactivado o con otra contraseña
+sigue cacheado hasta TIEMPO_CACHE.
+"""
+import time
+
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+from .models import Usuario
+
+TIEMPO_CACHE = 60 * 60
+
+cache = ConnectionProxy(caches, 'sesiones')
+
+
+def _clave_version(usuario_id):
+    return f'usuarios:version:{usuario_id}'
+
+
+def invalidar_usuario(usuario_id):
+    try:
+        cache.incr(_clave_version(usuario_id))
+    except ValueError:
+        # Sin versión guardada no hay nada cacheado con ella
+        pass
+
+
+def usuario_con_perfil(usuario_id):
+    """
+    Usuario con su paciente ya cargado (o None si no existe o está inactivo).
+
+    La versión se guarda recién después de comprobar en la base que el
+    usuario existe y está activo: los ids inventados (por ejemplo en un token
+    falso del calendario, ver turnos/ics.py) no dejan claves en el cache, que
+    si no se llenaría y descartaría sesiones y contadores de login.
+    """
+    clave_version = _clave_version(usuario_id)
+    version = cache.get(clave_version)
+    if version is None:
+        if not Usuario.objects.filter(pk=usuario_id, is_active=True).exists():
+            return None
+        cache.add(clave_version, time.time_ns(), None)
+        version = cache.get(clave_version)
+    clave = f'usuarios:usuario:{usuario_id}:{version}'
+    usuario = cache.get(clave)
+    if usuario is None:
+        usuario = Usuario.objects.select_related('paciente').filter(pk=usuario_id).first()
+        if usuario is None:
+            return None
+        cache.set(clave, usuario, TIEMPO_CACHE)
+    return usuario
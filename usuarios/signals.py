@@ -0,0 +1,30 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from pacientes.models import Paciente
+from .models import Usuario
+from .sesion import invalidar_usuario
+
+
+# El usuario cacheado de la sesión se descarta en el momento (para el resto
+# de la transacción) y otra vez al confirmarse, por si un pedido concurrente
+# volvió a guardar los datos viejos mientras tanto
+
+def _invalidar(usuario_id):
+    invalidar_usuario(usuario_id)
+    transaction.on_commit(partial(invalidar_usuario, usuario_id))
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def usuario_modificado(sender, instance, **kwargs):
+    _invalidar(instance.id)
+
+
+@receiver(post_save, sender=Paciente)
+@receiver(post_delete, sender=Paciente)
+def paciente_modificado(sender, instance, **kwargs):
+    _invalidar(instance.usuario_id)
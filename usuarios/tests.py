@@ -1,3 +1,159 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import MD5PasswordHasher, check_password
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from pacientes import busqueda
+from pacientes.models import Paciente
+from .alta_masiva import alta_pacientes, hashear_contrasenias
+from .forms import RegistroForm
+from .models import Usuario
+from .sesion import usuario_con_perfil
+
+# El hash por defecto tarda medio segundo: en los tests alcanza con uno rápido
+HASHERS_RAPIDOS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class AltaMasivaTests(TestCase):
+    def test_hashea_en_paralelo_conservando_el_orden(self):
+        contrasenias = [f'clave-segura-{i}' for i in range(10)]
+        hashes = hashear_contrasenias(contrasenias, procesos=2)
+        self.assertEqual(len(hashes), 10)
+        for contrasenia, hash_ in zip(contrasenias, hashes):
+            self.assertTrue(check_password(contrasenia, hash_))
+
+    def test_crea_usuarios_y_pacientes(self):
+        resultado = alta_pacientes([
+            {'username': 'ana', 'password': 'Zanahoria-2024', 'first_name': 'Ana', 'last_name': 'Gómez'},
+            {'username': 'bruno', 'last_name': 'Pérez'},
+        ], procesos=1)
+
+        self.assertEqual(resultado.creados, 2)
+        ana = Usuario.objects.get(username='ana')
+        self.assertEqual(ana.tipo, 'paciente')
+        self.assertTrue(ana.check_password('Zanahoria-2024'))
+        self.assertFalse(Usuario.objects.get(username='bruno').has_usable_password())
+        self.assertEqual(Paciente.objects.filter(usuario__username__in=['ana', 'bruno']).count(), 2)
+        # bulk_create no dispara señales: el alta indexa la búsqueda
+        self.assertEqual(busqueda.buscar('Gómez')[0]['paciente'].usuario, ana)
+        # La clave de la búsqueda por prefijo también se calcula en bulk_create
+        self.assertEqual(ana.apellido_busqueda, 'gomez')
+
+    def test_omite_repetidos_existentes_y_contrasenias_debiles(self):
+        Usuario.objects.create_user(username='ana', password='x')
+        resultado = alta_pacientes([
+            {'username': 'ana'},
+            {'username': 'bruno'},
+            {'username': 'bruno'},
+            {'username': 'carla', 'password': '123'},
+            {'username': ''},
+        ], procesos=1)
+
+        self.assertEqual([u.username for u in resultado.usuarios], ['bruno'])
+        self.assertEqual([username for username, _ in resultado.omitidos], ['ana', 'bruno', 'carla', ''])
+        self.assertFalse(Usuario.objects.filter(username='carla').exists())
+
+    def test_omite_campos_invalidos_sin_perder_el_lote(self):
+        resultado = alta_pacientes([
+            {'username': 'ana', 'fecha_nacimiento': '31/12/1990'},
+            {'username': 'bruno', 'email': 'no-es-un-email'},
+            {'username': 'carla', 'fecha_nacimiento': '1990-12-31', 'telefono': '1' * 30},
+            {'username': 'dario', 'fecha_nacimiento': '1990-12-31', 'email': 'dario@example.com'},
+        ], procesos=1)
+
+        self.assertEqual([username for username, _ in resultado.omitidos], ['ana', 'bruno', 'carla'])
+        self.assertEqual(resultado.creados, 1)
+        self.assertEqual(Usuario.objects.get(username='dario').fecha_nacimiento, date(1990, 12, 31))
+
+
+@override_settings(PASSWORD_HASHERS=HASHERS_RAPIDOS)
+class RegistroFormTests(TestCase):
+    def test_no_deja_usuario_sin_paciente_si_falla_el_perfil(self):
+        form = RegistroForm(data={
+            'username': 'dario', 'email': 'dario@example.com',
+            'first_name': 'Darío', 'last_name': 'Luna',
+            'password1': 'Zanahoria-2024', 'password2': 'Zanahoria-2024',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+
+        with mock.patch.object(Paciente.objects, 'create', side_effect=RuntimeError('falló el perfil')):
+            with self.assertRaises(RuntimeError):
+                form.save()
+        self.assertFalse(Usuario.objects.filter(username='dario').exists())
+
+
+@override_settings(
+    PASSWORD_HASHERS=HASHERS_RAPIDOS,
+    USUARIOS_LIMITES_LOGIN={'usuario': (2, 1), 'ip': (4, 1)},
+)
+class LoginTests(TestCase):
+    def setUp(self):
+        caches['sesiones'].clear()
+        Usuario.objects.create_user('ana', password='Zanahoria-2024', first_name='Ana')
+        self.url = reverse('usuarios:login')
+
+    def test_un_solo_hash_por_login(self):
+        with mock.patch.object(MD5PasswordHasher, 'verify', autospec=True,
+                               side_effect=MD5PasswordHasher.verify) as verificar:
+            response = self.client.post(self.url, {'username': 'ana', 'password': 'Zanahoria-2024'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(verificar.call_count, 1)
+
+    def test_limita_intentos_por_usuario_sin_hashear(self):
+        for _ in range(2):
+            response = self.client.post(self.url, {'username': 'Ana', 'password': 'mal'})
+            self.assertEqual(response.status_code, 200)
+
+        with mock.patch('django.contrib.auth.forms.authenticate') as autenticar:
+            response = self.client.post(self.url, {'username': 'ana', 'password': 'Zanahoria-2024'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        autenticar.assert_not_called()
+
+        # Otro usuario desde la misma IP todavía puede entrar, hasta agotar la IP
+        Usuario.objects.create_user('beto', password='Zanahoria-2024')
+        self.assertEqual(self.client.post(self.url, {'username': 'beto', 'password': 'Zanahoria-2024'}).status_code, 302)
+        self.client.logout()
+        self.assertEqual(self.client.post(self.url, {'username': 'beto', 'password': 'x'}).status_code, 429)
+
+
+class UsuarioCacheadoTests(TestCase):
+    def setUp(self):
+        caches['sesiones'].clear()
+        self.usuario = Usuario.objects.create_user('ana', first_name='Ana')
+        self.paciente = Paciente.objects.create(usuario=self.usuario)
+        self.client.force_login(self.usuario)
+
+    def test_pagina_de_paciente_sin_consultas_de_sesion_ni_perfil(self):
+        url = reverse('turnos:mis_turnos')
+        self.client.get(url)
+
+        # Solo quedan los turnos futuros y los pasados
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        # Vaciar el cache por defecto (grillas, feeds) no desaloja la sesión
+        # ni el usuario cacheado
+        caches['default'].clear()
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+    def test_guardar_usuario_o_paciente_invalida_el_cache(self):
+        self.assertEqual(usuario_con_perfil(self.usuario.id).paciente, self.paciente)
+
+        self.usuario.first_name = 'Anita'
+        self.usuario.save()
+        self.assertEqual(usuario_con_perfil(self.usuario.id).first_name, 'Anita')
+
+        self.paciente.altura = Decimal('1.70')
+        self.paciente.save()
+        with self.assertNumQueries(1):
+            usuario_con_perfil(self.usuario.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(usuario_con_perfil(self.usuario.id).paciente.altura, Decimal('1.70'))
@@ -1,9 +1,12 @@
+import math
+
 from django.shortcuts import render, redirect
-from django.contrib.auth import login, logout, authenticate
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.urls import reverse
 from .forms import RegistroForm, LoginForm
+from .limites import espera_login
 
 # Create your views here.
 def registro_view(request):
@@ -38,23 +41,30 @@ def login_view(request):
         return redirect('core:home')
     
     if request.method == 'POST':
+        # El límite se controla antes de validar: un intento rechazado no calcula el hash
+        espera = espera_login(request, request.POST.get('username', ''))
+        if espera:
+            segundos = math.ceil(espera)
+            messages.error(request, f'Demasiados intentos. Probá de nuevo en {segundos} segundos.')
+            form = LoginForm(initial={'username': request.POST.get('username', '')})
+            response = render(request, 'usuarios/login.html', {'form': form}, status=429)
+            response['Retry-After'] = str(segundos)
+            return response
+        
         form = LoginForm(request, data=request.POST)
         if form.is_valid():
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            user = authenticate(username=username, password=password)
+            # El formulario ya autenticó al usuario: no se vuelve a hashear la contraseña
+            user = form.get_user()
+            login(request, user)
+            messages.success(request, f'¡Bienvenido de nuevo, {user.first_name}!')
             
-            if user is not None:
-                login(request, user)
-                messages.success(request, f'¡Bienvenido de nuevo, {user.first_name}!')
-                
-                # Redirigir según el tipo de usuario
-                if user.tipo == 'profesional':
-                    return redirect('turnos:calendario')
-                else:
-                    # Redirigir a donde el usuario quería ir (o al inicio)
-                    next_url = request.GET.get('next', 'core:home')
-                    return redirect(next_url)
+            # Redirigir según el tipo de usuario
+            if user.tipo == 'profesional':
+                return redirect('turnos:calendario')
+            else:
+                # Redirigir a donde el usuario quería ir (o al inicio)
+                next_url = request.GET.get('next', 'core:home')
+                return redirect(next_url)
         else:
             messages.error(request, 'Usuario o contraseña incorrectos.')
     else:
@@ -78,14 +88,10 @@ def perfil_view(request):
     Vista del perfil del usuario.
     Solo accesible para usuarios autenticados.
     """
-    # Si es paciente, obtener su información adicional
-    paciente = None
-    if request.user.tipo == 'paciente':
-        paciente = request.user.paciente
-    
+    # Si es paciente, su información adicional (None para los profesionales)
     context = {
         'usuario': request.user,
-        'paciente': paciente
+        'paciente': request.paciente
     }
     
     return render(request, 'usuarios/perfil.html', context)
\ No newline at end of file